@@ -1,17 +1,57 @@
 import argparse
+import importlib
 import logging
 import multiprocessing
 import sys
 
-from modelforge.logs import setup_logging
-from ast2vec.__main__ import one_arg_parser
-from ast2vec.repo2.base import DEFAULT_BBLFSH_TIMEOUT, DEFAULT_BBLFSH_ENDPOINTS
 
-from snippet_ranger.model2.source2func import source2func_entry
-from snippet_ranger.librariesio_fetcher import dependent_reps_entry, LibrariesIOFetcher
-from snippet_ranger.model2.snippet2df import snippet2df_entry, snippet2fc_df_entry
-from snippet_ranger.model2.snippet2bow import snippet2bow_entry, snippet2fc_bow_entry
-from snippet_ranger.pylib2uast import pylib2uast_entry
+def one_arg_parser(*args, **kwargs) -> argparse.ArgumentParser:
+    """
+    Create parser for one argument with passed arguments.
+    It is helper function to avoid argument duplication in subcommands.
+
+    :return: Parser for one argument.
+    """
+    arg_parser = argparse.ArgumentParser(add_help=False)
+    arg_parser.add_argument(*args, **kwargs)
+    return arg_parser
+
+
+def lazy_entry(module: str, name: str) -> callable:
+    """
+    Create the subcommand handler which imports its module only when it is called. The modules
+    pull in ast2vec and its heavy dependencies, so `--help` and the startup do not wait for them.
+
+    :param module: Module name.
+    :param name: Name of the handler in the module.
+    :return: The handler.
+    """
+    def entry(args):
+        return getattr(importlib.import_module(module), name)(args)
+
+    entry.__name__ = entry.__qualname__ = name
+    return entry
+
+
+source2func_entry = lazy_entry("snippet_ranger.model2.source2func", "source2func_entry")
+library_api_entry = lazy_entry("snippet_ranger.model2.uast2library_api", "library_api_entry")
+dependent_reps_entry = lazy_entry("snippet_ranger.librariesio_fetcher", "dependent_reps_entry")
+librariesio_index_entry = lazy_entry("snippet_ranger.librariesio_index",
+                                     "librariesio_index_entry")
+snippet2df_entry = lazy_entry("snippet_ranger.model2.snippet2df", "snippet2df_entry")
+snippet2fc_df_entry = lazy_entry("snippet_ranger.model2.snippet2df", "snippet2fc_df_entry")
+snippet2bow_entry = lazy_entry("snippet_ranger.model2.snippet2bow", "snippet2bow_entry")
+snippet2fc_bow_entry = lazy_entry("snippet_ranger.model2.snippet2bow", "snippet2fc_bow_entry")
+snippet2hashed_bow_entry = lazy_entry("snippet_ranger.model2.snippet2bow",
+                                      "snippet2hashed_bow_entry")
+snippet2fc_hashed_bow_entry = lazy_entry("snippet_ranger.model2.snippet2bow",
+                                         "snippet2fc_hashed_bow_entry")
+snippet2df_bow_entry = lazy_entry("snippet_ranger.model2.snippet2df_bow", "snippet2df_bow_entry")
+snippet2fc_df_bow_entry = lazy_entry("snippet_ranger.model2.snippet2df_bow",
+                                     "snippet2fc_df_bow_entry")
+snippet2vw_entry = lazy_entry("snippet_ranger.model2.snippet2vw", "snippet2vw_entry")
+snippet2fc_vw_entry = lazy_entry("snippet_ranger.model2.snippet2vw", "snippet2fc_vw_entry")
+pylib2uast_entry = lazy_entry("snippet_ranger.pylib2uast", "pylib2uast_entry")
 
 
 def get_parser() -> argparse.ArgumentParser:
@@ -44,6 +84,10 @@ def get_parser() -> argparse.ArgumentParser:
         "--library_uast", help="Provide the UAST model of the library. "
                                "You can build it via ast2vec repo2uast call.")
 
+    library_api_arg = one_arg_parser(
+        "--library_api", help="Provide the LibraryAPI model of the library instead of its UAST "
+                              "model. You can build it via library_api call.")
+
     tmpdir_arg = one_arg_parser(
         "--tmpdir", help="Store intermediate files in this directory instead of /tmp.")
 
@@ -59,17 +103,52 @@ def get_parser() -> argparse.ArgumentParser:
         "-v", "--vocabulary-size", required=True, type=int,
         help="Vocabulary size: the tokens with the highest document frequencies will be picked.")
 
+    approximate_args = argparse.ArgumentParser(add_help=False)
+    approximate_args.add_argument(
+        "--approximate", type=int, metavar="TOPN",
+        help="Calculate approximate document frequencies with fixed memory and write only TOPN "
+             "most frequent tokens. Use it if the vocabulary does not fit into memory.")
+    approximate_args.add_argument(
+        "--sketch-width", type=int, default=2 ** 20,
+        help="Width of the count-min sketch for --approximate. The error is e / width of the "
+             "number of counted tokens.")
+    approximate_args.add_argument(
+        "--sketch-depth", type=int, default=4,
+        help="Depth of the count-min sketch for --approximate. The error bound holds with "
+             "probability 1 - exp(-depth).")
+
+    store_arg = one_arg_parser(
+        "--store", action="store_true",
+        help="Append all the rows to the single memory-mapped BOW store in the output directory "
+             "instead of writing one BOW model per Snippet model. join-bow is not needed then.")
+
+    unordered_arg = one_arg_parser(
+        "--unordered", action="store_true",
+        help="Write the models in the order of completion instead of the order of file names.")
+
+    hashing_args = argparse.ArgumentParser(add_help=False)
+    hashing_args.add_argument(
+        "--hash-bits", type=int, default=18,
+        help="The number of columns is 2 ** hash_bits. Tokens with the same hash modulo the "
+             "number of columns share the column.")
+    hashing_args.add_argument(
+        "--no-idf", dest="idf", action="store_false", default=True,
+        help="Do not weigh the tokens with the online IDF.")
+    hashing_args.add_argument(
+        "--samples", type=int, default=3,
+        help="The number of tokens to remember for every column to name it.")
+
     bblfsh_args = argparse.ArgumentParser(add_help=False)
     bblfsh_args.add_argument(
         "--bblfsh", dest="bblfsh_endpoint",
         help="Babelfish server's endpoint, e.g. 0.0.0.0:9432. "
              "You can specify it directly or with BBLFSH_ENDPOINT environment variable. Otherwise "
-             "default will be used (default: %s)" % DEFAULT_BBLFSH_ENDPOINTS)
+             "ast2vec default will be used.")
     bblfsh_args.add_argument(
         "--timeout", type=int,
         help="Babelfish timeout - longer requests are dropped. "
              "You can specify it directly or with BBLFSH_TIMEOUT environment variable. Otherwise "
-             "default will be used (default: %d sec)" % DEFAULT_BBLFSH_TIMEOUT)
+             "ast2vec default will be used.")
 
     linguist_arg = one_arg_parser(
         "--linguist", help="Path to src-d/enry executable.")
@@ -96,15 +175,45 @@ def get_parser() -> argparse.ArgumentParser:
              "entry from each function that uses library and produce one Function model from one "
              "Source model, but it has more entries because of decomposition.",
         parents=[model2input_arg, filter_arg, process_arg, library_name_arg, library_uast_arg,
-                 disable_overwrite_arg])
+                 library_api_arg, disable_overwrite_arg])
     source2func_parser.set_defaults(handler=source2func_entry)
 
     source2func_parser.add_argument("-o", "--output", help="Where to write decomposed models.")
+    source2func_parser.add_argument(
+        "--libraries", nargs="+",
+        help="Extract snippets for several libraries in one pass. The name-UAST pair of the "
+             "library in format <library name>:<library UAST model path>. Use "
+             "<library name>:api=<LibraryAPI model path> for compiled library API. Snippets "
+             "are saved to <output>/<library name>. Excludes --library_name, --library_uast "
+             "and --library_api flags.")
+    source2func_parser.add_argument(
+        "--shared-sources", action="store_true",
+        help="Store snippet sources as offsets into the shared file source codes instead of "
+             "copied strings. It makes the snippet models smaller.")
+    source2func_parser.add_argument(
+        "--resolve-imports", action="store_true",
+        help="Resolve function calls through the file imports and aliases, e.g. `np.sum` after "
+             "`import numpy as np`. Only the calls of the library functions are counted then, "
+             "not all the calls with the same names.")
+    source2func_parser.add_argument(
+        "--references", action="store_true",
+        help="Store only the reference to the input Source model, file and node indices instead "
+             "of uasts and sources. They are resolved from the Source model when accessed, so "
+             "it must stay on its place.")
+
+    library_api_parser = subparsers.add_parser(
+        "library_api",
+        help="Compile the API of the library from its UAST model: function and class names, "
+             "qualified names and modules. The model is much smaller than the UAST model and "
+             "can be used instead of it in source2func and snippet2fc_df.",
+        parents=[library_name_arg, library_uast_arg, output_dir_arg_asdf])
+    library_api_parser.set_defaults(handler=library_api_entry)
 
     dependent_reps_parser = subparsers.add_parser(
         "dependent_reps",
         help="Create a list of repositories, that are dependent from some specified libraries "
-             "using libraries.io dataset.")
+             "using libraries.io dataset.",
+        parents=[process_arg])
     dependent_reps_parser.set_defaults(handler=dependent_reps_entry)
     group = dependent_reps_parser.add_argument_group("libraries")
     group_ex = group.add_mutually_exclusive_group(required=True)
@@ -122,33 +231,77 @@ def get_parser() -> argparse.ArgumentParser:
         help="Where to write the list of dependent repos links. Save location for urls. "
              "Specify folder if you have several libraries. Then urls will be stored in the file "
              "<library name>.txt . You can specify file, then all urls will be saved in one file.")
+    group_ex = dependent_reps_parser.add_mutually_exclusive_group(required=True)
+    group_ex.add_argument(
+        "--librariesio_data",
+        help="Provide the path to libraries.io (v1.0.0) dataset. "
+             "You can download it from https://libraries.io/data.")
+    group_ex.add_argument(
+        "--librariesio_index",
+        help="Provide the path to libraries.io index instead of the dataset. "
+             "You can build it via librariesio_index call.")
+    group = dependent_reps_parser.add_argument_group(
+        "selection", "Select the repositories which are worth to clone. It requires the "
+                     "repositories file of the dataset or the index built with it.")
+    group.add_argument(
+        "--collapse-forks", action="store_true",
+        help="Replace the forks with their source repositories.")
+    group.add_argument(
+        "--drop-inactive", action="store_true",
+        help="Drop empty repositories, mirrors and repositories with any status, e.g. Removed.")
+    group.add_argument(
+        "--rank-by", choices=("stars", "size"), default="stars",
+        help="Which repositories are selected first by --top and --size-budget.")
+    group.add_argument(
+        "--top", type=int, help="Maximal number of repositories per library.")
+    group.add_argument(
+        "--size-budget",
+        help="Maximal total size of repositories per library, e.g. 50G.")
+
+    dependent_reps_parser.add_argument(
+        "--platform", help="The name of package manager (default: Pypi).")
     dependent_reps_parser.add_argument(
+        "--stream", action="store_true",
+        help="Append the urls to the output files as soon as they are found, so that cloning "
+             "can start before the whole dataset is scanned.")
+    dependent_reps_parser.add_argument(
+        "--depth", type=int, default=1,
+        help="Maximal length of the dependency chain. Repositories which use the libraries "
+             "through other projects are listed too if it is bigger than 1. It requires "
+             "--librariesio_index.")
+
+    librariesio_index_parser = subparsers.add_parser(
+        "librariesio_index",
+        help="Convert libraries.io dataset to the columnar index for dependent_reps. It is "
+             "needed once and then dependent_reps does not scan the whole dataset.")
+    librariesio_index_parser.set_defaults(handler=librariesio_index_entry)
+    librariesio_index_parser.add_argument(
         "--librariesio_data", required=True,
         help="Provide the path to libraries.io (v1.0.0) dataset. "
              "You can download it from https://libraries.io/data.")
-    dependent_reps_parser.add_argument(
-        "--platform", default=LibrariesIOFetcher.DEFAULT_PLATFORM,
-        help="The name of package manager.")
+    librariesio_index_parser.add_argument(
+        "-o", "--output", required=True, help="Where to write the index.")
 
     snippet2df_parser = subparsers.add_parser(
         "snippet2df", help="Calculate identifier document frequencies from uasts for snippets. "
                            "It counts each snippet separately.",
-        parents=[model2input_arg, filter_arg, tmpdir_arg, process_arg, disable_overwrite_arg])
+        parents=[model2input_arg, filter_arg, process_arg, disable_overwrite_arg,
+                 approximate_args])
     snippet2df_parser.set_defaults(handler=snippet2df_entry)
     snippet2df_parser.add_argument("output", help="Where to write document frequencies.")
 
     snippet2df_parser = subparsers.add_parser(
         "snippet2fc_df", help="Calculate document frequencies from Function Calls in extracted "
                               "snippets. It counts each snippet separately.",
-        parents=[model2input_arg, filter_arg, tmpdir_arg, process_arg, disable_overwrite_arg,
-                 library_name_arg, library_uast_arg])
+        parents=[model2input_arg, filter_arg, process_arg, disable_overwrite_arg,
+                 library_name_arg, library_uast_arg, library_api_arg, approximate_args])
     snippet2df_parser.set_defaults(handler=snippet2fc_df_entry)
     snippet2df_parser.add_argument("output", help="Where to write document frequencies.")
 
     snippet2bow_parser = subparsers.add_parser(
         "snippet2bow", help="Calculate bag of words from Simple Identifiers in extracted uasts.",
         parents=[model2input_arg, filter_arg, process_arg, df_arg, disable_overwrite_arg,
-                 vocabulary_size_arg])
+                 vocabulary_size_arg, store_arg])
     snippet2bow_parser.set_defaults(handler=snippet2bow_entry)
     snippet2bow_parser.add_argument(
         "output", help="Where to write the merged nBOW.")
@@ -156,11 +309,65 @@ def get_parser() -> argparse.ArgumentParser:
     snippet2fc_bow_parser = subparsers.add_parser(
         "snippet2fc_bow", help="Calculate bag of words from Function Calls in extracted uasts.",
         parents=[model2input_arg, filter_arg, process_arg, df_arg, disable_overwrite_arg,
-                 vocabulary_size_arg])
+                 vocabulary_size_arg, store_arg])
     snippet2fc_bow_parser.set_defaults(handler=snippet2fc_bow_entry)
     snippet2fc_bow_parser.add_argument(
         "output", help="Where to write the merged nBOW.")
 
+    snippet2df_bow_parser = subparsers.add_parser(
+        "snippet2df_bow", help="Calculate document frequencies and bag of words from Simple "
+                               "Identifiers in extracted uasts at once. Snippet models are "
+                               "read only once. The same as snippet2df and snippet2bow.",
+        parents=[model2input_arg, filter_arg, tmpdir_arg, process_arg, disable_overwrite_arg,
+                 vocabulary_size_arg])
+    snippet2df_bow_parser.set_defaults(handler=snippet2df_bow_entry)
+    snippet2df_bow_parser.add_argument("docfreq", help="Where to write document frequencies.")
+    snippet2df_bow_parser.add_argument("output", help="Where to write the nBOW models.")
+
+    snippet2fc_df_bow_parser = subparsers.add_parser(
+        "snippet2fc_df_bow", help="Calculate document frequencies and bag of words from Function "
+                                  "Calls in extracted uasts at once. Snippet models are read "
+                                  "only once. The same as snippet2fc_df and snippet2fc_bow.",
+        parents=[model2input_arg, filter_arg, tmpdir_arg, process_arg, disable_overwrite_arg,
+                 vocabulary_size_arg, library_name_arg, library_uast_arg, library_api_arg])
+    snippet2fc_df_bow_parser.set_defaults(handler=snippet2fc_df_bow_entry)
+    snippet2fc_df_bow_parser.add_argument("docfreq", help="Where to write document frequencies.")
+    snippet2fc_df_bow_parser.add_argument("output", help="Where to write the nBOW models.")
+
+    snippet2hashed_bow_parser = subparsers.add_parser(
+        "snippet2hashed_bow", help="Calculate bag of words from Simple Identifiers in extracted "
+                                   "uasts with the hashing trick. Document frequencies are not "
+                                   "needed.",
+        parents=[model2input_arg, filter_arg, process_arg, disable_overwrite_arg, hashing_args])
+    snippet2hashed_bow_parser.set_defaults(handler=snippet2hashed_bow_entry)
+    snippet2hashed_bow_parser.add_argument("output", help="Where to write the nBOW models.")
+
+    snippet2fc_hashed_bow_parser = subparsers.add_parser(
+        "snippet2fc_hashed_bow", help="Calculate bag of words from Function Calls in extracted "
+                                      "uasts with the hashing trick. Document frequencies are "
+                                      "not needed.",
+        parents=[model2input_arg, filter_arg, process_arg, disable_overwrite_arg, hashing_args])
+    snippet2fc_hashed_bow_parser.set_defaults(handler=snippet2fc_hashed_bow_entry)
+    snippet2fc_hashed_bow_parser.add_argument("output", help="Where to write the nBOW models.")
+
+    snippet2vw_parser = subparsers.add_parser(
+        "snippet2vw", help="Convert extracted uasts to Vowpal Wabbit dataset of Simple "
+                           "Identifiers. The same as snippet2bow, join-bow and bow2vw, but the "
+                           "lines are streamed to the output.",
+        parents=[model2input_arg, filter_arg, process_arg, df_arg, vocabulary_size_arg,
+                 unordered_arg])
+    snippet2vw_parser.set_defaults(handler=snippet2vw_entry)
+    snippet2vw_parser.add_argument("output", help="Where to write the Vowpal Wabbit dataset.")
+
+    snippet2fc_vw_parser = subparsers.add_parser(
+        "snippet2fc_vw", help="Convert extracted uasts to Vowpal Wabbit dataset of Function "
+                              "Calls. The same as snippet2fc_bow, join-bow and bow2vw, but the "
+                              "lines are streamed to the output.",
+        parents=[model2input_arg, filter_arg, process_arg, df_arg, vocabulary_size_arg,
+                 unordered_arg])
+    snippet2fc_vw_parser.set_defaults(handler=snippet2fc_vw_entry)
+    snippet2fc_vw_parser.add_argument("output", help="Where to write the Vowpal Wabbit dataset.")
+
     snippet2fc_bow_parser = subparsers.add_parser(
         "pylib2uast", help="Converts installed python library to UAST model.",
         parents=[linguist_arg, output_dir_arg_asdf, bblfsh_args, process_1_2_arg,
@@ -168,6 +375,21 @@ def get_parser() -> argparse.ArgumentParser:
     snippet2fc_bow_parser.set_defaults(handler=pylib2uast_entry)
     snippet2fc_bow_parser.add_argument(
         "input", nargs='+', help="library names.")
+    snippet2fc_bow_parser.add_argument(
+        "--backend", choices=("bblfsh", "python"), default="bblfsh",
+        help="bblfsh parses the files with Babelfish server. python parses them in --threads "
+             "processes with the standard ast module and needs neither the server nor enry.")
+    snippet2fc_bow_parser.add_argument(
+        "--uast-cache", help="Directory of the UAST cache. Files with the same content are "
+                             "parsed once and the UASTs are reused across the runs.")
+    snippet2fc_bow_parser.add_argument(
+        "--uast-cache-size", default="1G",
+        help="Maximal size of the UAST cache with an optional K, M, G or T suffix. The least "
+             "recently used UASTs are evicted.")
+    snippet2fc_bow_parser.add_argument(
+        "--driver-version", default="",
+        help="Version of the Babelfish drivers. Babelfish does not report it, so change it "
+             "when the drivers are updated to invalidate their cached UASTs.")
 
     return parser
 
@@ -181,6 +403,7 @@ def main():
 
     parser = get_parser()
     args = parser.parse_args()
+    from modelforge.logs import setup_logging
     args.log_level = logging._nameToLevel[args.log_level]
     setup_logging(args.log_level)
     try:
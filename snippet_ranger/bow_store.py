@@ -0,0 +1,288 @@
+import bisect
+import os
+import shutil
+
+import numpy
+from scipy.sparse import csr_matrix
+
+
+INDPTR_DTYPE = numpy.int64
+INDICES_DTYPE = numpy.int32
+DATA_DTYPE = numpy.float32
+
+
+def _map(path, dtype):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode="r")
+
+
+def _append(path, array, dtype):
+    with open(path, "ab") as fout:
+        numpy.asarray(array, dtype=dtype).tofile(fout)
+
+
+def append_strings(path: str, strings: list):
+    """
+    Appends the strings to the string table: the lengths go to `<path>.lengths` and the UTF-8
+    encoded chars go to `<path>.chars`.
+
+    :param path: Path prefix of the table files.
+    :param strings: List of strings.
+    :return: None
+    """
+    data = [s.encode("utf-8") for s in strings]
+    _append(path + ".lengths", [len(s) for s in data], numpy.uint32)
+    with open(path + ".chars", "ab") as fout:
+        fout.write(b"".join(data))
+
+
+class StringTable:
+    """
+    Memory-mapped list of strings written with :func:`append_strings`. Only the offsets are
+    loaded, strings are decoded on access.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: Path prefix of the table files.
+        """
+        lengths = _map(path + ".lengths", numpy.uint32)
+        self._offsets = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=self._offsets[1:])
+        self._chars = _map(path + ".chars", numpy.uint8)
+
+    def __len__(self):
+        """
+        Returns the number of strings.
+        """
+        return len(self._offsets) - 1
+
+    def __getitem__(self, item):
+        """
+        Returns the string by index or the list of strings by slice.
+        """
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("String index out of range: %d" % item)
+        return self._chars[self._offsets[item]:self._offsets[item + 1]].tobytes().decode("utf-8")
+
+
+class BOWStoreWriter:
+    """
+    Appends BOW rows to one shard of :class:`BOWStore`. Every process must write to its own
+    shard.
+    """
+    def __init__(self, path: str, shard: str):
+        """
+        :param path: Store directory.
+        :param shard: Shard name.
+        """
+        self._path = os.path.join(path, BOWStore.SHARD_PREFIX + shard)
+        os.makedirs(self._path, exist_ok=True)
+        indices = os.path.join(self._path, "indices")
+        self._nnz = os.path.getsize(indices) // numpy.dtype(INDICES_DTYPE).itemsize \
+            if os.path.exists(indices) else 0
+
+    def append(self, names: list, matrix: csr_matrix):
+        """
+        Appends the rows of the matrix.
+
+        :param names: Row names.
+        :param matrix: CSR matrix with the same number of rows.
+        :return: None
+        """
+        if len(names) != matrix.shape[0]:
+            raise ValueError("Number of names and rows are different: %d != %d" % (
+                len(names), matrix.shape[0]))
+        _append(os.path.join(self._path, "data"), matrix.data, DATA_DTYPE)
+        _append(os.path.join(self._path, "indices"), matrix.indices, INDICES_DTYPE)
+        _append(os.path.join(self._path, "indptr"),
+                matrix.indptr[1:].astype(INDPTR_DTYPE) + self._nnz, INDPTR_DTYPE)
+        append_strings(os.path.join(self._path, "names"), names)
+        self._nnz += matrix.nnz
+
+
+class BOWStore:
+    """
+    Single BOW matrix which is stored in the directory as memory-mapped shards. Every shard has
+    fixed dtype `indptr` (row ends), `indices` and `data` files and the row names. The rows of
+    all the shards are concatenated in the order of shard names. The token table and the sorted
+    name index are shared. Rows are read by slice or by name without loading the whole matrix.
+
+    Create the store with :meth:`create`, append the rows with :class:`BOWStoreWriter` and
+    finally call :meth:`build_index`.
+    """
+    SHARD_PREFIX = "shard_"
+    TOKENS = "tokens"
+    INDEX = "index"
+
+    @classmethod
+    def create(cls, path: str, tokens: list, overwrite: bool=False):
+        """
+        Creates the empty store.
+
+        :param path: Store directory.
+        :param tokens: Column names.
+        :param overwrite: Remove the existing store in the directory.
+        :return: None
+        """
+        if os.path.exists(path) and os.listdir(path):
+            if not overwrite or not os.path.exists(os.path.join(path, cls.TOKENS + ".chars")):
+                raise FileExistsError("%s already exists" % path)
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+        append_strings(os.path.join(path, cls.TOKENS), tokens)
+
+    @classmethod
+    def build_index(cls, path: str):
+        """
+        Writes the sorted name index of all the rows.
+
+        :param path: Store directory.
+        :return: None
+        """
+        names = []
+        for shard in cls._list_shards(path):
+            names.extend(StringTable(os.path.join(path, shard, "names")))
+        order = sorted(range(len(names)), key=names.__getitem__)
+        prefix = os.path.join(path, cls.INDEX)
+        for suffix in (".lengths", ".chars", ".rows"):
+            if os.path.exists(prefix + suffix):
+                os.remove(prefix + suffix)
+        append_strings(prefix, [names[i] for i in order])
+        _append(prefix + ".rows", order, numpy.int64)
+
+    @classmethod
+    def _list_shards(cls, path):
+        return sorted(d for d in os.listdir(path) if d.startswith(cls.SHARD_PREFIX))
+
+    def __init__(self, path: str):
+        """
+        :param path: Store directory.
+        """
+        self._tokens = StringTable(os.path.join(path, self.TOKENS))
+        self._shards = []
+        offsets = [0]
+        for shard in self._list_shards(path):
+            shard = os.path.join(path, shard)
+            indptr = _map(os.path.join(shard, "indptr"), INDPTR_DTYPE)
+            self._shards.append((indptr,
+                                 _map(os.path.join(shard, "indices"), INDICES_DTYPE),
+                                 _map(os.path.join(shard, "data"), DATA_DTYPE),
+                                 StringTable(os.path.join(shard, "names"))))
+            offsets.append(offsets[-1] + len(indptr))
+        self._offsets = numpy.array(offsets, dtype=numpy.int64)
+        self._index = StringTable(os.path.join(path, self.INDEX))
+        self._index_rows = _map(os.path.join(path, self.INDEX + ".rows"), numpy.int64)
+        if len(self._index) != len(self):
+            raise ValueError("The name index of %s is not built" % path)
+
+    @property
+    def tokens(self) -> StringTable:
+        """
+        Returns the column names.
+        """
+        return self._tokens
+
+    @property
+    def shape(self) -> tuple:
+        """
+        Returns the shape of the matrix.
+        """
+        return len(self), len(self._tokens)
+
+    def __len__(self):
+        """
+        Returns the number of rows.
+        """
+        return int(self._offsets[-1])
+
+    def __getitem__(self, item) -> csr_matrix:
+        """
+        Returns the rows by index or by contiguous slice.
+        """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported")
+            return self._rows(start, max(start, stop))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("Row index out of range: %d" % item)
+        return self._rows(item, item + 1)
+
+    def names(self, start: int=0, stop: int=None) -> list:
+        """
+        Returns the names of the rows in the range.
+
+        :param start: The first row.
+        :param stop: The row after the last. The end of the store if None.
+        :return: List of names.
+        """
+        stop = len(self) if stop is None else stop
+        names = []
+        for offset, (_, _, _, shard_names) in zip(self._offsets, self._shards):
+            names.extend(shard_names[max(start - offset, 0):max(stop - offset, 0)])
+        return names
+
+    def find(self, name: str) -> list:
+        """
+        Looks up the rows by name in the sorted name index.
+
+        :param name: Row name.
+        :return: List of row indices, empty if there are no such rows.
+        """
+        first = bisect.bisect_left(self._index, name)
+        last = bisect.bisect_right(self._index, name, lo=first)
+        return sorted(self._index_rows[first:last].tolist())
+
+    def get(self, name: str) -> csr_matrix:
+        """
+        Returns the row with the given name.
+
+        :param name: Row name.
+        :return: CSR matrix with a single row.
+        """
+        rows = self.find(name)
+        if not rows:
+            raise KeyError(name)
+        return self[rows[0]]
+
+    def iter_batches(self, batch_size: int):
+        """
+        Iterates over the rows in batches.
+
+        :param batch_size: Number of rows in every batch.
+        :return: Generator of (names, CSR matrix) pairs.
+        """
+        for start in range(0, len(self), batch_size):
+            stop = min(start + batch_size, len(self))
+            yield self.names(start, stop), self._rows(start, stop)
+
+    def _rows(self, start, stop):
+        indptr = [numpy.zeros(1, dtype=INDPTR_DTYPE)]
+        indices = []
+        data = []
+        nnz = 0
+        for offset, (shard_indptr, shard_indices, shard_data, _) in zip(self._offsets,
+                                                                        self._shards):
+            lo = max(start - offset, 0)
+            hi = min(stop - offset, len(shard_indptr))
+            if lo >= hi:
+                continue
+            # indptr stores the row ends, the start of the first row is implicit
+            begin = shard_indptr[lo - 1] if lo > 0 else 0
+            end = shard_indptr[hi - 1]
+            indptr.append(shard_indptr[lo:hi] - begin + nnz)
+            indices.append(shard_indices[begin:end])
+            data.append(shard_data[begin:end])
+            nnz += end - begin
+        return csr_matrix((numpy.concatenate(data) if data else numpy.zeros(0, DATA_DTYPE),
+                           numpy.concatenate(indices) if indices else
+                           numpy.zeros(0, INDICES_DTYPE),
+                           numpy.concatenate(indptr)),
+                          shape=(stop - start, len(self._tokens)))
@@ -0,0 +1,79 @@
+import numpy
+from scipy.sparse import csr_matrix
+
+
+class DependencyGraph:
+    """
+    Reverse dependency graph of the libraries.io projects in sparse matrices keyed by project id.
+
+    A project depends on another project if its own repository declares the dependency. So the
+    repositories which depend on a library through the projects built on top of it are found by
+    the breadth-first search: every level is one sparse matrix product for all the libraries.
+    """
+    def __init__(self, dependencies_project_id: numpy.ndarray,
+                 dependencies_repository: numpy.ndarray, projects_id: numpy.ndarray,
+                 projects_repository: numpy.ndarray, num_repositories: int):
+        """
+        :param dependencies_project_id: Project ids of the dependencies.
+        :param dependencies_repository: Repository numbers of the dependencies.
+        :param projects_id: Project ids.
+        :param projects_repository: Repository numbers of the projects, -1 if unknown.
+        :param num_repositories: Number of repositories.
+        """
+        num_projects = int(max(numpy.max(projects_id, initial=-1),
+                               numpy.max(dependencies_project_id, initial=-1))) + 1
+        # repositories x projects: the repository declares the dependency on the project
+        self._repository_deps = self._binary_matrix(
+            dependencies_repository, dependencies_project_id, (num_repositories, num_projects))
+        owned = projects_repository >= 0
+        # projects x repositories: the repository of the project
+        owners = self._binary_matrix(projects_id[owned], projects_repository[owned],
+                                     (num_projects, num_repositories))
+        # projects x projects: the first project depends on the second
+        self._adjacency = owners.dot(self._repository_deps)
+
+    @property
+    def adjacency(self) -> csr_matrix:
+        """
+        Returns the project adjacency matrix: A[i, j] is True if the project i depends on j.
+        """
+        return self._adjacency
+
+    @property
+    def num_projects(self) -> int:
+        """
+        Returns the maximal project id plus one.
+        """
+        return self._adjacency.shape[0]
+
+    def dependent_repositories(self, project_ids: list, depth: int) -> list:
+        """
+        Finds the repositories which depend on the projects directly or transitively. Every
+        repository is reported only on the first level where it is reached.
+
+        :param project_ids: List of project ids, the sources of the search.
+        :param depth: Maximal length of the dependency chain. 1 means direct dependencies.
+        :return: List of boolean CSR matrices (repositories x sources), one per level.
+        """
+        num_sources = len(project_ids)
+        sources = numpy.asarray(project_ids, dtype=numpy.int64)
+        known = (sources >= 0) & (sources < self.num_projects)
+        frontier = self._binary_matrix(sources[known], numpy.flatnonzero(known),
+                                       (self.num_projects, num_sources))
+        visited = frontier
+        seen = csr_matrix((self._repository_deps.shape[0], num_sources), dtype=bool)
+        levels = []
+        for _ in range(depth):
+            # Boolean products and sums are logical: the counts never overflow
+            repositories = self._repository_deps.dot(frontier) > seen
+            levels.append(repositories)
+            seen = seen + repositories
+            frontier = self._adjacency.dot(frontier) > visited
+            if frontier.nnz == 0:
+                break
+            visited = visited + frontier
+        return levels
+
+    @staticmethod
+    def _binary_matrix(rows, cols, shape):
+        return csr_matrix((numpy.ones(len(rows), dtype=bool), (rows, cols)), shape=shape)
@@ -0,0 +1,169 @@
+from collections import defaultdict
+
+from ast2vec import bblfsh_roles
+
+
+def qualified_callee(node) -> str:
+    """
+    Builds the dotted name of the callee, e.g. `np.linalg.norm` for `np.linalg.norm(x)`.
+    The chain of attribute nodes is followed down to the first identifier without identifier
+    children, so `foo().bar` gives just `bar`.
+
+    :param node: Callee node.
+    :return: Dotted callee name.
+    """
+    identifier_roles = (bblfsh_roles.SIMPLE_IDENTIFIER, bblfsh_roles.QUALIFIED_IDENTIFIER)
+    parts = [node.token]
+    while True:
+        for child in node.children:
+            if child.token and any(role in child.roles for role in identifier_roles):
+                node = child
+                parts.append(child.token)
+                break
+        else:
+            break
+    return ".".join(reversed(parts))
+
+
+class ImportResolver:
+    """
+    Per-file alias table which maps local names to the qualified import paths. It is built
+    once from IMPORT_PATH and IMPORT_ALIAS nodes, so every callee is resolved with one hash
+    lookup of its first dotted component:
+
+    * `import numpy` -> `numpy: numpy`
+    * `import numpy as np` -> `np: numpy`
+    * `import numpy.linalg` -> `numpy: numpy`
+    * `from numpy import linalg as la` -> `la: numpy.linalg`
+    * `from numpy import *` -> bare callees are resolved to `numpy.<callee>`
+
+    Relative imports are skipped because they never point to the library.
+    """
+    NO_ALIAS = "<nil>"
+    STAR = "*"
+
+    def __init__(self, uast):
+        """
+        :param uast: Uast of the file.
+        """
+        self._aliases = {}
+        self._star_modules = []
+        stack = [uast]
+        while stack:
+            node = stack.pop()
+            # Import declaration is the parent of the import paths
+            if any(bblfsh_roles.IMPORT_PATH in child.roles for child in node.children):
+                self._add_import(node)
+            else:
+                stack.extend(node.children)
+        self._cache = {}
+
+    @property
+    def aliases(self) -> dict:
+        """
+        Returns the dictionary with local names as keys and qualified import paths as values.
+        """
+        return self._aliases
+
+    @property
+    def star_modules(self) -> list:
+        """
+        Returns the list of the modules which are imported with `*`.
+        """
+        return self._star_modules
+
+    def _add_import(self, node):
+        if node.properties.get("level", "0") not in ("", "0"):
+            return
+        module = node.properties.get("ImportFrom.module")
+        if module is None:
+            for child in node.children:
+                if child.token and bblfsh_roles.IMPORT_PATH in child.roles:
+                    alias = self._get_alias(child)
+                    if alias is None:
+                        alias = child.token.split(".", 1)[0]
+                        self._aliases[alias] = alias
+                    else:
+                        self._aliases[alias] = child.token
+            return
+        for child in node.children:
+            if not child.token or bblfsh_roles.IMPORT_PATH not in child.roles or \
+                    child.properties.get("promotedPropertyString"):
+                continue
+            if child.token == self.STAR:
+                self._star_modules.append(module)
+                continue
+            self._aliases[self._get_alias(child) or child.token] = module + "." + child.token
+
+    def _get_alias(self, node):
+        alias = node.properties.get("asname")
+        if alias and alias != self.NO_ALIAS:
+            return alias
+        for child in node.children:
+            if child.token and bblfsh_roles.IMPORT_ALIAS in child.roles:
+                return child.token
+        return None
+
+    def resolve(self, callee: str) -> list:
+        """
+        Resolves the dotted callee name to the qualified names.
+
+        :param callee: Callee name from :func:`qualified_callee`.
+        :return: List of qualified names. It is empty if the callee is not imported and has \
+            several items only for bare callees and several star imports.
+        """
+        try:
+            return self._cache[callee]
+        except KeyError:
+            pass
+        head, dot, tail = callee.partition(".")
+        path = self._aliases.get(head)
+        if path is not None:
+            resolved = [path + dot + tail]
+        elif not dot:
+            resolved = [module + "." + callee for module in self._star_modules]
+        else:
+            resolved = []
+        self._cache[callee] = resolved
+        return resolved
+
+    def resolve_bag(self, callees: dict) -> dict:
+        """
+        Resolves the bag of callees. Callees which are not imported are dropped.
+
+        :param callees: Bag of dotted callee names.
+        :return: Bag of qualified names.
+        """
+        bag = defaultdict(int)
+        for callee, count in callees.items():
+            for name in self.resolve(callee):
+                bag[name] += count
+        return bag
+
+
+def library_callees(qualified_callees, libname, functions, qualified_names=None) -> set:
+    """
+    Selects the library functions from the bag of qualified callee names. If the qualified names
+    of the library API are known, every callee is looked up in them, e.g. `numpy.linalg.norm`.
+    Otherwise only the library prefix and the last name are checked, so `numpy.other.norm`
+    matches `norm` too.
+
+    :param qualified_callees: Qualified callee names from :meth:`ImportResolver.resolve_bag`.
+    :param libname: Name of the library.
+    :param functions: Set of the library function names.
+    :param qualified_names: Set of the qualified names of the library API, see \
+        :attr:`snippet_ranger.models.library_api.LibraryAPI.qualified_names`. None if the API \
+        is taken from the library UAST.
+    :return: Set of the qualified names which are called if `qualified_names` is specified, \
+        otherwise set of the library function names which are called.
+    """
+    if qualified_names is not None:
+        return {name for name in qualified_callees if name in qualified_names}
+    result = set()
+    for name in qualified_callees:
+        if name.partition(".")[0] != libname:
+            continue
+        function = name.rpartition(".")[2]
+        if function in functions:
+            result.add(function)
+    return result
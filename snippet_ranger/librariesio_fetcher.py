@@ -1,15 +1,231 @@
+from collections import deque
+import csv
+import io
+from itertools import islice
 import json
 import logging
+import multiprocessing
 import os
 
+import numpy
 import pandas as pd
 
 from ast2vec.pickleable_logger import PickleableLogger
 from modelforge.progress_bar import progress_bar
 
+from snippet_ranger.librariesio_index import LibrariesIOIndex
+from snippet_ranger.utils import parse_size
+
 dependencies_filename = "repository_dependencies-1.0.0-2017-06-15.csv"
 repos_filename = "repositories-1.0.0-2017-06-15.csv"
 projects_filename = "projects-1.0.0-2017-06-15.csv"
+RECORD_CHECK_LINES = 1000  #: Lines to read at most while checking the record start.
+
+
+def csv_block_ranges(path: str, block_size: int):
+    """
+    Splits the CSV file into blocks of whole records without reading it. The file is seeked
+    every `block_size` bytes and the block ends on the next line break which is followed by a
+    record: the lines must parse to the header's number of fields and start with the numeric
+    ID like in all the libraries.io files. So the line breaks inside quoted fields are skipped
+    unless the quoted text itself looks like two records.
+
+    :param path: Path to the CSV file.
+    :param block_size: Minimal size of every block except the last one in bytes.
+    :return: Generator of (start, end) byte offsets of the blocks. The header is not included.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as fin:
+        columns = len(next(csv.reader([fin.readline().decode("utf-8")])))
+        start = fin.tell()
+        while start < size:
+            fin.seek(start + max(block_size, 1) - 1)
+            fin.readline()
+            end = min(fin.tell(), size)
+            while end < size and not _is_record_start(fin, end, columns):
+                fin.seek(end)
+                fin.readline()
+                end = fin.tell()
+            yield start, end
+            start = end
+
+
+def _is_record_start(fin, offset, columns):
+    fin.seek(offset)
+    lines = (line.decode("utf-8", "replace") for line in iter(fin.readline, b""))
+    try:
+        rows = list(islice(csv.reader(islice(lines, RECORD_CHECK_LINES)), 2))
+    except csv.Error:
+        return False
+    return all(len(row) == columns and row[0].isdigit() for row in rows)
+
+
+class CSVRange(io.RawIOBase):
+    """
+    Readable binary stream of the CSV header followed by the byte range of the file, so that
+    the range can be parsed with :func:`pandas.read_csv` without reading it into memory.
+    """
+
+    def __init__(self, fin, start: int, end: int):
+        """
+        :param fin: CSV file opened in binary mode.
+        :param start: Start of the range, see :func:`csv_block_ranges`.
+        :param end: End of the range (exclusive).
+        """
+        super(CSVRange, self).__init__()
+        fin.seek(0)
+        self._header = fin.readline()
+        fin.seek(start)
+        self._fin = fin
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._header:
+            size = min(len(buffer), len(self._header))
+            buffer[:size] = self._header[:size]
+            self._header = self._header[size:]
+            return size
+        data = self._fin.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+
+def read_csv_range(path: str, start: int, end: int, **kwargs) -> pd.DataFrame:
+    """
+    Parses the byte range of the CSV file with :func:`pandas.read_csv`.
+
+    :param path: Path to the CSV file.
+    :param start: Start of the range, see :func:`csv_block_ranges`.
+    :param end: End of the range (exclusive).
+    :param kwargs: key arguments to pass to :func:`pandas.read_csv`.
+    :return: Pandas dataframe with the records in the range.
+    """
+    with open(path, "rb") as fin:
+        return pd.read_csv(io.BufferedReader(CSVRange(fin, start, end)), index_col=False,
+                           encoding="utf-8", **kwargs)
+
+
+def scan_dependencies_block(path: str, start: int, end: int, lib_ids: list) -> pd.DataFrame:
+    """
+    Parses the block of the repository dependencies CSV and selects the dependencies on the
+    libraries. Only the needed columns are parsed.
+
+    :param path: Path to the CSV file.
+    :param start: Start of the block, see :func:`csv_block_ranges`.
+    :param end: End of the block (exclusive).
+    :param lib_ids: List of library project ids.
+    :return: Pandas dataframe with the selected dependencies.
+    """
+    chunk = read_csv_range(path, start, end, usecols=LibrariesIOIndex.DEPENDENCY_COLUMNS,
+                           dtype={"Host Type": str, "Repository Name with Owner": str,
+                                  "Dependency Project ID": "float64"})
+    return chunk[chunk["Dependency Project ID"].isin(lib_ids)]
+
+
+def scan_repositories_block(path: str, start: int, end: int, names: set) -> pd.DataFrame:
+    """
+    Parses the block of the repositories CSV and selects the repositories by name. Only the
+    needed columns are parsed.
+
+    :param path: Path to the CSV file.
+    :param start: Start of the block, see :func:`csv_block_ranges`.
+    :param end: End of the block (exclusive).
+    :param names: Set of repository names with owner.
+    :return: Pandas dataframe with the metadata of the selected repositories.
+    """
+    chunk = read_csv_range(path, start, end, usecols=LibrariesIOIndex.REPOSITORY_COLUMNS,
+                           dtype=LibrariesIOIndex.REPOSITORY_DTYPES)
+    return chunk[chunk["Name with Owner"].isin(names)]
+
+
+def select_repositories(dependent_reps: pd.DataFrame, repositories: pd.DataFrame,
+                        collapse_forks: bool=False, drop_inactive: bool=False,
+                        rank_by: str="stars", top: int=None, size_budget: int=None
+                        ) -> pd.DataFrame:
+    """
+    Selects the dependent repositories which are worth to clone. The selection is done for every
+    library separately.
+
+    :param dependent_reps: Pandas dataframe with Dependency Project ID, Host Type and \
+        Repository Name with Owner columns.
+    :param repositories: Pandas dataframe with the repositories metadata, see \
+        :attr:`LibrariesIOIndex.REPOSITORY_COLUMNS`.
+    :param collapse_forks: Replace the forks with their sources.
+    :param drop_inactive: Drop empty repositories, mirrors, repositories with any status \
+        (e.g. Removed or Unmaintained) and repositories without metadata.
+    :param rank_by: "stars" or "size". The most popular or the biggest repositories are \
+        selected first.
+    :param top: Maximal number of repositories per library.
+    :param size_budget: Maximal total size of repositories per library in bytes. The \
+        repositories which do not fit are skipped.
+    :return: Pandas dataframe with the selected dependent repositories and their metadata.
+    """
+    key = ["Host Type", "Repository Name with Owner"]
+    strings = [column for column, _ in LibrariesIOIndex.REPOSITORY_STRINGS]
+    repositories = repositories.rename(columns={"Name with Owner": key[1]})
+    repositories[strings] = repositories[strings].fillna("")
+    repositories = repositories.drop_duplicates(key)
+    reps = dependent_reps[["Dependency Project ID"] + key].merge(repositories, how="left", on=key)
+    if collapse_forks:
+        forks = reps["Fork Source Name with Owner"].fillna("") != ""
+        reps.loc[forks, key[1]] = reps.loc[forks, "Fork Source Name with Owner"]
+        reps = reps[["Dependency Project ID"] + key].drop_duplicates().merge(
+            repositories, how="left", on=key)
+    if drop_inactive:
+        reps = reps[(reps["Size"] > 0) & (reps["Mirror URL"] == "") & (reps["Status"] == "")]
+    if top is not None or size_budget is not None:
+        column = {"stars": "Stars Count", "size": "Size"}[rank_by]
+        reps = reps.sort_values(["Dependency Project ID", column, key[1]],
+                                ascending=[True, False, True], na_position="last",
+                                kind="mergesort")
+        if size_budget is not None:
+            keep = numpy.zeros(len(reps), dtype=bool)
+            totals = {}
+            # Size is in kilobytes in libraries.io
+            for i, (lib_id, size) in enumerate(zip(reps["Dependency Project ID"].tolist(),
+                                                   (reps["Size"].fillna(0) * 1024).tolist())):
+                total = totals.get(lib_id, 0) + size
+                if total <= size_budget:
+                    totals[lib_id] = total
+                    keep[i] = True
+            reps = reps[keep]
+        if top is not None:
+            reps = reps.groupby("Dependency Project ID", sort=False).head(top)
+    return reps.reset_index(drop=True)
+
+
+def append_lines(path: str, lines: list):
+    """
+    Appends the lines to the file with a single write, so that the readers never see a part of
+    them.
+
+    :param path: Path to the file.
+    :param lines: List of strings without line breaks.
+    :return: None
+    """
+    data = "".join(line + "\n" for line in lines).encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
+
+
+def _ordered_imap(pool, func, iterable, window):
+    # Unlike Pool.imap, does not read the whole input in advance
+    pending = deque()
+    for args in iterable:
+        pending.append(pool.apply_async(func, args))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
 
 
 class LibrariesIOFetcher(PickleableLogger):
@@ -25,17 +241,24 @@ class LibrariesIOFetcher(PickleableLogger):
 
     DEFAULT_PLATFORM = "Pypi"
     CHUNKSIZE = 1000000
+    BLOCK_SIZE = 64 << 20  #: Size of the CSV blocks which are parsed in parallel in bytes.
     HOST2LINK = {"GitHub": "github.com/",
                  "GitLab": "gitlab.com/",
                  "Bitbucket": "bitbucket.org/"}
 
-    def __init__(self, librariesio_path, log_level=logging.INFO):
+    def __init__(self, librariesio_path, log_level=logging.INFO, index_path=None,
+                 num_processes=1):
         """
         :param librariesio_path: Path to a folder where librariesio dataset is stored.
         :param log_level: log level of current class.
+        :param index_path: Path to :class:`LibrariesIOIndex` of the dataset. The CSV files are \
+            not read if it is specified.
+        :param num_processes: Number of processes to parse the dependencies. 0 means CPU count.
         """
         super(LibrariesIOFetcher, self).__init__(log_level=log_level)
         self._librariesio_path = librariesio_path
+        self._num_processes = num_processes or multiprocessing.cpu_count()
+        self._index = LibrariesIOIndex(index_path) if index_path is not None else None
 
     def get_lib_info(self, libraries, platform, save_to=None):
         """
@@ -50,7 +273,18 @@ class LibrariesIOFetcher(PickleableLogger):
         :return: Pandas dataframe with all information about libraries.
         """
 
-        libs_info = pd.DataFrame()
+        if self._index is not None:
+            libs_info = self._index.get_lib_info(libraries, platform)
+        else:
+            libs_info = self._scan_lib_info(libraries, platform)
+        for lib_name in libs_info["Name"].unique().tolist() if len(libs_info) else []:
+            self._log.info("%s library entry is found!", lib_name)
+        if save_to:
+            libs_info.to_csv(save_to, index=False)
+        return libs_info
+
+    def _scan_lib_info(self, libraries, platform):
+        results = []
         projects_path = os.path.join(self._librariesio_path, projects_filename)
         self._log.info("Looking for libraries info...")
         for chunk in pd.read_csv(projects_path, chunksize=LibrariesIOFetcher.CHUNKSIZE,
@@ -62,22 +296,19 @@ class LibrariesIOFetcher(PickleableLogger):
                 if libraries[lib_name] != "":
                     indexes = indexes & ((chunk["Repository URL"] == libraries[lib_name]) |
                                          pd.isnull(chunk["Repository URL"]))
-                    res = chunk[indexes]
-                    if len(res) > 0:
-                        self._log.info("%s library entry is found!", lib_name)
-                    libs_info = pd.concat([libs_info, res])
-                    if save_to:
-                        libs_info.to_csv(save_to, index=False)
+                results.append(chunk[indexes])
+        return pd.concat(results) if results else pd.DataFrame()
 
-        return libs_info
-
-    def get_dependent_reps(self, libs_info, save_to=None):
+    def get_dependent_reps(self, libs_info, save_to=None, depth=1):
         """
         Creates pandas dataframe with all information about dependent repositories from libraries.
 
         :param libs_info: Pandas dataframe with all information about libraries.
         :param save_to: Path to save pandas dataframe with all information about libraries if you \
             want to save it.
+        :param depth: Maximal length of the dependency chain. Repositories which depend on the \
+            libraries through other projects are found if it is bigger than 1. It requires the \
+            index.
         :return: Pandas dataframe with all information about dependent repositories.
         """
         self._log.info("Creating list of dependent repos...")
@@ -85,25 +316,97 @@ class LibrariesIOFetcher(PickleableLogger):
             lib_id2name = dict(zip(libs_info["ID"].tolist(), libs_info["Name"].tolist()))
         else:
             lib_id2name = {libs_info["ID"]: libs_info["Name"]}
-        pd_result = []
-        dependencies_path = os.path.join(self._librariesio_path, dependencies_filename)
-        for chunk in progress_bar(pd.read_csv(dependencies_path,
-                                              chunksize=LibrariesIOFetcher.CHUNKSIZE,
-                                              index_col=False), self._log, expected_size=100):
-            for lib_id in lib_id2name:
-                res = chunk[chunk["Dependency Project ID"] == int(lib_id)]
-                if len(res) > 0:
-                    pd_result.append(res)
-
-        pd_result = pd.concat(pd_result)
-        pd_result["url"] = "https://" + \
-                           pd_result["Host Type"].map(LibrariesIOFetcher.HOST2LINK) + \
-                           pd_result["Repository Name with Owner"]
+        check_depth(depth, self._index is not None)
+        if depth > 1:
+            pd_result = self._index.get_transitive_dependent_reps(
+                (int(lib_id) for lib_id in lib_id2name), depth)
+            if not len(pd_result):
+                raise ValueError("No dependent repositories are found")
+        elif self._index is not None:
+            pd_result = self._index.get_dependent_reps(int(lib_id) for lib_id in lib_id2name)
+            if not len(pd_result):
+                raise ValueError("No dependent repositories are found")
+        else:
+            pd_result = [res for res in self._scan_dependencies(list(lib_id2name)) if len(res)]
+            pd_result = pd.concat(pd_result)
+
+        self._add_urls(pd_result)
         if save_to:
             pd_result.to_csv(save_to, index=False)
 
         return pd_result
 
+    @staticmethod
+    def _add_urls(reps):
+        reps["url"] = LibrariesIOFetcher._make_urls(reps)
+
+    @staticmethod
+    def _make_urls(reps):
+        return "https://" + reps["Host Type"].map(LibrariesIOFetcher.HOST2LINK) + \
+               reps["Repository Name with Owner"]
+
+    def _scan_dependencies(self, lib_ids):
+        return self._scan_csv(dependencies_filename, scan_dependencies_block,
+                              [int(lib_id) for lib_id in lib_ids])
+
+    def _scan_csv(self, filename, scan, arg):
+        # Only the offsets are found here, the workers read and parse the blocks themselves
+        path = os.path.join(self._librariesio_path, filename)
+        blocks = ((path, start, end, arg) for start, end in
+                  csv_block_ranges(path, LibrariesIOFetcher.BLOCK_SIZE))
+        if self._num_processes == 1:
+            results = (scan(*args) for args in blocks)
+            yield from progress_bar(results, self._log, expected_size=100)
+            return
+        with multiprocessing.Pool(self._num_processes) as pool:
+            results = _ordered_imap(pool, scan, blocks, 2 * self._num_processes)
+            yield from progress_bar(results, self._log, expected_size=100)
+
+    def get_repositories_info(self, keys) -> pd.DataFrame:
+        """
+        Finds the metadata of the repositories in the index or in the repositories file.
+
+        :param keys: Set of (host type, name with owner) pairs.
+        :return: Pandas dataframe with :attr:`LibrariesIOIndex.REPOSITORY_COLUMNS`.
+        """
+        if self._index is not None:
+            return self._index.get_repositories(keys)
+        self._log.info("Looking for repositories info...")
+        results = list(self._scan_csv(repos_filename, scan_repositories_block,
+                                      {name for _, name in keys}))
+        result = pd.concat(results) if results else \
+            pd.DataFrame(columns=LibrariesIOIndex.REPOSITORY_COLUMNS)
+        found = pd.MultiIndex.from_arrays([result["Host Type"], result["Name with Owner"]])
+        return result[found.isin(list(keys))]
+
+    def select_dependent_reps(self, dependent_reps, save_to=None, **kwargs):
+        """
+        Selects the dependent repositories with :func:`select_repositories`.
+
+        :param dependent_reps: Pandas dataframe from :meth:`get_dependent_reps`.
+        :param save_to: Path to save pandas dataframe with the selected repositories if you \
+            want to save it.
+        :param kwargs: key arguments to pass to :func:`select_repositories`.
+        :return: Pandas dataframe with the selected dependent repositories.
+        """
+        keys = set(zip(dependent_reps["Host Type"].tolist(),
+                       dependent_reps["Repository Name with Owner"].tolist()))
+        repositories = self.get_repositories_info(keys)
+        if kwargs.get("collapse_forks"):
+            sources = set(zip(repositories["Host Type"].tolist(),
+                              repositories["Fork Source Name with Owner"].tolist()))
+            sources = {(host, name) for host, name in sources
+                       if isinstance(name, str) and name} - keys
+            if sources:
+                repositories = pd.concat([repositories, self.get_repositories_info(sources)])
+        result = select_repositories(dependent_reps, repositories, **kwargs)
+        self._add_urls(result)
+        self._log.info("%d of %d dependent repositories are selected", len(result),
+                       len(dependent_reps))
+        if save_to:
+            result.to_csv(save_to, index=False)
+        return result
+
     def save_urls_only(self, dependent_reps, libs_info, save_to):
         """
         Create urls for repositories from dependent_reps for libraries from libs_info.
@@ -115,25 +418,83 @@ class LibrariesIOFetcher(PickleableLogger):
             Then urls will be stored in the file <library name>.txt . You can specify file, then
             all urls will be saved in one file.
         """
-        if not os.path.isdir(save_to) and os.path.exists(save_to):
-            os.remove(save_to)
-        for i, lib in libs_info.iterrows():
-            lib_id = int(lib["ID"])
-            lib_name = lib["Name"]
-            cur_dependent_reps = dependent_reps[dependent_reps["Dependency Project ID"] == lib_id]
-            res = cur_dependent_reps["url"].tolist()
-            res = list(set(res))
+        paths = self._url_paths(libs_info, save_to)
+        reps = dependent_reps[["Dependency Project ID", "url"]].dropna().drop_duplicates()
+        lib_urls = {int(lib_id): urls.tolist()
+                    for lib_id, urls in reps.groupby("Dependency Project ID")["url"]}
+        lines = {path: [] for path in paths.values()}
+        for lib_id, path in paths.items():
+            lines[path].extend(lib_urls.get(lib_id, []))
+        for path, path_lines in lines.items():
+            with open(path, "w") as f:
+                f.write("".join(line + "\n" for line in path_lines))
 
-            if os.path.isdir(save_to):
-                save_path = os.path.join(save_to, lib_name + ".txt")
-            else:
-                save_path = save_to
+    @staticmethod
+    def _url_paths(libs_info, save_to):
+        lib_ids = [int(lib_id) for lib_id in libs_info["ID"].tolist()]
+        if not os.path.isdir(save_to):
+            return {lib_id: save_to for lib_id in lib_ids}
+        return {lib_id: os.path.join(save_to, lib_name + ".txt")
+                for lib_id, lib_name in zip(lib_ids, libs_info["Name"].tolist())}
 
-            with open(save_path, "a") as f:
-                for line in res:
-                    f.write(line + "\n")
+    def iter_dependent_rep_urls(self, libs_info):
+        """
+        Finds the urls of dependent repositories block by block, so that they can be used before
+        the whole dataset is scanned.
 
-    def get_dependent_rep_urls(self, libraries, platform, output):
+        :param libs_info: Pandas dataframe with all information about libraries.
+        :return: Generator of dicts from library ids to the lists of urls which are found in the \
+            block and were not found before.
+        """
+        lib_ids = [int(lib_id) for lib_id in libs_info["ID"].tolist()]
+        seen = {lib_id: set() for lib_id in lib_ids}
+        if self._index is not None:
+            blocks = [self._index.get_dependent_reps(lib_ids)]
+        else:
+            blocks = self._scan_dependencies(lib_ids)
+        for block in blocks:
+            urls = {}
+            for lib_id, url in zip(block["Dependency Project ID"].tolist(),
+                                   self._make_urls(block).tolist()):
+                lib_seen = seen[int(lib_id)]
+                if isinstance(url, str) and url not in lib_seen:
+                    lib_seen.add(url)
+                    urls.setdefault(int(lib_id), []).append(url)
+            if urls:
+                yield urls
+
+    def stream_dependent_rep_urls(self, libraries, platform, output):
+        """
+        Extracts and saves urls of dependent repositories like :meth:`get_dependent_rep_urls`,
+        but appends the urls to the files as soon as every block of the dataset is scanned. The
+        files are created empty first and every block is appended with a single write, so they
+        can be tailed and contain only whole lines.
+
+        :param libraries: Dict of names and urls to repo or homepage. You can use empty url if \
+            you are not sure about the link.
+        :param platform: Package platform where the library is published. You can use empty
+        platform if you are not sure about a link.
+        :param output: Save location for urls, see :meth:`save_urls_only`.
+        :return: Number of saved urls.
+        """
+        libraries_info = self.get_lib_info(libraries, platform)
+        paths = self._url_paths(libraries_info, output)
+        for path in set(paths.values()):
+            open(path, "w").close()
+        saved = 0
+        for urls in self.iter_dependent_rep_urls(libraries_info):
+            lines = {}
+            for lib_id, lib_urls in urls.items():
+                lines.setdefault(paths[lib_id], []).extend(lib_urls)
+                saved += len(lib_urls)
+            for path, path_lines in lines.items():
+                append_lines(path, path_lines)
+        if not saved:
+            raise ValueError("No dependent repositories are found")
+        self._log.info("%d urls are saved", saved)
+        return saved
+
+    def get_dependent_rep_urls(self, libraries, platform, output, selection=None, depth=1):
         """
         Extract and save dependent urls of dependent repositories.
 
@@ -144,21 +505,60 @@ class LibrariesIOFetcher(PickleableLogger):
         :param output: Save location for urls. Specify folder if you have several libraries. \
             Then urls will be stored in the file <library name>.txt . You can specify file, then
             all urls will be saved in one file.
+        :param selection: key arguments to pass to :func:`select_repositories`. All the \
+            dependent repositories are saved if None.
+        :param depth: Maximal length of the dependency chain, see :meth:`get_dependent_reps`.
         :return:
         """
+        # The projects file is scanned for minutes, so the arguments are checked before it
+        check_depth(depth, self._index is not None)
         libraries_info = self.get_lib_info(libraries, platform)
-        dependent_reps = self.get_dependent_reps(libraries_info)
+        dependent_reps = self.get_dependent_reps(libraries_info, depth=depth)
+        if selection:
+            dependent_reps = self.select_dependent_reps(dependent_reps, **selection)
         self.save_urls_only(dependent_reps, libraries_info, save_to=output)
 
     def _get_log_name(self):
         return "LibrariesIOFetcher"
 
 
+def check_depth(depth: int, has_index: bool):
+    """
+    Checks the maximal length of the dependency chain.
+
+    :param depth: Maximal length of the dependency chain.
+    :param has_index: Whether the libraries.io index is used.
+    :return: None
+    :raise ValueError: if the depth is less than 1 or it is bigger than 1 without the index.
+    """
+    if depth < 1:
+        raise ValueError("The depth must be at least 1, got %d." % depth)
+    if depth > 1 and not has_index:
+        raise ValueError("Transitive dependencies require the libraries.io index. Build it "
+                         "with librariesio_index.")
+
+
 def dependent_reps_entry(args):
+    check_depth(args.depth, args.librariesio_index is not None)
     if args.libraries:
         libraries = dict(lib.split(":", maxsplit=1) for lib in args.libraries)
     else:
         libraries = json.load(open(args.libraries_json))
 
-    libio = LibrariesIOFetcher(args.librariesio_data, args.log_level)
-    libio.get_dependent_rep_urls(libraries, args.platform, args.output)
+    libio = LibrariesIOFetcher(args.librariesio_data, args.log_level, args.librariesio_index,
+                               args.processes)
+    platform = LibrariesIOFetcher.DEFAULT_PLATFORM if args.platform is None else args.platform
+    selection = {}
+    if args.collapse_forks or args.drop_inactive or args.top is not None or \
+            args.size_budget is not None:
+        selection = dict(collapse_forks=args.collapse_forks, drop_inactive=args.drop_inactive,
+                         rank_by=args.rank_by, top=args.top,
+                         size_budget=None if args.size_budget is None else
+                         parse_size(args.size_budget))
+    if not args.stream:
+        libio.get_dependent_rep_urls(libraries, platform, args.output, selection, args.depth)
+        return
+    if selection or args.depth > 1:
+        raise ValueError("--stream can not be combined with the selection of repositories and "
+                         "--depth: they need all the dependent repositories at once.")
+    libio.stream_dependent_rep_urls(libraries, platform, args.output)
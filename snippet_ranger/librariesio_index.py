@@ -0,0 +1,327 @@
+import bisect
+import logging
+import os
+
+import numpy
+import pandas as pd
+
+from snippet_ranger.bow_store import append_strings, StringTable
+from snippet_ranger.dependency_graph import DependencyGraph
+
+
+class LibrariesIOIndex:
+    """
+    Columnar copy of the libraries.io dataset with only the columns which are needed to find
+    dependent repositories. It is built once from the CSV files by :meth:`build` and then the
+    queries take milliseconds instead of the full scan. The arrays are memory-mapped.
+
+    Projects are sorted by name and platform. Dependencies are pairs of project id and
+    repository number sorted by project id; the repositories are stored once. If the dataset
+    has the repositories file, the metadata of the dependent repositories and of their fork
+    sources is stored too.
+    """
+    PROJECT_COLUMNS = ["ID", "Platform", "Name", "Repository URL"]
+    DEPENDENCY_COLUMNS = ["Host Type", "Repository Name with Owner", "Dependency Project ID"]
+    REPOSITORY_COLUMNS = ["Host Type", "Name with Owner", "Size", "Stars Count",
+                          "Fork Source Name with Owner", "Mirror URL", "Status"]
+    REPOSITORY_DTYPES = {"Host Type": str, "Name with Owner": str, "Size": "float64",
+                         "Stars Count": "float64", "Fork Source Name with Owner": str,
+                         "Mirror URL": str, "Status": str}
+    REPOSITORY_STRINGS = (("Fork Source Name with Owner", "repositories_fork"),
+                          ("Mirror URL", "repositories_mirror"),
+                          ("Status", "repositories_status"))
+    CHUNKSIZE = 1000000
+
+    @classmethod
+    def build(cls, librariesio_path: str, path: str, chunksize: int=CHUNKSIZE):
+        """
+        Converts the libraries.io CSV files to the index.
+
+        :param librariesio_path: Path to a folder where librariesio dataset is stored.
+        :param path: Index directory.
+        :param chunksize: Number of CSV rows to read at once.
+        :return: None
+        """
+        from snippet_ranger.librariesio_fetcher import dependencies_filename, \
+            projects_filename, repos_filename
+
+        log = logging.getLogger("librariesio_index")
+        os.makedirs(path, exist_ok=True)
+        log.info("Indexing projects...")
+        projects = pd.read_csv(os.path.join(librariesio_path, projects_filename),
+                               usecols=cls.PROJECT_COLUMNS + ["Repository ID"], index_col=False,
+                               dtype={"Platform": str, "Name": str, "Repository URL": str,
+                                      "Repository ID": "float64"})
+        projects = projects.dropna(subset=["ID"])
+        projects["Repository ID"] = projects["Repository ID"].fillna(-1)
+        projects = projects.fillna("")
+        projects = projects.sort_values(["Name", "Platform"], kind="mergesort")
+        numpy.save(os.path.join(path, "projects_id.npy"),
+                   projects["ID"].values.astype(numpy.int64))
+        for column, name in (("Name", "projects_name"), ("Platform", "projects_platform"),
+                             ("Repository URL", "projects_url")):
+            cls._write_strings(os.path.join(path, name), projects[column].tolist())
+        log.info("%d projects", len(projects))
+
+        log.info("Indexing dependencies...")
+        repositories = {}
+        project_ids = []
+        repository_ids = []
+        librariesio_ids = []
+        for chunk in pd.read_csv(os.path.join(librariesio_path, dependencies_filename),
+                                 usecols=cls.DEPENDENCY_COLUMNS + ["Repository ID"],
+                                 index_col=False, chunksize=chunksize,
+                                 dtype={"Host Type": str, "Repository Name with Owner": str,
+                                        "Repository ID": "float64"}):
+            chunk = chunk.dropna(subset=cls.DEPENDENCY_COLUMNS)
+            project_ids.append(chunk["Dependency Project ID"].values.astype(numpy.int64))
+            librariesio_ids.append(chunk["Repository ID"].fillna(-1).values.astype(numpy.int64))
+            repository_ids.append(numpy.fromiter(
+                (repositories.setdefault(key, len(repositories)) for key in
+                 zip(chunk["Host Type"].tolist(), chunk["Repository Name with Owner"].tolist())),
+                dtype=numpy.int64, count=len(chunk)))
+        project_ids = numpy.concatenate(project_ids) if project_ids else \
+            numpy.zeros(0, dtype=numpy.int64)
+        repository_ids = numpy.concatenate(repository_ids) if repository_ids else \
+            numpy.zeros(0, dtype=numpy.int64)
+        librariesio_ids = numpy.concatenate(librariesio_ids) if librariesio_ids else \
+            numpy.zeros(0, dtype=numpy.int64)
+        # Projects are linked to their own repositories by the libraries.io repository ID
+        librariesio_ids, first = numpy.unique(librariesio_ids, return_index=True)
+        projects_librariesio_id = projects["Repository ID"].values.astype(numpy.int64)
+        positions = numpy.minimum(numpy.searchsorted(librariesio_ids, projects_librariesio_id),
+                                  max(len(librariesio_ids) - 1, 0))
+        found = (projects_librariesio_id >= 0) & (len(librariesio_ids) > 0)
+        found[found] = librariesio_ids[positions[found]] == projects_librariesio_id[found]
+        projects_repository = numpy.full(len(projects), -1, dtype=numpy.int64)
+        projects_repository[found] = repository_ids[first[positions[found]]]
+        numpy.save(os.path.join(path, "projects_repository.npy"), projects_repository)
+        order = numpy.lexsort((repository_ids, project_ids))
+        numpy.save(os.path.join(path, "dependencies_project_id.npy"), project_ids[order])
+        numpy.save(os.path.join(path, "dependencies_repository.npy"), repository_ids[order])
+        log.info("%d dependencies of %d repositories", len(order), len(repositories))
+
+        repos_path = os.path.join(librariesio_path, repos_filename)
+        if os.path.exists(repos_path):
+            log.info("Indexing repository metadata...")
+            metadata = cls._read_repositories(repos_path, repositories, chunksize)
+            log.info("%d repositories have metadata", len(metadata))
+            # Fork sources are appended to the repositories and have no dependencies
+            missing = (numpy.nan, numpy.nan) + ("",) * len(cls.REPOSITORY_STRINGS)
+            columns = list(zip(*(metadata.get(i, missing) for i in range(len(repositories))))) \
+                or [()] * len(missing)
+            numpy.save(os.path.join(path, "repositories_size.npy"),
+                       numpy.array(columns[0], dtype=numpy.float64))
+            numpy.save(os.path.join(path, "repositories_stars.npy"),
+                       numpy.array(columns[1], dtype=numpy.float64))
+            for (_, name), strings in zip(cls.REPOSITORY_STRINGS, columns[2:]):
+                cls._write_strings(os.path.join(path, name), strings)
+        hosts = [None] * len(repositories)
+        names = [None] * len(repositories)
+        for (host, name), i in repositories.items():
+            hosts[i] = host
+            names[i] = name
+        cls._write_strings(os.path.join(path, "repositories_host"), hosts)
+        cls._write_strings(os.path.join(path, "repositories_name"), names)
+        numpy.save(os.path.join(path, "repositories_order.npy"), numpy.array(
+            sorted(range(len(names)), key=lambda i: (names[i], hosts[i])), dtype=numpy.int64))
+
+    @classmethod
+    def _read_repositories(cls, repos_path, repositories, chunksize):
+        metadata = {}
+
+        def scan(keys):
+            wanted = {name for _, name in keys}
+            for chunk in pd.read_csv(repos_path, usecols=cls.REPOSITORY_COLUMNS, index_col=False,
+                                     chunksize=chunksize, dtype=cls.REPOSITORY_DTYPES):
+                chunk = chunk[chunk["Name with Owner"].isin(wanted)]
+                strings = chunk[[column for column, _ in cls.REPOSITORY_STRINGS]].fillna("")
+                for row in zip(chunk["Host Type"].tolist(), chunk["Name with Owner"].tolist(),
+                               chunk["Size"].tolist(), chunk["Stars Count"].tolist(),
+                               *(strings[column].tolist() for column in strings)):
+                    i = keys.get(row[:2])
+                    if i is not None:
+                        metadata.setdefault(i, row[2:])
+
+        scan(repositories)
+        sources = {}
+        for (host, _), i in repositories.items():
+            if i in metadata and metadata[i][2] and (host, metadata[i][2]) not in repositories:
+                sources[(host, metadata[i][2])] = len(repositories) + len(sources)
+        repositories.update(sources)
+        if sources:
+            scan(sources)
+        return metadata
+
+    @staticmethod
+    def _write_strings(path, strings):
+        for suffix in (".lengths", ".chars"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        append_strings(path, strings)
+
+    def __init__(self, path: str):
+        """
+        :param path: Index directory.
+        """
+        self._projects_id = numpy.load(os.path.join(path, "projects_id.npy"), mmap_mode="r")
+        self._projects_name = StringTable(os.path.join(path, "projects_name"))
+        self._projects_platform = StringTable(os.path.join(path, "projects_platform"))
+        self._projects_url = StringTable(os.path.join(path, "projects_url"))
+        self._dependencies_project_id = numpy.load(
+            os.path.join(path, "dependencies_project_id.npy"), mmap_mode="r")
+        self._dependencies_repository = numpy.load(
+            os.path.join(path, "dependencies_repository.npy"), mmap_mode="r")
+        self._repositories_host = StringTable(os.path.join(path, "repositories_host"))
+        self._repositories_name = StringTable(os.path.join(path, "repositories_name"))
+        self._repositories_order = numpy.load(os.path.join(path, "repositories_order.npy"),
+                                              mmap_mode="r")
+        projects_repository = os.path.join(path, "projects_repository.npy")
+        self._projects_repository = numpy.load(projects_repository, mmap_mode="r") \
+            if os.path.exists(projects_repository) else None
+        self._graph = None
+        size_path = os.path.join(path, "repositories_size.npy")
+        if os.path.exists(size_path):
+            self._repositories_size = numpy.load(size_path, mmap_mode="r")
+            self._repositories_stars = numpy.load(
+                os.path.join(path, "repositories_stars.npy"), mmap_mode="r")
+            self._repositories_strings = [StringTable(os.path.join(path, name))
+                                          for _, name in self.REPOSITORY_STRINGS]
+        else:
+            self._repositories_size = None
+
+    @property
+    def has_repositories(self) -> bool:
+        """
+        Returns True if the index has the repository metadata.
+        """
+        return self._repositories_size is not None
+
+    def get_lib_info(self, libraries: dict, platform: str) -> pd.DataFrame:
+        """
+        Finds the libraries in the projects. The arguments are the same as of
+        :meth:`snippet_ranger.librariesio_fetcher.LibrariesIOFetcher.get_lib_info`.
+
+        :param libraries: Dict of names and urls to repo or homepage. Empty url matches any.
+        :param platform: Package platform where the library is published. Empty platform \
+            matches any.
+        :return: Pandas dataframe with ID, Platform, Name and Repository URL columns.
+        """
+        rows = []
+        for name, url in libraries.items():
+            first = bisect.bisect_left(self._projects_name, name)
+            last = bisect.bisect_right(self._projects_name, name, lo=first)
+            for i in range(first, last):
+                if platform and self._projects_platform[i] != platform:
+                    continue
+                project_url = self._projects_url[i]
+                if url and project_url and project_url != url:
+                    continue
+                rows.append((int(self._projects_id[i]), self._projects_platform[i], name,
+                             project_url))
+        return pd.DataFrame(rows, columns=self.PROJECT_COLUMNS)
+
+    def get_dependent_reps(self, project_ids) -> pd.DataFrame:
+        """
+        Finds the repositories which depend on the projects.
+
+        :param project_ids: Iterable of project ids.
+        :return: Pandas dataframe with Dependency Project ID, Host Type and Repository Name \
+            with Owner columns.
+        """
+        project_ids = numpy.unique(numpy.fromiter(project_ids, dtype=numpy.int64))
+        starts = numpy.searchsorted(self._dependencies_project_id, project_ids, side="left")
+        ends = numpy.searchsorted(self._dependencies_project_id, project_ids, side="right")
+        positions = numpy.concatenate([numpy.arange(start, end)
+                                       for start, end in zip(starts, ends)] +
+                                      [numpy.zeros(0, dtype=numpy.int64)])
+        repositories = self._dependencies_repository[positions].tolist()
+        return pd.DataFrame({
+            "Dependency Project ID": self._dependencies_project_id[positions].astype(numpy.int64),
+            "Host Type": [self._repositories_host[i] for i in repositories],
+            "Repository Name with Owner": [self._repositories_name[i] for i in repositories],
+        }, columns=["Dependency Project ID", "Host Type", "Repository Name with Owner"])
+
+    @property
+    def graph(self) -> DependencyGraph:
+        """
+        Returns the reverse dependency graph of the projects. It is built on the first access.
+        """
+        if self._graph is None:
+            if self._projects_repository is None:
+                raise ValueError("The index has no links between the projects and their "
+                                 "repositories. Rebuild it.")
+            self._graph = DependencyGraph(
+                self._dependencies_project_id, self._dependencies_repository,
+                self._projects_id, self._projects_repository, len(self._repositories_name))
+        return self._graph
+
+    def get_transitive_dependent_reps(self, project_ids, depth: int) -> pd.DataFrame:
+        """
+        Finds the repositories which depend on the projects directly or through other projects
+        with :meth:`DependencyGraph.dependent_repositories`.
+
+        :param project_ids: Iterable of project ids.
+        :param depth: Maximal length of the dependency chain. 1 means direct dependencies.
+        :return: Pandas dataframe with Dependency Project ID, Host Type, Repository Name \
+            with Owner and Depth columns. Every repository is listed once per project with the \
+            shortest dependency chain.
+        """
+        project_ids = numpy.unique(numpy.fromiter(project_ids, dtype=numpy.int64))
+        columns = {"Dependency Project ID": [], "Repository": [], "Depth": []}
+        for level, repositories in enumerate(
+                self.graph.dependent_repositories(project_ids, depth), start=1):
+            repositories = repositories.tocoo()
+            columns["Dependency Project ID"].append(project_ids[repositories.col])
+            columns["Repository"].append(repositories.row.astype(numpy.int64))
+            columns["Depth"].append(numpy.full(repositories.nnz, level, dtype=numpy.int64))
+        for key, values in columns.items():
+            columns[key] = numpy.concatenate(values + [numpy.zeros(0, dtype=numpy.int64)])
+        order = numpy.lexsort((columns["Repository"], columns["Depth"],
+                               columns["Dependency Project ID"]))
+        repositories = columns["Repository"][order].tolist()
+        return pd.DataFrame({
+            "Dependency Project ID": columns["Dependency Project ID"][order],
+            "Host Type": [self._repositories_host[i] for i in repositories],
+            "Repository Name with Owner": [self._repositories_name[i] for i in repositories],
+            "Depth": columns["Depth"][order],
+        }, columns=["Dependency Project ID", "Host Type", "Repository Name with Owner", "Depth"])
+
+    def get_repositories(self, keys) -> pd.DataFrame:
+        """
+        Finds the metadata of the repositories.
+
+        :param keys: Iterable of (host type, name with owner) pairs.
+        :return: Pandas dataframe with :attr:`REPOSITORY_COLUMNS`. Empty strings mean no value.
+        """
+        if not self.has_repositories:
+            raise ValueError("The index has no repository metadata. Rebuild it with the "
+                             "repositories file in the dataset.")
+        names = _Permutation(self._repositories_name, self._repositories_order)
+        rows = []
+        for host, name in keys:
+            first = bisect.bisect_left(names, name)
+            last = bisect.bisect_right(names, name, lo=first)
+            for i in self._repositories_order[first:last].tolist():
+                if self._repositories_host[i] != host:
+                    continue
+                rows.append((host, name, float(self._repositories_size[i]),
+                             float(self._repositories_stars[i])) +
+                            tuple(strings[i] for strings in self._repositories_strings))
+        return pd.DataFrame(rows, columns=self.REPOSITORY_COLUMNS)
+
+
+class _Permutation:
+    def __init__(self, sequence, order):
+        self._sequence = sequence
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, item):
+        return self._sequence[int(self._order[item])]
+
+
+def librariesio_index_entry(args):
+    LibrariesIOIndex.build(args.librariesio_data, args.output)
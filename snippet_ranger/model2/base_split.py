@@ -12,10 +12,12 @@ class Model2BaseSplit(Model2Base):
     as :class:`snippet_ranger.Snippet` model (see :class:`snippet_ranger.Source2Func` class).
 
     This class the next pipeline:
-    1. Filter unrelated objects in the input Model with `input_model_object_criteria` function.
-    2. Split one model object into several objects of new model with `split_model_object` function.
-    3. Discard some new objects appeared on step 2 with `output_model_object_criteria` function.
-    4. Save new model with all remaining object.
+    1. Precompute everything needed for the next steps from the input model object with \
+       `prepare_model_object` function.
+    2. Filter unrelated objects in the input Model with `input_model_object_criteria` function.
+    3. Split one model object into several objects of new model with `split_model_object` function.
+    4. Discard some new objects appeared on step 3 with `output_model_object_criteria` function.
+    5. Save new model with all remaining object.
 
     Produce exactly one model from one.
     """
@@ -24,10 +26,21 @@ class Model2BaseSplit(Model2Base):
 
     def filter_input_model_content(self, model) -> Iterable:
         """
-        Filter object of input model by criteria in input_model_object_criteria
+        Prepare objects of input model with prepare_model_object and filter them by criteria in
+        input_model_object_criteria
         :return: Remaining objects.
         """
-        return filter(self.input_model_object_criteria, model)
+        return filter(self.input_model_object_criteria, map(self.prepare_model_object, model))
+
+    def prepare_model_object(self, model_object):
+        """
+        Precompute the data which is needed for filtration and splitting of the model object, so
+        the next steps do not have to process it again.
+        No preparation by default.
+        :param model_object: Model object.
+        :return: Prepared model object.
+        """
+        return model_object
 
     def input_model_object_criteria(self, model_object):
         """
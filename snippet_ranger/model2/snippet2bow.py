@@ -1,9 +1,9 @@
-import os
-from collections import defaultdict
+from itertools import islice
 import logging
-import math
+import os
 
 from ast2vec.bow import BOW
+from ast2vec.model2.base import Model2Base
 from ast2vec.model2.source2bow import UastModel2BOW, Uasts2BOW
 from ast2vec.df import DocumentFrequencies
 from ast2vec.token_parser import NoTokenParser
@@ -12,83 +12,474 @@ from ast2vec.bblfsh_roles import SIMPLE_IDENTIFIER, CALL_CALLEE
 import numpy
 from scipy.sparse import csr_matrix
 
+from snippet_ranger.bow_store import BOWStore, BOWStoreWriter
+from snippet_ranger.models.hashed_bow import HashedBOW
 from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.sketch import hash_tokens
+from snippet_ranger.token_parser import CachingTokenParser, log_cache_stats
 
 
 class Snippet2BOW(Uasts2BOW):
+    """
+    Converts snippet UASTs to TF-IDF weighted bags of words. IDF of every vocabulary token is
+    calculated once, so the weights of the whole Snippet model are computed in one vectorized
+    call: `log(1 + tf) * idf`.
+    """
     def __init__(self, vocabulary: dict, docfreq: DocumentFrequencies,
                  getter: callable, token_parser=None, role=SIMPLE_IDENTIFIER):
         super().__init__(vocabulary, docfreq, getter)
-        if token_parser is not None:
-            self._uast2bag = UastIds2Bag(vocabulary, token_parser)
+        self._token_parser = CachingTokenParser() if token_parser is None else token_parser
+        self._uast2bag = UastIds2Bag(vocabulary, self._token_parser)
         self.role = role
+        freqs = numpy.array([docfreq.get(token, 0) for token in self._reverse_vocabulary],
+                            dtype=numpy.float64)
+        # Tokens which are missing in the document frequencies are dropped
+        self._idf = numpy.full(len(freqs), numpy.nan)
+        known = freqs > 0
+        self._idf[known] = numpy.log(docfreq.docs / freqs[known])
+
+    @property
+    def token_parser(self):
+        """
+        Returns the token parser of the node tokens.
+        """
+        return self._token_parser
+
+    @property
+    def idf(self) -> numpy.ndarray:
+        """
+        Returns IDF of every vocabulary token, NaN for tokens without document frequency.
+        """
+        return self._idf
+
+    def uasts_to_ids(self, uasts) -> tuple:
+        """
+        Converts UASTs to token ids and their frequencies.
+
+        :param uasts: Iterable of UASTs.
+        :return: Number of distinct tokens in every UAST, concatenated token ids and \
+            frequencies.
+        """
+        sizes = []
+        ids = []
+        counts = []
+        for uast in uasts:
+            bag = self._uast2bag.uast_to_bag(self._getter(uast), self.role)
+            sizes.append(len(bag))
+            ids.extend(bag.keys())
+            counts.extend(bag.values())
+        return (numpy.array(sizes, dtype=numpy.int64), numpy.array(ids, dtype=numpy.int32),
+                numpy.array(counts, dtype=numpy.float64))
+
+    def transform(self, uasts) -> tuple:
+        """
+        Converts UASTs to TF-IDF weighted token ids.
+
+        :param uasts: Iterable of UASTs.
+        :return: Number of tokens in every UAST, concatenated token ids and weights.
+        """
+        return self.weigh(*self.uasts_to_ids(uasts))
+
+    def weigh(self, sizes: numpy.ndarray, ids: numpy.ndarray, counts: numpy.ndarray) -> tuple:
+        """
+        Calculates TF-IDF weights of the token ids. Tokens without document frequency are
+        dropped.
+
+        :param sizes: Number of tokens in every bag.
+        :param ids: Concatenated token ids of the bags.
+        :param counts: Concatenated token frequencies of the bags.
+        :return: Number of tokens in every bag, concatenated token ids and weights.
+        """
+        weights = numpy.log1p(numpy.asarray(counts, dtype=numpy.float64)) * self._idf[ids]
+        known = ~numpy.isnan(weights)
+        if not known.all():
+            rows = numpy.repeat(numpy.arange(len(sizes)), sizes)
+            sizes = numpy.bincount(rows[known], minlength=len(sizes))
+            ids, weights = ids[known], weights[known]
+        return sizes, ids, weights
 
     def __call__(self, file_uast):
-        freqs = defaultdict(int)
-        bag = self._uast2bag.uast_to_bag(self._getter(file_uast), self.role)
-        for key, freq in bag.items():
-            freqs[key] += freq
-        missing = []
-        for key, val in freqs.items():
-            try:
-                freqs[key] = math.log(1 + val) * math.log(
-                    self._docfreq.docs / self._docfreq[self._reverse_vocabulary[key]])
-            except KeyError:
-                missing.append(key)
-        for key in missing:
-            del freqs[key]
-        return dict(freqs)
-
-
-class SnippetModel2BOW(UastModel2BOW):
+        _, ids, weights = self.transform([file_uast])
+        return dict(zip(ids.tolist(), weights.tolist()))
+
+
+class HashingSnippet2BOW:
+    """
+    Converts snippet UASTs to bags of words with the hashing trick: the token column is its hash
+    modulo `width`, so neither the vocabulary nor the document frequencies are needed in advance.
+    IDF is calculated online from the document frequencies of the columns seen so far:
+    `log((1 + docs) / (1 + df)) + 1`. A few tokens of every column are sampled to name it.
+    """
+    def __init__(self, width: int=2 ** 18, token_parser=None, role: int=SIMPLE_IDENTIFIER,
+                 idf: bool=True, samples: int=3):
+        """
+        :param width: Number of columns.
+        :param token_parser: Token parser for the node tokens. :class:`CachingTokenParser` if \
+            None.
+        :param role: Role of the nodes to put into the bags.
+        :param idf: Weigh the tokens with the online IDF. Only `log(1 + tf)` is used otherwise.
+        :param samples: Maximal number of tokens to remember for every column.
+        """
+        self._token_parser = CachingTokenParser() if token_parser is None else token_parser
+        self._uast2bag = UastIds2Bag(None, self._token_parser)
+        self.role = role
+        self._width = width
+        self._df = numpy.zeros(width, dtype=numpy.int64) if idf else None
+        self._docs = 0
+        self._max_samples = samples
+        self._samples = {}
+
+    @property
+    def width(self) -> int:
+        """
+        Returns the number of columns.
+        """
+        return self._width
+
+    @property
+    def token_parser(self):
+        """
+        Returns the token parser of the node tokens.
+        """
+        return self._token_parser
+
+    @property
+    def docs(self) -> int:
+        """
+        Returns the number of weighed bags.
+        """
+        return self._docs
+
+    @property
+    def reverse_map(self) -> dict:
+        """
+        Returns the sampled tokens of every seen column.
+        """
+        return self._samples
+
+    def tokens(self) -> list:
+        """
+        Returns the column names: the sampled tokens joined with "|" or "#<column>" for the
+        columns which have not been seen yet. Tokens of different columns never intersect, so
+        the names are unique.
+        """
+        return ["|".join(self._samples[i]) if i in self._samples else "#%d" % i
+                for i in range(self._width)]
+
+    def column_names(self, columns) -> dict:
+        """
+        Returns the names of the given columns which have been seen.
+
+        :param columns: Iterable of column indices.
+        :return: :class:`dict` from the column to its sampled tokens joined with "|".
+        """
+        return {c: "|".join(self._samples[c]) for c in columns if c in self._samples}
+
+    def hash(self, tokens: list) -> numpy.ndarray:
+        """
+        Maps the tokens to columns and samples them to the reverse map.
+
+        :param tokens: List of unique tokens.
+        :return: int64 array of columns.
+        """
+        columns = (hash_tokens(tokens) % numpy.uint64(self._width)).astype(numpy.int64)
+        for token, column in zip(tokens, columns.tolist()):
+            samples = self._samples.setdefault(column, [])
+            if len(samples) < self._max_samples and token not in samples:
+                samples.append(token)
+        return columns
+
+    def uasts_to_ids(self, uasts) -> tuple:
+        """
+        Converts UASTs to columns and their frequencies. The frequencies of the colliding
+        tokens are summed.
+
+        :param uasts: Iterable of UASTs.
+        :return: Number of distinct columns in every UAST, concatenated columns and \
+            frequencies.
+        """
+        sizes = []
+        tokens = []
+        counts = []
+        for uast in uasts:
+            bag = self._uast2bag.uast_to_bag(uast, self.role)
+            sizes.append(len(bag))
+            tokens.extend(bag.keys())
+            counts.extend(bag.values())
+        unique, inverse = numpy.unique(numpy.array(tokens, dtype=str), return_inverse=True)
+        columns = self.hash(unique.tolist())[inverse]
+        rows = numpy.repeat(numpy.arange(len(sizes), dtype=numpy.int64), sizes)
+        keys, inverse = numpy.unique(rows * self._width + columns, return_inverse=True)
+        counts = numpy.bincount(inverse, weights=counts, minlength=len(keys))
+        return (numpy.bincount(keys // self._width, minlength=len(sizes)),
+                (keys % self._width).astype(numpy.int32), counts)
+
+    def weigh(self, sizes: numpy.ndarray, ids: numpy.ndarray, counts: numpy.ndarray) -> tuple:
+        """
+        Updates the online document frequencies with the bags and calculates the weights.
+
+        :param sizes: Number of columns in every bag.
+        :param ids: Concatenated columns of the bags. They must be unique inside every bag.
+        :param counts: Concatenated frequencies of the bags.
+        :return: Number of columns in every bag, concatenated columns and weights.
+        """
+        weights = numpy.log1p(numpy.asarray(counts, dtype=numpy.float64))
+        self._docs += len(sizes)
+        if self._df is not None:
+            numpy.add.at(self._df, ids, 1)
+            weights *= numpy.log((1 + self._docs) / (1 + self._df[ids])) + 1
+        return sizes, ids, weights
+
+    def transform(self, uasts) -> tuple:
+        """
+        Converts UASTs to weighted columns.
+
+        :param uasts: Iterable of UASTs.
+        :return: Number of columns in every UAST, concatenated columns and weights.
+        """
+        return self.weigh(*self.uasts_to_ids(uasts))
+
+
+def snippets_to_matrix(model: Snippet, transform: callable, columns: int,
+                       chunk_size: int) -> csr_matrix:
+    """
+    Converts all the snippets of the model to the rows of CSR matrix chunk by chunk.
+
+    :param model: Snippet model.
+    :param transform: Function which converts the iterable of UASTs to the number of nonzeros \
+        in every row, concatenated column indices and values.
+    :param columns: Number of columns.
+    :param chunk_size: Number of snippets to transform at once.
+    :return: :class:`csr_matrix`.
+    """
+    builder = CSRBuilder(len(model), columns)
+    uasts = model.iter_uasts()
+    for start in range(0, len(model), chunk_size):
+        builder.extend(*transform(islice(uasts, min(chunk_size, len(model) - start))))
+    return builder.build()
+
+
+class CSRBuilder:
+    """
+    Builds CSR matrix row by row. `indptr` is preallocated for all the rows and `indices` and
+    `data` grow geometrically, so there are no intermediate Python objects per nonzero.
+    """
+    def __init__(self, rows: int, columns: int, capacity: int=None, dtype=numpy.float32):
+        """
+        :param rows: Number of rows.
+        :param columns: Number of columns.
+        :param capacity: Initial number of nonzeros to allocate. `rows` if it is None.
+        :param dtype: Matrix data type.
+        """
+        self._shape = (rows, columns)
+        self._indptr = numpy.zeros(rows + 1, dtype=numpy.int64)
+        capacity = max(capacity if capacity is not None else rows, 1)
+        self._indices = numpy.empty(capacity, dtype=numpy.int32)
+        self._data = numpy.empty(capacity, dtype=dtype)
+        self._row = 0
+
+    @property
+    def nnz(self) -> int:
+        """
+        Returns the number of nonzeros added so far.
+        """
+        return int(self._indptr[self._row])
+
+    def extend(self, sizes: numpy.ndarray, indices: numpy.ndarray, data: numpy.ndarray):
+        """
+        Appends several rows.
+
+        :param sizes: Number of nonzeros in every row.
+        :param indices: Concatenated column indices of the rows.
+        :param data: Concatenated values of the rows.
+        :return: None
+        """
+        sizes = numpy.asarray(sizes, dtype=numpy.int64)
+        rows = len(sizes)
+        if self._row + rows > self._shape[0]:
+            raise ValueError("Too many rows: %d > %d" % (self._row + rows, self._shape[0]))
+        start = self.nnz
+        end = start + len(indices)
+        if end > len(self._indices):
+            capacity = max(end, 2 * len(self._indices))
+            self._indices = numpy.resize(self._indices, capacity)
+            self._data = numpy.resize(self._data, capacity)
+        # Sort the column indices inside every row
+        order = numpy.lexsort((indices, numpy.repeat(numpy.arange(rows), sizes)))
+        self._indices[start:end] = indices[order]
+        self._data[start:end] = data[order]
+        numpy.cumsum(sizes, out=self._indptr[self._row + 1:self._row + rows + 1])
+        self._indptr[self._row + 1:self._row + rows + 1] += start
+        self._row += rows
+
+    def build(self) -> csr_matrix:
+        """
+        Creates the matrix. All the rows must be added.
+
+        :return: :class:`csr_matrix`.
+        """
+        if self._row != self._shape[0]:
+            raise ValueError("Only %d rows of %d are added" % (self._row, self._shape[0]))
+        nnz = self.nnz
+        return csr_matrix((self._data[:nnz].copy(), self._indices[:nnz].copy(), self._indptr),
+                          shape=self._shape)
+
+
+class SnippetModel2BOWBase(UastModel2BOW):
+    """
+    Base class for Snippet to BOW conversion. Every snippet becomes a row of the BOW matrix.
+    Subclasses create `self._uasts2bow` - :class:`Snippet2BOW` instance.
+    """
     MODEL_FROM_CLASS = Snippet
+    CHUNK_SIZE = 1000  #: The number of snippets which are weighted at once.
 
-    def __init__(self, topn, docfreq, *args, **kwargs):
-        super().__init__(topn, docfreq, *args, **kwargs)
-        vocabulary = {t: i for i, t in enumerate(self._tokens)}
-        self._uasts2bow = Snippet2BOW(vocabulary, docfreq, lambda x: x)
+    def convert_to_store(self, srcdir: str, path: str, pattern: str="**/*.asdf") -> int:
+        """
+        Appends the rows of all the Snippet models to the single :class:`BOWStore` instead of
+        writing one BOW model per Snippet model. Every worker writes its own shard.
+
+        :param srcdir: The directory to scan for the models.
+        :param path: Store directory.
+        :param pattern: glob pattern for the files.
+        :return: The number of converted files.
+        """
+        BOWStore.create(path, self._tokens, overwrite=self.overwrite_existing)
+        self._store_path = path
+        try:
+            result = self.convert(srcdir, path, pattern)
+        finally:
+            self._store_path = None
+        BOWStore.build_index(path)
+        return result
+
+    @property
+    def tokens(self) -> list:
+        """
+        Returns the vocabulary: the names of the BOW columns.
+        """
+        return self._tokens
+
+    def model_to_matrix(self, model: Snippet) -> csr_matrix:
+        """
+        Converts the snippets of the model to the rows of the BOW matrix.
+
+        :param model: Snippet model.
+        :return: :class:`csr_matrix` with a row per snippet.
+        """
+        return snippets_to_matrix(model, self._uasts2bow.transform,
+                                  len(self._uasts2bow.vocabulary), self.CHUNK_SIZE)
 
     def convert_model(self, model: Snippet) -> BOW:
-        bags = [self._uasts2bow(uast) for uast in model.uasts]
-        data = list(zip(*[(bag_[x], i, x) for i, bag_ in enumerate(bags) for x in bag_]))
-        matrix = csr_matrix((data[0], (data[1], data[2])),
-                            shape=(len(bags), len(self._uasts2bow.vocabulary)),
-                            dtype=numpy.float32)
+        matrix = self.model_to_matrix(model)
+        if getattr(self, "_store_path", None) is not None:
+            if getattr(self, "_store_writer", None) is None:
+                self._store_writer = BOWStoreWriter(self._store_path, str(os.getpid()))
+            self._store_writer.append(model.names, matrix)
+            return None
         bow = BOW(log_level=logging.WARNING)
         bow.construct(repos=model.names, matrix=matrix, tokens=self._tokens)
         bow.meta["dependencies"] = [self._uasts2bow.docfreq]
         return bow
 
+    def finalize(self, index: int, destdir: str):
+        log_cache_stats(self._log, self._uasts2bow.token_parser)
 
-class SnippetModel2FuncCallsBOW(UastModel2BOW):
-    # TODO(zurk): docstring
+    def convert_bags(self, bags) -> BOW:
+        """
+        Converts the bags which are already extracted from the Snippet model to BOW. The result
+        is the same as :meth:`convert_model` returns for the model.
 
-    MODEL_FROM_CLASS = Snippet
+        :param bags: :class:`snippet_ranger.model2.snippet2df_bow.SnippetBags` of the model.
+        :return: BOW model.
+        """
+        vocabulary = self._uasts2bow.vocabulary
+        token_ids = numpy.array([vocabulary.get(token, -1) for token in bags.tokens],
+                                dtype=numpy.int64)
+        ids = token_ids[bags.ids]
+        known = ids >= 0
+        rows = numpy.repeat(numpy.arange(len(bags)), numpy.diff(bags.indptr))
+        sizes = numpy.bincount(rows[known], minlength=len(bags))
+        sizes, ids, weights = self._uasts2bow.weigh(sizes, ids[known], bags.counts[known])
+        builder = CSRBuilder(len(bags), len(vocabulary), capacity=len(ids))
+        builder.extend(sizes, ids, weights)
+        bow = BOW(log_level=logging.WARNING)
+        bow.construct(repos=list(bags.names), matrix=builder.build(), tokens=self._tokens)
+        bow.meta["dependencies"] = [self._uasts2bow.docfreq]
+        return bow
+
+
+class SnippetModel2BOW(SnippetModel2BOWBase):
+    """
+    Converts Snippet model to BOW of the simple identifiers.
+    """
+    def __init__(self, topn, docfreq, *args, **kwargs):
+        super().__init__(topn, docfreq, *args, **kwargs)
+        vocabulary = {t: i for i, t in enumerate(self._tokens)}
+        self._uasts2bow = Snippet2BOW(vocabulary, docfreq, lambda x: x)
 
+
+class SnippetModel2FuncCallsBOW(SnippetModel2BOWBase):
+    """
+    Converts Snippet model to BOW of the function calls. Function names are not split.
+    """
     def __init__(self, topn, docfreq, *args, **kwargs):
         super().__init__(topn, docfreq, *args, **kwargs)
         vocabulary = {t: i for i, t in enumerate(self._tokens)}
         self._uasts2bow = Snippet2BOW(vocabulary, docfreq, lambda x: x, NoTokenParser(),
                                       CALL_CALLEE)
 
-    def convert_model(self, model: Snippet) -> BOW:
-        bags = [self._uasts2bow(uast) for uast in model.uasts]
-        data = list(zip(*[(bag_[x], i, x) for i, bag_ in enumerate(bags) for x in bag_]))
-        matrix = csr_matrix((data[0], (data[1], data[2])),
-                            shape=(len(bags), len(self._uasts2bow.vocabulary)),
-                            dtype=numpy.float32)
-        bow = BOW(log_level=logging.WARNING)
-        bow.construct(repos=model.names, matrix=matrix, tokens=self._tokens)
-        bow.meta["dependencies"] = [self._uasts2bow.docfreq]
+
+class SnippetModel2HashedBOW(Model2Base):
+    """
+    Converts Snippet model to :class:`HashedBOW` with :class:`HashingSnippet2BOW` in a single
+    pass. Every worker has its own online IDF and reverse map, so the column names of the models
+    are the samples which the worker has seen so far. The columns themselves are the same in all
+    the models. Only the names of the columns which appear in the model are stored.
+    """
+    MODEL_FROM_CLASS = Snippet
+    MODEL_TO_CLASS = HashedBOW
+    CHUNK_SIZE = SnippetModel2BOWBase.CHUNK_SIZE
+
+    def __init__(self, width: int=2 ** 18, token_parser=None, role: int=SIMPLE_IDENTIFIER,
+                 idf: bool=True, samples: int=3, *args, **kwargs):
+        """
+        :param width: Number of columns.
+        :param token_parser: Token parser for the node tokens. :class:`CachingTokenParser` if \
+            None.
+        :param role: Role of the nodes to put into the bags.
+        :param idf: Weigh the tokens with the online IDF.
+        :param samples: Maximal number of tokens to remember for every column.
+        :param args: positional arguments to pass to :class:`Model2Base`.
+        :param kwargs: key arguments to pass to :class:`Model2Base`.
+        """
+        super().__init__(*args, **kwargs)
+        self._uasts2bow = HashingSnippet2BOW(width, token_parser, role, idf, samples)
+
+    def convert_model(self, model: Snippet) -> HashedBOW:
+        matrix = snippets_to_matrix(model, self._uasts2bow.transform, self._uasts2bow.width,
+                                    self.CHUNK_SIZE)
+        bow = HashedBOW(log_level=logging.WARNING)
+        bow.construct(repos=model.names, matrix=matrix,
+                      names=self._uasts2bow.column_names(numpy.unique(matrix.indices).tolist()))
+        bow.meta["dependencies"] = []
         return bow
 
+    def finalize(self, index: int, destdir: str):
+        log_cache_stats(self._log, self._uasts2bow.token_parser)
+
+    def _get_log_name(self):
+        return "snippet2hashed_bow"
+
 
 def snippet2bow_entry(args):
     df = DocumentFrequencies().load(args.docfreq)
     os.makedirs(args.output, exist_ok=True)
     converter = SnippetModel2BOW(args.vocabulary_size, df, num_processes=args.processes,
                                  overwrite_existing=args.overwrite_existing)
-    converter.convert(args.input, args.output, pattern=args.filter)
+    if getattr(args, "store", False):
+        converter.convert_to_store(args.input, args.output, pattern=args.filter)
+    else:
+        converter.convert(args.input, args.output, pattern=args.filter)
 
 
 def snippet2fc_bow_entry(args):
@@ -96,4 +487,24 @@ def snippet2fc_bow_entry(args):
     os.makedirs(args.output, exist_ok=True)
     converter = SnippetModel2FuncCallsBOW(args.vocabulary_size, df, num_processes=args.processes,
                                           overwrite_existing=args.overwrite_existing)
+    if getattr(args, "store", False):
+        converter.convert_to_store(args.input, args.output, pattern=args.filter)
+    else:
+        converter.convert(args.input, args.output, pattern=args.filter)
+
+
+def snippet2hashed_bow_entry(args):
+    os.makedirs(args.output, exist_ok=True)
+    converter = SnippetModel2HashedBOW(2 ** args.hash_bits, idf=args.idf, samples=args.samples,
+                                       num_processes=args.processes,
+                                       overwrite_existing=args.overwrite_existing)
+    converter.convert(args.input, args.output, pattern=args.filter)
+
+
+def snippet2fc_hashed_bow_entry(args):
+    os.makedirs(args.output, exist_ok=True)
+    converter = SnippetModel2HashedBOW(2 ** args.hash_bits, NoTokenParser(), CALL_CALLEE,
+                                       idf=args.idf, samples=args.samples,
+                                       num_processes=args.processes,
+                                       overwrite_existing=args.overwrite_existing)
     converter.convert(args.input, args.output, pattern=args.filter)
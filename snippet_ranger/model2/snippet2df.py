@@ -1,17 +1,81 @@
+from collections import Counter, namedtuple
+import logging
+import multiprocessing
 import tempfile
 from typing import Union
 
-from ast2vec.model2.source2df import Uast2DocFreq, MergeDocFreq
+from ast2vec.model2.source2df import Uast2DocFreq
 from ast2vec.df import DocumentFrequencies
 from ast2vec.bblfsh_roles import SIMPLE_IDENTIFIER, CALL_CALLEE
-from ast2vec.source import UASTModel
 from ast2vec.uast_ids_to_bag import UastIds2Bag
-from snippet_ranger.utils import get_func_names_bow
-from snippet_ranger.model2.source2func import process_lib_functions
+from snippet_ranger.model2.source2func import get_library_functions
 
 from modelforge import Model
+import numpy
 
 from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.sketch import DocFreqSketch
+from snippet_ranger.token_parser import CachingTokenParser, log_cache_stats
+
+
+# tokens is an object array: a fixed width str array is padded to the longest token
+DocFreqPartial = namedtuple("DocFreqPartial", ["docs", "tokens", "freqs"])
+
+
+def merge_docfreq_partials(first: DocFreqPartial, second: DocFreqPartial) -> DocFreqPartial:
+    """
+    Merges two partial document frequencies.
+
+    :param first: :class:`DocFreqPartial` with sorted unique tokens.
+    :param second: :class:`DocFreqPartial` with sorted unique tokens.
+    :return: Merged :class:`DocFreqPartial` with sorted unique tokens.
+    """
+    tokens, inverse = numpy.unique(numpy.concatenate((first.tokens, second.tokens)),
+                                   return_inverse=True)
+    freqs = numpy.zeros(len(tokens), dtype=numpy.int64)
+    numpy.add.at(freqs, inverse, numpy.concatenate((first.freqs, second.freqs)))
+    return DocFreqPartial(first.docs + second.docs, tokens, freqs)
+
+
+def tree_reduce(partials: list, merge: callable, num_processes: int=1):
+    """
+    Merges partial results with a parallel tree reduction: the partials are merged pairwise in
+    a pool of processes until one is left.
+
+    :param partials: Nonempty list of the partial results.
+    :param merge: Function which merges two partial results. It must be picklable.
+    :param num_processes: Number of processes to use.
+    :return: The merged result.
+    """
+    pool = multiprocessing.Pool(num_processes) if num_processes > 1 and len(partials) > 2 \
+        else None
+    try:
+        while len(partials) > 1:
+            pairs = list(zip(partials[::2], partials[1::2]))
+            rest = partials[-1:] if len(partials) % 2 else []
+            if pool is not None:
+                partials = pool.starmap(merge, pairs) + rest
+            else:
+                partials = [merge(*pair) for pair in pairs] + rest
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return partials[0]
+
+
+def reduce_docfreq_partials(partials: list, num_processes: int=1) -> DocFreqPartial:
+    """
+    Merges partial document frequencies with :func:`tree_reduce`.
+
+    :param partials: List of :class:`DocFreqPartial`.
+    :param num_processes: Number of processes to use.
+    :return: :class:`DocFreqPartial` with all the counts.
+    """
+    if not partials:
+        return DocFreqPartial(0, numpy.array([], dtype=object),
+                              numpy.array([], dtype=numpy.int64))
+    return tree_reduce(partials, merge_docfreq_partials, num_processes)
 
 
 class FilterVocabulary:
@@ -28,13 +92,16 @@ class Snippet2DocFreq(Uast2DocFreq):
     MODEL_FROM_CLASS = Snippet
     MODEL_TO_CLASS = DocumentFrequencies
 
-    def __init__(self, role: int=SIMPLE_IDENTIFIER, filter_set: set =None, *args, **kwargs):
+    def __init__(self, role: int=SIMPLE_IDENTIFIER, filter_set: set =None, *args,
+                 token_parser=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self._uast2bag = UastIds2Bag(FilterVocabulary(filter_set) if filter_set else None)
+        self._token_parser = CachingTokenParser() if token_parser is None else token_parser
+        self._uast2bag = UastIds2Bag(FilterVocabulary(filter_set) if filter_set else None,
+                                     self._token_parser)
         self.role = role
 
     def convert_model(self, model: Model) -> Union[Model, None]:
-        for uast in model.uasts:
+        for uast in model.iter_uasts():
             contained = set()
             for key in self._uast2bag.uast_to_bag(uast, role=self.role):
                 contained.add(key)
@@ -42,27 +109,123 @@ class Snippet2DocFreq(Uast2DocFreq):
                 self._df[word] += 1
             self._docs += 1
 
+    def calculate(self, srcdir: str, pattern: str="**/*.asdf") -> DocumentFrequencies:
+        """
+        Calculates document frequencies of all the Snippet models in memory. Every worker
+        sends its partial counts as NumPy arrays and they are merged with
+        :func:`reduce_docfreq_partials`. No intermediate models are written.
+
+        :param srcdir: The directory to scan for the models.
+        :param pattern: glob pattern for the files.
+        :return: :class:`DocumentFrequencies`.
+        """
+        result = reduce_docfreq_partials(self._collect_partials(srcdir, pattern),
+                                         self.num_processes)
+        model = DocumentFrequencies(log_level=logging.WARNING)
+        return model.construct(int(result.docs), result.tokens.tolist(), result.freqs.tolist())
+
+    def _collect_partials(self, srcdir, pattern):
+        self._partials = multiprocessing.Manager().Queue()
+        # convert_model() returns None, so the workers never write to the destination directory.
+        # It is empty, so that the existing models are not skipped with overwrite_existing=False.
+        with tempfile.TemporaryDirectory(prefix="snippet2df") as destdir:
+            self.convert(srcdir, destdir, pattern)
+        partials = []
+        # All the workers are joined, so the queue is complete
+        while not self._partials.empty():
+            partials.append(self._partials.get())
+        self._partials = None
+        return partials
+
+    def finalize(self, index: int, destdir: str):
+        log_cache_stats(self._log, self._token_parser)
+        if getattr(self, "_partials", None) is None:
+            super().finalize(index, destdir)
+            return
+        tokens = numpy.array(sorted(self._df), dtype=object)
+        freqs = numpy.array([self._df[token] for token in tokens], dtype=numpy.int64)
+        self._partials.put(DocFreqPartial(self._docs, tokens, freqs))
+
+
+class Snippet2ApproxDocFreq(Snippet2DocFreq):
+    """
+    Calculates approximate document frequencies with fixed memory. Every worker counts the
+    tokens in :class:`DocFreqSketch` and the sketches are merged. Only the `topn` most frequent
+    tokens are written. Their frequencies are overestimated by at most `sketch.error_bound`
+    with probability `1 - sketch.delta`.
+    """
+    def __init__(self, topn: int, width: int=2 ** 20, depth: int=4, *args, **kwargs):
+        """
+        :param topn: Number of the most frequent tokens to keep.
+        :param width: Width of the count-min sketch.
+        :param depth: Depth of the count-min sketch.
+        :param args: positional arguments to pass to :class:`Snippet2DocFreq`.
+        :param kwargs: key arguments to pass to :class:`Snippet2DocFreq`.
+        """
+        super().__init__(*args, **kwargs)
+        self._sketch = DocFreqSketch(topn, width, depth)
+
+    @property
+    def sketch(self) -> DocFreqSketch:
+        """
+        Returns the merged sketch after :meth:`calculate`.
+        """
+        return self._sketch
+
+    def convert_model(self, model: Model) -> Union[Model, None]:
+        freqs = Counter()
+        for uast in model.iter_uasts():
+            freqs.update(set(self._uast2bag.uast_to_bag(uast, role=self.role)))
+        self._sketch.update(freqs, len(model))
+
+    def calculate(self, srcdir: str, pattern: str="**/*.asdf") -> DocumentFrequencies:
+        """
+        Calculates approximate document frequencies of all the Snippet models.
+
+        :param srcdir: The directory to scan for the models.
+        :param pattern: glob pattern for the files.
+        :return: :class:`DocumentFrequencies` with the `topn` most frequent tokens.
+        """
+        partials = self._collect_partials(srcdir, pattern)
+        if partials:
+            self._sketch = tree_reduce(partials, DocFreqSketch.merge, self.num_processes)
+        sketch = self._sketch.sketch
+        top = self._sketch.top()
+        self._log.info("%d tokens are selected. Document frequencies are overestimated by at "
+                       "most %.1f with probability %.4f", len(top), sketch.error_bound,
+                       1 - sketch.delta)
+        model = DocumentFrequencies(log_level=logging.WARNING)
+        return model.construct(self._sketch.docs, [t for t, _ in top], [f for _, f in top])
+
+    def finalize(self, index: int, destdir: str):
+        log_cache_stats(self._log, self._token_parser)
+        self._partials.put(self._sketch)
+
+
+def create_snippet2df(args, **kwargs) -> Snippet2DocFreq:
+    """
+    Creates the exact or the approximate document frequencies calculator depending on the
+    command line arguments.
+
+    :param args: Command line arguments. The sketch arguments are optional, the exact \
+        calculator is created without them.
+    :param kwargs: key arguments to pass to the calculator.
+    :return: :class:`Snippet2DocFreq` or :class:`Snippet2ApproxDocFreq`.
+    """
+    kwargs.update(num_processes=args.processes, overwrite_existing=args.overwrite_existing)
+    if getattr(args, "approximate", None) is None:
+        return Snippet2DocFreq(**kwargs)
+    return Snippet2ApproxDocFreq(args.approximate, args.sketch_width, args.sketch_depth,
+                                 **kwargs)
+
 
 def snippet2df_entry(args):
-    converter = Snippet2DocFreq(num_processes=args.processes,
-                                overwrite_existing=args.overwrite_existing)
-    with tempfile.TemporaryDirectory(dir=args.tmpdir, prefix="snippet2df") as tmpdir:
-        converter.convert(args.input, tmpdir, pattern=args.filter)
-        joiner = MergeDocFreq(num_processes=1)
-        joiner.convert(tmpdir, args.output,
-                       pattern="%s*.asdf" % DocumentFrequencies.NAME)
+    converter = create_snippet2df(args)
+    converter.calculate(args.input, pattern=args.filter).save(args.output)
 
 
 def snippet2fc_df_entry(args):
-    lib_model = UASTModel().load(args.library_uast)
-    functions_bow = get_func_names_bow(lib_model)
-    functions_bow = process_lib_functions(functions_bow)
-
-    converter = Snippet2DocFreq(num_processes=args.processes,
-                                overwrite_existing=args.overwrite_existing,
-                                role=CALL_CALLEE, filter_set=functions_bow)
-    with tempfile.TemporaryDirectory(dir=args.tmpdir, prefix="snippet2df") as tmpdir:
-        converter.convert(args.input, tmpdir, pattern=args.filter)
-        joiner = MergeDocFreq(num_processes=1)
-        joiner.convert(tmpdir, args.output,
-                       pattern="%s*.asdf" % DocumentFrequencies.NAME)
+    functions_bow = get_library_functions(args.library_uast, args.library_api)
+
+    converter = create_snippet2df(args, role=CALL_CALLEE, filter_set=functions_bow)
+    converter.calculate(args.input, pattern=args.filter).save(args.output)
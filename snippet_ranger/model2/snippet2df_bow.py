@@ -0,0 +1,302 @@
+import logging
+import os
+from pathlib import Path
+import tempfile
+
+from ast2vec.df import DocumentFrequencies
+from ast2vec.bblfsh_roles import SIMPLE_IDENTIFIER, CALL_CALLEE
+from ast2vec.model2.base import Model2Base
+from ast2vec.token_parser import NoTokenParser
+from ast2vec.uast_ids_to_bag import UastIds2Bag
+import numpy
+
+from snippet_ranger.model2.snippet2bow import SnippetModel2BOW, SnippetModel2FuncCallsBOW
+from snippet_ranger.model2.source2func import get_library_functions
+from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.token_parser import CachingTokenParser, log_cache_stats
+
+
+def _save_strings(path, strings):
+    data = [s.encode("utf-8") for s in strings]
+    numpy.save(path + "_lengths.npy", numpy.array([len(s) for s in data], dtype=numpy.uint32))
+    numpy.save(path + "_chars.npy", numpy.frombuffer(b"".join(data), dtype=numpy.uint8))
+
+
+def _load_strings(path):
+    lengths = numpy.load(path + "_lengths.npy")
+    chars = numpy.load(path + "_chars.npy", mmap_mode="r").tobytes()
+    offsets = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    return [chars[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(lengths))]
+
+
+class SnippetBags:
+    """
+    Bags of tokens of all the snippets from one Snippet model in CSR layout: the bag of the
+    snippet `i` is `ids[indptr[i]:indptr[i + 1]]` with `counts` of the same slice. Token ids
+    are local to the model and point to `tokens`. It is stored in the directory as .npy files
+    which are memory-mapped on load.
+    """
+    def __init__(self, names, tokens, indptr, ids, counts):
+        """
+        :param names: Snippet names.
+        :param tokens: List of tokens.
+        :param indptr: Bag offsets, `len(names) + 1` items.
+        :param ids: Concatenated token ids of the bags.
+        :param counts: Concatenated token frequencies of the bags.
+        """
+        self._names = names
+        self._tokens = tokens
+        self._indptr = indptr
+        self._ids = ids
+        self._counts = counts
+
+    @property
+    def names(self) -> list:
+        """
+        Returns the snippet names.
+        """
+        return self._names
+
+    @property
+    def tokens(self) -> list:
+        """
+        Returns the tokens of the bags.
+        """
+        return self._tokens
+
+    @property
+    def indptr(self) -> numpy.ndarray:
+        """
+        Returns the bag offsets in `ids` and `counts`.
+        """
+        return self._indptr
+
+    @property
+    def ids(self) -> numpy.ndarray:
+        """
+        Returns the concatenated token ids of the bags.
+        """
+        return self._ids
+
+    @property
+    def counts(self) -> numpy.ndarray:
+        """
+        Returns the concatenated token frequencies of the bags.
+        """
+        return self._counts
+
+    def __len__(self):
+        """
+        Returns the number of snippets.
+        """
+        return len(self._indptr) - 1
+
+    def save(self, path: str):
+        """
+        Writes the bags to the directory.
+
+        :param path: Directory path. It is created if it does not exist.
+        :return: None
+        """
+        os.makedirs(path, exist_ok=True)
+        _save_strings(os.path.join(path, "names"), self._names)
+        _save_strings(os.path.join(path, "tokens"), self._tokens)
+        numpy.save(os.path.join(path, "indptr.npy"), self._indptr)
+        numpy.save(os.path.join(path, "ids.npy"), self._ids)
+        numpy.save(os.path.join(path, "counts.npy"), self._counts)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads the bags from the directory. The arrays are memory-mapped.
+
+        :param path: Directory path.
+        :return: :class:`SnippetBags`.
+        """
+        return cls(_load_strings(os.path.join(path, "names")),
+                   _load_strings(os.path.join(path, "tokens")),
+                   numpy.load(os.path.join(path, "indptr.npy"), mmap_mode="r"),
+                   numpy.load(os.path.join(path, "ids.npy"), mmap_mode="r"),
+                   numpy.load(os.path.join(path, "counts.npy"), mmap_mode="r"))
+
+
+class Snippet2Bags(Model2Base):
+    """
+    Extracts the bags of tokens from Snippet models and spills them to the disk as
+    :class:`SnippetBags`. The bags are saved to `<destdir>/<model path>`.
+    """
+    MODEL_FROM_CLASS = Snippet
+    MODEL_TO_CLASS = Snippet
+
+    def __init__(self, role: int=SIMPLE_IDENTIFIER, token_parser=None, *args, **kwargs):
+        """
+        :param role: Role of the nodes to put into the bags.
+        :param token_parser: Token parser for the node tokens. :class:`CachingTokenParser` if \
+            None.
+        :param args: positional arguments to pass to :class:`Model2Base`.
+        :param kwargs: key arguments to pass to :class:`Model2Base`.
+        """
+        super().__init__(*args, **kwargs)
+        self._token_parser = CachingTokenParser() if token_parser is None else token_parser
+        self._uast2bag = UastIds2Bag(None, self._token_parser)
+        self.role = role
+        self._srcdir = self._destdir = None
+
+    def convert(self, srcdir: str, destdir: str, pattern: str="**/*.asdf") -> int:
+        self._srcdir, self._destdir = srcdir, destdir
+        return super().convert(srcdir, destdir, pattern)
+
+    def convert_model(self, model: Snippet) -> None:
+        vocabulary = {}
+        indptr = [0]
+        ids = []
+        counts = []
+        for uast in model.iter_uasts():
+            for token, count in self._uast2bag.uast_to_bag(uast, role=self.role).items():
+                ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                counts.append(count)
+            indptr.append(len(ids))
+        bags = SnippetBags(model.names, list(vocabulary),
+                           numpy.array(indptr, dtype=numpy.int64),
+                           numpy.array(ids, dtype=numpy.int32),
+                           numpy.array(counts, dtype=numpy.uint32))
+        bags.save(os.path.join(self._destdir, os.path.relpath(model._source, self._srcdir)))
+
+    def finalize(self, index: int, destdir: str):
+        log_cache_stats(self._log, self._token_parser)
+
+    def _get_log_name(self):
+        return "snippet2bags"
+
+
+class BagsDocFreq:
+    """
+    Reduces document frequencies from :class:`SnippetBags`. Every snippet is a document.
+    """
+    def __init__(self, df_tokens: callable=None):
+        """
+        :param df_tokens: Function which maps the bag token to the list of document frequency \
+            tokens. Bag tokens are used as is if it is None.
+        """
+        self._df_tokens = df_tokens
+        self._df_ids = {}
+        self._freqs = numpy.zeros(0, dtype=numpy.int64)
+        self._docs = 0
+
+    def _get_df_ids(self, tokens):
+        for token in tokens:
+            yield self._df_ids.setdefault(token, len(self._df_ids))
+
+    def update(self, bags: SnippetBags):
+        """
+        Counts the documents of the bags.
+
+        :param bags: :class:`SnippetBags`.
+        :return: None
+        """
+        self._docs += len(bags)
+        rows = numpy.repeat(numpy.arange(len(bags), dtype=numpy.int64), numpy.diff(bags.indptr))
+        if self._df_tokens is None:
+            # Token ids are unique inside every bag
+            mapping = numpy.fromiter(self._get_df_ids(bags.tokens), dtype=numpy.int64,
+                                     count=len(bags.tokens))
+            df_ids = mapping[bags.ids]
+        else:
+            # Several bag tokens can map to the same document frequency token, so the pairs
+            # (snippet, document frequency token) are deduplicated
+            map_sizes = []
+            map_ids = []
+            for token in bags.tokens:
+                token_df_ids = set(self._get_df_ids(self._df_tokens(token)))
+                map_sizes.append(len(token_df_ids))
+                map_ids.extend(token_df_ids)
+            map_sizes = numpy.array(map_sizes, dtype=numpy.int64)
+            map_ids = numpy.array(map_ids, dtype=numpy.int64)
+            map_indptr = numpy.zeros(len(map_sizes) + 1, dtype=numpy.int64)
+            numpy.cumsum(map_sizes, out=map_indptr[1:])
+            sizes = map_sizes[bags.ids]
+            rows = numpy.repeat(rows, sizes)
+            ends = numpy.cumsum(sizes)
+            positions = numpy.arange(len(rows)) - numpy.repeat(ends - sizes, sizes) + \
+                numpy.repeat(map_indptr[bags.ids], sizes)
+            pairs = numpy.unique(rows * max(len(self._df_ids), 1) + map_ids[positions])
+            df_ids = pairs % max(len(self._df_ids), 1)
+        freqs = numpy.bincount(df_ids, minlength=len(self._df_ids))
+        freqs[:len(self._freqs)] += self._freqs
+        self._freqs = freqs
+
+    def build(self) -> DocumentFrequencies:
+        """
+        Creates the document frequencies model.
+
+        :return: :class:`DocumentFrequencies`.
+        """
+        freqs = numpy.zeros(len(self._df_ids), dtype=numpy.int64)
+        freqs[:len(self._freqs)] = self._freqs
+        tokens = [None] * len(self._df_ids)
+        for token, i in self._df_ids.items():
+            tokens[i] = token
+        nonzero = numpy.flatnonzero(freqs)
+        return DocumentFrequencies(log_level=logging.WARNING).construct(
+            self._docs, [tokens[i] for i in nonzero], freqs[nonzero].tolist())
+
+
+def snippet2df_bow(args, role, token_parser, df_tokens, bow_class):
+    """
+    Calculates document frequencies and BOW models with a single pass over the Snippet models.
+    The bags are extracted once and spilled to the temporary directory. Then the document
+    frequencies are reduced from the spill and saved. The saved model is loaded back to choose
+    the vocabulary and IDF, so the result is the same as with two separate commands.
+
+    :param args: Command line arguments.
+    :param role: Role of the nodes to put into the bags.
+    :param token_parser: Token parser of the BOW command.
+    :param df_tokens: Function which maps the bag token to document frequency tokens. \
+        See :class:`BagsDocFreq`.
+    :param bow_class: :class:`SnippetModel2BOW` or :class:`SnippetModel2FuncCallsBOW`.
+    :return: None
+    """
+    log = logging.getLogger("snippet2df_bow")
+    files = [os.path.relpath(str(p), args.input) for p in Path(args.input).glob(args.filter)]
+    with tempfile.TemporaryDirectory(dir=args.tmpdir, prefix="snippet2df_bow") as tmpdir:
+        extractor = Snippet2Bags(role, token_parser, num_processes=args.processes,
+                                 log_level=args.log_level)
+        extractor.convert(args.input, tmpdir, pattern=args.filter)
+        spills = [f for f in files if os.path.isdir(os.path.join(tmpdir, f))]
+        log.info("Reducing document frequencies from %d spills", len(spills))
+        reducer = BagsDocFreq(df_tokens)
+        for f in spills:
+            reducer.update(SnippetBags.load(os.path.join(tmpdir, f)))
+        dirs = os.path.dirname(args.docfreq)
+        if dirs:
+            os.makedirs(dirs, exist_ok=True)
+        reducer.build().save(args.docfreq)
+
+        converter = bow_class(args.vocabulary_size, DocumentFrequencies().load(args.docfreq),
+                              log_level=args.log_level)
+        log.info("Writing BOW models to %s", args.output)
+        for f in spills:
+            model_path = os.path.join(args.output, f)
+            if os.path.exists(model_path) and not args.overwrite_existing:
+                log.warning("Model %s already exists, skipping.", model_path)
+                continue
+            os.makedirs(os.path.dirname(model_path), exist_ok=True)
+            bow = converter.convert_bags(SnippetBags.load(os.path.join(tmpdir, f)))
+            bow.save(model_path, deps=bow.meta["dependencies"])
+
+
+def snippet2df_bow_entry(args):
+    snippet2df_bow(args, SIMPLE_IDENTIFIER, None, None, SnippetModel2BOW)
+
+
+def snippet2fc_df_bow_entry(args):
+    functions_bow = get_library_functions(args.library_uast, args.library_api)
+    token_parser = CachingTokenParser()
+
+    def df_tokens(token):
+        # snippet2fc_df does not filter the tokens if the library has no functions
+        return [sub for sub in token_parser.process_token(token)
+                if not functions_bow or sub in functions_bow]
+
+    snippet2df_bow(args, CALL_CALLEE, NoTokenParser(), df_tokens, SnippetModel2FuncCallsBOW)
@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+
+from ast2vec.df import DocumentFrequencies
+from modelforge.progress_bar import progress_bar
+from scipy.sparse import csr_matrix
+
+from snippet_ranger.model2.snippet2bow import SnippetModel2BOW, SnippetModel2BOWBase, \
+    SnippetModel2FuncCallsBOW
+from snippet_ranger.models.snippet import Snippet
+
+
+def matrix_to_vw(names: list, matrix: csr_matrix, tokens: list) -> str:
+    """
+    Formats the BOW rows as Vowpal Wabbit lines. The format is the same as of `ast2vec bow2vw`:
+    `<name> <token>:<weight> ...`. BigARTM reads it with `data_format="vowpal_wabbit"`.
+
+    :param names: Row names.
+    :param matrix: BOW matrix.
+    :param tokens: Column names.
+    :return: The lines joined together.
+    """
+    lines = []
+    for i, name in enumerate(names):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        pairs = ["%s:%s" % (tokens[t], v)
+                 for t, v in zip(matrix.indices[start:end], matrix.data[start:end])]
+        lines.append(name.replace(":", "").replace(" ", "_") + " " + " ".join(pairs) + "\n")
+    return "".join(lines)
+
+
+_converter = None
+
+
+def _init_worker(converter):
+    global _converter
+    _converter = converter
+
+
+def _snippet_to_vw(filename):
+    try:
+        model = Snippet(log_level=logging.WARNING).load(filename)
+        return filename, matrix_to_vw(model.names, _converter.model_to_matrix(model),
+                                      _converter.tokens)
+    except Exception:
+        logging.getLogger("snippet2vw").exception("%s failed", filename)
+        return filename, None
+
+
+def snippets_to_vw(converter: SnippetModel2BOWBase, files: list, output: str,
+                   num_processes: int=0, ordered: bool=True) -> int:
+    """
+    Converts Snippet models to Vowpal Wabbit dataset in a pool of processes. The lines are
+    written as soon as every model is converted, so the memory does not depend on the corpus
+    size and no intermediate BOW models are written.
+
+    :param converter: :class:`SnippetModel2BOW` or :class:`SnippetModel2FuncCallsBOW`.
+    :param files: Paths to the Snippet models.
+    :param output: Path to the Vowpal Wabbit dataset.
+    :param num_processes: The number of processes. 0 means CPU count.
+    :param ordered: Write the models in the order of `files`. Otherwise in the order of \
+        completion, which does not wait for slow models.
+    :return: The number of failed models.
+    """
+    log = logging.getLogger("snippet2vw")
+    num_processes = num_processes or multiprocessing.cpu_count()
+    failures = 0
+    dirs = os.path.dirname(output)
+    if dirs:
+        os.makedirs(dirs, exist_ok=True)
+    log.info("Writing %s", output)
+    with open(output, "w") as fout, multiprocessing.Pool(
+            num_processes, initializer=_init_worker, initargs=(converter,)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for filename, lines in progress_bar(imap(_snippet_to_vw, files), log,
+                                            expected_size=len(files)):
+            if lines is None:
+                failures += 1
+                continue
+            fout.write(lines)
+    log.info("Finished, %d failed files", failures)
+    return failures
+
+
+def snippet2vw(args, bow_class):
+    df = DocumentFrequencies().load(args.docfreq)
+    converter = bow_class(args.vocabulary_size, df, num_processes=1, log_level=args.log_level)
+    files = sorted(str(p) for p in Path(args.input).glob(args.filter))
+    snippets_to_vw(converter, files, args.output, args.processes, ordered=not args.unordered)
+
+
+def snippet2vw_entry(args):
+    snippet2vw(args, SnippetModel2BOW)
+
+
+def snippet2fc_vw_entry(args):
+    snippet2vw(args, SnippetModel2FuncCallsBOW)
@@ -1,11 +1,16 @@
 import logging
+import os
 
 from ast2vec.uast import UASTModel
 from ast2vec.source import Source
 from ast2vec.bblfsh_roles import CALL, CALL_CALLEE, FUNCTION_DECLARATION
+from snippet_ranger.import_resolver import ImportResolver, library_callees
 from snippet_ranger.model2.base_split import Model2BaseSplit
-from snippet_ranger.models.snippet import Snippet
-from snippet_ranger.utils import uast_role_nodes, has_import, uast_to_bag, get_func_names_bow
+from snippet_ranger.models.library_api import LibraryAPI
+from snippet_ranger.models.snippet import Snippet, SnippetSources, SourceModelReference, \
+    ReferencedSources, ReferencedUasts
+from snippet_ranger.utils import extract_functions, get_func_names_bow, line_offsets, \
+    lines_span, FunctionSpan
 
 
 class Source2Func(Model2BaseSplit):
@@ -17,12 +22,22 @@ class Source2Func(Model2BaseSplit):
     MODEL_FROM_CLASS = Source
     MODEL_TO_CLASS = Snippet
 
-    def __init__(self, libname, lib_funcs_bow=None, *args, **kwargs):
+    def __init__(self, libname, lib_funcs_bow=None, *args, shared_sources=False, references=False,
+                 resolve_imports=False, lib_qualified_names=None, **kwargs):
         """
         :param libname: Name of the library. All files without library usage are not handled.
         :param lib_funcs_bow: dictionary of function names (bag of words) which can be used from \
             the library. You can use just all function names or preprocess it somehow. For \
             example, remove functions that are common for language or internal functions.
+        :param shared_sources: Store snippet sources as offsets into the shared file source \
+            codes instead of copied strings. See :class:`SnippetSources`.
+        :param references: Store only the reference to the Source model and node indices \
+            instead of uasts and sources. See :class:`ReferencedUasts`.
+        :param resolve_imports: Resolve callees through the file imports and aliases and count \
+            only the calls of the library functions. Otherwise all the callees with the same \
+            names as library functions are counted. See :class:`ImportResolver`.
+        :param lib_qualified_names: Set of the qualified names of the library API. Resolved \
+            callees are looked up in it if it is specified, see :func:`library_callees`.
         :param args: positional arguments to pass to :class:`Model2BaseSplit`.
         :param kwargs: key arguments to pass to :class:`Model2BaseSplit`.
         """
@@ -30,20 +45,42 @@ class Source2Func(Model2BaseSplit):
         self.libname = libname
         self.lib_funcs_bow = lib_funcs_bow
         self.lib_funcs_bow_set = set(lib_funcs_bow)
+        if shared_sources and references:
+            raise ValueError("shared_sources and references can not be used together.")
+        self.shared_sources = shared_sources
+        self.references = references
+        self.resolve_imports = resolve_imports
+        self.lib_qualified_names = lib_qualified_names
 
         self._log.debug("lib_funcs_bow for {} lib is {}".format(libname, lib_funcs_bow))
         self.threshold = 0
 
+    def prepare_model_object(self, model_object):
+        """
+        Extract imports, functions and their callees from the file UAST in one walk.
+        If imports are resolved, callee bags contain qualified names.
+
+        :param model_object: Object of Source model.
+        :return: Object of Source model with :class:`UASTFunctions` appended.
+        """
+        filename, uast, source = model_object
+        uast_functions = extract_functions(uast, qualified_callees=self.resolve_imports)
+        if self.resolve_imports:
+            resolver = ImportResolver(uast)
+            uast_functions = uast_functions._replace(
+                functions=[func._replace(callees=resolver.resolve_bag(func.callees))
+                           for func in uast_functions.functions],
+                callees=resolver.resolve_bag(uast_functions.callees))
+        return filename, uast, source, uast_functions
+
     def input_model_object_criteria(self, model_object):
         """
         Filtration criteria for input model. Filter all files that are not use specified library.
 
-        :param model_object: Object of Source model.
+        :param model_object: Prepared object of Source model.
         :return: Library usage indicator.
         """
-        filename, uast, source = model_object
-        res = has_import(self.libname, uast)
-        return res
+        return self.libname in model_object[3].imports
 
     def split_model_object(self, model_from, model_object):
         """
@@ -51,19 +88,20 @@ class Source2Func(Model2BaseSplit):
         This models are split from
 
         :param model_from: Full Source model.
-        :param model_object: Current Source model object.
-        :return: parameters for :class:`Snippet` model __init__.
+        :param model_object: Current prepared Source model object.
+        :return: parameters for :class:`Snippet` model __init__, :class:`FunctionSpan` of the \
+            snippet and the snippet offsets in the source code.
         """
-        filename, uast, source = model_object
-        have_funcs = False
-        func_nodes = uast_role_nodes(uast, FUNCTION_DECLARATION)
-        for func_node in func_nodes:
-            have_funcs = True
-            pos_start, pos_end = func_node.start_position.line-1, func_node.end_position.line
-            func_source = "\n".join(source.splitlines()[pos_start:pos_end])
-            yield filename, func_node, func_source, pos_start, pos_end
-        if not have_funcs:
-            yield filename, uast, source, 0, source.count("\n")
+        filename, uast, source, uast_functions = model_object
+        offsets = line_offsets(source)
+        for func in uast_functions.functions:
+            pos_start, pos_end = func.start - 1, func.end
+            start, end = lines_span(source, offsets, pos_start, pos_end)
+            yield filename, func.node, source[start:end], pos_start, pos_end, func, (start, end)
+        if not uast_functions.functions:
+            lines = source.count("\n")
+            yield filename, uast, source, 0, lines, \
+                FunctionSpan(uast, 0, 1, lines, uast_functions.callees), (0, len(source))
 
     def output_model_object_criteria(self, model_object):
         """
@@ -73,13 +111,13 @@ class Source2Func(Model2BaseSplit):
         :param model_object: Source model object.
         :return: Library functions usage indicator.
         """
-        func_node = model_object[1]
-        func_names = uast_to_bag(func_node, role=CALL_CALLEE)
+        func_names = model_object[5].callees
 
-        common = self.lib_funcs_bow_set & func_names.keys()
+        common = self.get_library_callees(self.libname, self.lib_funcs_bow_set, func_names,
+                                          self.lib_qualified_names)
         if common == 0 and self._log.isEnabledFor(logging.DEBUG):
             self._log.DEBUG("There is no common functions in func_{}-{}_{}".format(
-                model_object[4], model_object[5], model_object[0]))
+                model_object[3], model_object[4], model_object[0]))
             for key in func_names:
                 if key in model_object[2]:
                     self._log.DEBUG("But I can find {} in source!".format(key))
@@ -90,8 +128,141 @@ class Source2Func(Model2BaseSplit):
             return True
         return False
 
+    def get_library_callees(self, libname, lib_funcs_bow_set, callees, qualified_names=None):
+        """
+        Find the library functions which are called.
+
+        :param libname: Name of the library.
+        :param lib_funcs_bow_set: Set of the library function names.
+        :param callees: Bag of callees of :class:`FunctionSpan`.
+        :param qualified_names: Set of the qualified names of the library API or None.
+        :return: Set of the called library functions.
+        """
+        if self.resolve_imports:
+            return library_callees(callees, libname, lib_funcs_bow_set, qualified_names)
+        return lib_funcs_bow_set & callees.keys()
+
     def construct(self, model_from, result):
-        return Source2Func.MODEL_TO_CLASS().construct(model_from.repository, *zip(*result))
+        filenames, uasts, sources, positions_start, positions_end, spans, offsets = zip(*result)
+        if self.references:
+            if model_from._source is None:
+                raise ValueError("Snippets can reference only the Source model loaded from file.")
+            reference = SourceModelReference(os.path.abspath(model_from._source),
+                                             model_from.meta["uuid"], model_from)
+            file_ids = [model_from.repository_index_by_name(f) for f in filenames]
+            uasts = ReferencedUasts(reference, file_ids, [span.index for span in spans])
+            sources = SnippetSources(ReferencedSources(reference), file_ids, offsets)
+        elif self.shared_sources:
+            file_ids = {}
+            for filename in filenames:
+                file_ids.setdefault(filename, len(file_ids))
+            sources = SnippetSources(
+                [model_from.sources[model_from.repository_index_by_name(f)] for f in file_ids],
+                [file_ids[f] for f in filenames], offsets)
+        return Source2Func.MODEL_TO_CLASS().construct(model_from.repository, filenames, uasts,
+                                                      sources, positions_start, positions_end)
+
+
+class Source2MultiFunc(Source2Func):
+    """
+    This class splits files in source model to functions for several libraries at once.
+    Every file is read and split only once and then the functions are filtered for every library
+    separately. One Snippet model is written for every library which is used in the source model
+    to `<destdir>/<library name>/`.
+    """
+
+    def __init__(self, libraries, *args, qualified_names=None, **kwargs):
+        """
+        :param libraries: Dictionary with library names as keys and function names (bag of \
+            words) which can be used from the library as values. See :class:`Source2Func`.
+        :param qualified_names: Dictionary with library names as keys and sets of the qualified \
+            names of the library API as values. Libraries may be missing.
+        :param args: positional arguments to pass to :class:`Source2Func`.
+        :param kwargs: key arguments to pass to :class:`Source2Func`.
+        """
+        super(Source2MultiFunc, self).__init__(None, {}, *args, **kwargs)
+        self.libraries = {libname: set(lib_funcs_bow)
+                          for libname, lib_funcs_bow in libraries.items()}
+        self.qualified_names = qualified_names or {}
+        self._srcdir = self._destdir = None
+
+    def convert(self, srcdir: str, destdir: str, pattern: str="**/*.asdf") -> int:
+        self._srcdir, self._destdir = srcdir, destdir
+        return super(Source2MultiFunc, self).convert(srcdir, destdir, pattern)
+
+    def input_model_object_criteria(self, model_object):
+        """
+        Filtration criteria for input model. Filter all files that are not use any library.
+
+        :param model_object: Prepared object of Source model.
+        :return: Libraries usage indicator.
+        """
+        return not model_object[3].imports.isdisjoint(self.libraries)
+
+    def split_libraries(self, model_from, libraries=None) -> dict:
+        """
+        Split the source model to functions and make Snippet model for every library.
+
+        :param model_from: Source model.
+        :param libraries: Names of the libraries to make Snippet models for. All if None.
+        :return: Dictionary with library names as keys and Snippet models as values. Libraries \
+            without snippets are skipped.
+        """
+        if libraries is None:
+            libraries = self.libraries
+        split = []
+        for model_object in self.filter_input_model_content(iter(model_from)):
+            imports = model_object[3].imports
+            if imports.isdisjoint(libraries):
+                continue
+            for out_model_object in self.split_model_object(model_from, model_object):
+                split.append((imports, out_model_object))
+        result = {}
+        for libname in libraries:
+            lib_funcs_bow_set = self.libraries[libname]
+            lib_result = []
+            for imports, out_model_object in split:
+                if libname not in imports:
+                    continue
+                common = self.get_library_callees(libname, lib_funcs_bow_set,
+                                                  out_model_object[5].callees,
+                                                  self.qualified_names.get(libname))
+                if len(common) > self.threshold:
+                    lib_result.append(out_model_object)
+            if lib_result:
+                result[libname] = self.construct(model_from, lib_result)
+        return result
+
+    def convert_model(self, model_from):
+        """
+        Save Snippet model for every library to `<destdir>/<library name>/`. Existing models are
+        overwritten or skipped like in :class:`Model2Base`. Nothing is returned, because the
+        models are saved to the different directories.
+
+        :param model_from: Source model.
+        :return: None
+        """
+        path = self._get_model_path(os.path.relpath(model_from._source, self._srcdir))
+        model_paths = {}
+        for libname in self.libraries:
+            model_path = os.path.join(self._destdir, libname, path)
+            if os.path.exists(model_path):
+                if not self.overwrite_existing:
+                    self._log.warning("Model %s already exists, skipping.", model_path)
+                    continue
+                self._log.warning(
+                    "Model %s already exists, but will be overwritten. If you want to skip "
+                    "existing models use --disable-overwrite flag", model_path)
+            model_paths[libname] = model_path
+        if not model_paths:
+            return None
+        models = self.split_libraries(model_from, model_paths)
+        if not models:
+            raise ValueError("All functions are filtered and you get empty model.")
+        for libname, model in models.items():
+            model_path = model_paths[libname]
+            os.makedirs(os.path.dirname(model_path), exist_ok=True)
+            model.save(model_path, deps=model.meta["dependencies"])
 
 
 def process_lib_functions(functions_bow):
@@ -111,12 +282,55 @@ def process_lib_functions(functions_bow):
     return clear_functions_bow
 
 
-def source2func_entry(args):
-    lib_model = UASTModel().load(args.library_uast)
-    functions_bow = get_func_names_bow(lib_model)
-    functions_bow = process_lib_functions(functions_bow)
+def get_library_api(library_uast=None, library_api=None):
+    """
+    Load library UAST model and get function names which can be used from the library.
+    The compiled LibraryAPI model is loaded instead if it is specified, which is much faster.
+
+    :param library_uast: Path to the UAST model of the library.
+    :param library_api: Path to the LibraryAPI model of the library.
+    :return: Dictionary of function names (bag of words) and set of the qualified names of the \
+        library API. The qualified names are None if the library UAST model is loaded.
+    """
+    if library_api is not None:
+        api = LibraryAPI().load(library_api)
+        return dict.fromkeys(api.functions, 1), api.qualified_names
+    if library_uast is None:
+        raise ValueError("Either library UAST or library API model must be specified.")
+    lib_model = UASTModel().load(library_uast)
+    return process_lib_functions(get_func_names_bow(lib_model)), None
+
 
-    converter = Source2Func(args.library_name, functions_bow, log_level=args.log_level,
-                            num_processes=args.processes,
-                            overwrite_existing=args.overwrite_existing)
+def get_library_functions(library_uast=None, library_api=None):
+    """
+    Load library function names which can be used from the library, see
+    :func:`get_library_api`.
+
+    :param library_uast: Path to the UAST model of the library.
+    :param library_api: Path to the LibraryAPI model of the library.
+    :return: Dictionary of function names (bag of words).
+    """
+    return get_library_api(library_uast, library_api)[0]
+
+
+def source2func_entry(args):
+    kwargs = dict(log_level=args.log_level, num_processes=args.processes,
+                  overwrite_existing=args.overwrite_existing,
+                  shared_sources=args.shared_sources, references=args.references,
+                  resolve_imports=args.resolve_imports)
+    if args.libraries:
+        libraries = {}
+        qualified_names = {}
+        for lib in args.libraries:
+            libname, library_model = lib.split(":", maxsplit=1)
+            if library_model.startswith("api="):
+                libraries[libname], qualified_names[libname] = \
+                    get_library_api(library_api=library_model[4:])
+            else:
+                libraries[libname] = get_library_functions(library_model)
+        converter = Source2MultiFunc(libraries, qualified_names=qualified_names, **kwargs)
+    else:
+        functions_bow, qualified_names = get_library_api(args.library_uast, args.library_api)
+        converter = Source2Func(args.library_name, functions_bow,
+                                lib_qualified_names=qualified_names, **kwargs)
     converter.convert(args.input, args.output, pattern=args.filter)
@@ -0,0 +1,89 @@
+import logging
+import os
+
+from ast2vec import UASTModel
+from ast2vec.bblfsh_roles import FUNCTION_DECLARATION, FUNCTION_DECLARATION_NAME, \
+    TYPE_DECLARATION
+
+from snippet_ranger.models.library_api import LibraryAPI
+from snippet_ranger.model2.source2func import process_lib_functions
+from snippet_ranger.uast_index import UASTIndex
+
+
+def filename_to_module(libname, filename):
+    """
+    Converts the file path inside the library to the qualified module name.
+    `sub/module.py` -> `<libname>.sub.module`, `sub/__init__.py` -> `<libname>.sub`.
+
+    :param libname: Name of the library.
+    :param filename: Path to the file relative to the library root.
+    :return: Qualified module name.
+    """
+    path = os.path.splitext(os.path.normpath(filename))[0]
+    parts = [part for part in path.split(os.sep) if part and part != os.curdir]
+    if parts and parts[0] == libname:
+        parts = parts[1:]
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join([libname] + parts)
+
+
+def uast_to_declarations(uast):
+    """
+    Finds function and class declarations in the UAST together with their qualified paths
+    inside the file.
+
+    :param uast: UAST of the file.
+    :return: Tuple of function names, class names and qualified paths.
+    """
+    index = UASTIndex(uast)
+    functions = set(index.bag(FUNCTION_DECLARATION_NAME))
+    declarations = index.role_nodes([FUNCTION_DECLARATION, TYPE_DECLARATION])
+    declarations = declarations[index.tokens[declarations] != 0]
+    is_class = index.role_mask(TYPE_DECLARATION)
+    classes = set()
+    qualified_names = set()
+    # Declarations are in pre-order, so the enclosing ones are always on the stack
+    stack = []
+    for node in declarations.tolist():
+        while stack and index.ends[stack[-1][0]] <= node:
+            stack.pop()
+        name = index.vocabulary[index.tokens[node]]
+        if is_class[node]:
+            classes.add(name)
+        path = stack[-1][1] + "." + name if stack else name
+        qualified_names.add(path)
+        stack.append((node, path))
+    return functions, classes, qualified_names
+
+
+def uast_model_to_library_api(libname, uast_model):
+    """
+    Compiles the library API from the library UAST model.
+
+    :param libname: Name of the library.
+    :param uast_model: UASTModel of the library.
+    :return: LibraryAPI model.
+    """
+    functions, classes, qualified_names, modules = set(), set(), set(), set()
+    for filename, uast in zip(uast_model.filenames, uast_model.uasts):
+        module = filename_to_module(libname, filename)
+        modules.add(module)
+        file_functions, file_classes, file_names = uast_to_declarations(uast)
+        functions.update(file_functions)
+        classes.update(file_classes)
+        qualified_names.update(module + "." + name for name in file_names)
+    functions = process_lib_functions(dict.fromkeys(functions, 1))
+    classes = process_lib_functions(dict.fromkeys(classes, 1))
+    return LibraryAPI().construct(library=libname, functions=functions, classes=classes,
+                                  qualified_names=qualified_names, modules=modules)
+
+
+def library_api_entry(args):
+    log = logging.getLogger("library_api")
+    uast_model = UASTModel().load(args.library_uast)
+    library_api = uast_model_to_library_api(args.library_name, uast_model)
+    log.info("%d functions, %d classes and %d modules are found in %s",
+             len(library_api.functions), len(library_api.classes), len(library_api.modules),
+             args.library_name)
+    library_api.save(args.output, deps=(uast_model,))
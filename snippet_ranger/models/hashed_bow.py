@@ -0,0 +1,76 @@
+import ast2vec
+from ast2vec.bow import BOW, BOWBase
+from modelforge import generate_meta
+from modelforge.model import assemble_sparse_matrix, disassemble_sparse_matrix, merge_strings, \
+    split_strings, write_model
+from modelforge.models import register_model
+import numpy
+
+
+@register_model
+class HashedBOW(BOWBase):
+    """
+    Weighted bag of words model with the hashing trick, see
+    :class:`snippet_ranger.model2.snippet2bow.HashingSnippet2BOW`. There are `2 ** hash_bits`
+    columns, so only the names of the columns which appear in the rows are stored and the rest
+    are named "#<column>" on demand. Call :meth:`become_bow` to use it with ast2vec.
+    """
+
+    NAME = "hashed_bow"
+
+    def construct(self, repos, matrix, names: dict):
+        """
+        :param repos: Names of the rows.
+        :param matrix: Sparse matrix with the weights.
+        :param names: Column names by the column index. Missing columns are named "#<column>".
+        :return: self
+        """
+        super(HashedBOW, self).construct(repos=repos, matrix=matrix)
+        self._names = names
+        return self
+
+    def _load_tree_kwargs(self, tree):
+        tree_kwargs = super(HashedBOW, self)._load_tree_kwargs(tree)
+        columns = tree["columns"].tolist()
+        names = split_strings(tree["names"]) if columns else []
+        tree_kwargs["names"] = dict(zip(columns, names))
+        return tree_kwargs
+
+    @property
+    def names(self) -> dict:
+        """
+        Returns the stored column names by the column index.
+        """
+        return self._names
+
+    @property
+    def tokens(self) -> list:
+        """
+        Returns the names of all the columns.
+        """
+        return [self._names.get(i, "#%d" % i) for i in range(self._matrix.shape[1])]
+
+    def become_bow(self, vocabulary=None):
+        """
+        Converts this model to :class:`BOW` in place.
+
+        :param vocabulary: Column names. :attr:`tokens` if None.
+        :return: None
+        """
+        tokens = self.tokens if vocabulary is None else list(vocabulary)
+        self.NAME = BOW.NAME
+        self.__class__ = BOW
+        self._tokens = tokens
+
+    def save(self, output, deps=None):
+        if not deps:
+            deps = tuple()
+        self._meta = generate_meta(self.NAME, ast2vec.__version__, *deps)
+        columns = sorted(self._names)
+        tree = {"repos": merge_strings(self._repos),
+                "matrix": disassemble_sparse_matrix(self._matrix),
+                "columns": numpy.array(columns, dtype=numpy.uint32)}
+        # merge_strings() does not support empty lists and the rows can be empty
+        if columns:
+            tree["names"] = merge_strings([self._names[c] for c in columns])
+        write_model(self._meta, tree, output)
@@ -0,0 +1,119 @@
+import ast2vec
+from modelforge import generate_meta
+import numpy
+from modelforge.model import Model, split_strings, write_model, merge_strings
+from modelforge.models import register_model
+
+
+@register_model
+class LibraryAPI(Model):
+    """
+    Compiled API of the library: function and class names, qualified paths of them and module
+    names. All of them are stored as sorted string arrays, so the model is small and loads fast.
+    It replaces the library UAST model for snippets extraction and function calls counting.
+    See :func:`snippet_ranger.model2.uast2library_api.uast_model_to_library_api`.
+    """
+
+    NAME = "library_api"
+    KINDS = ("functions", "classes", "qualified_names", "modules")
+
+    def construct(self, library, functions, classes, qualified_names, modules):
+        """
+        :param library: Name of the library.
+        :param functions: Function names which can be used from the library.
+        :param classes: Class names of the library.
+        :param qualified_names: Qualified paths of functions and classes, e.g. `numpy.linalg.norm`.
+        :param modules: Qualified module names of the library.
+        :return: self
+        """
+        if not functions:
+            raise ValueError("Library %s has no functions." % library)
+        self._library = library
+        self._functions = frozenset(functions)
+        self._classes = frozenset(classes)
+        self._qualified_names = frozenset(qualified_names)
+        self._modules = frozenset(modules)
+        return self
+
+    def _load_tree(self, tree):
+        names = split_strings(tree["names"])
+        kwargs = {}
+        offset = 0
+        for kind, size in zip(self.KINDS, tree["sizes"]):
+            kwargs[kind] = names[offset:offset + size]
+            offset += size
+        self.construct(library=tree["library"], **kwargs)
+
+    def dump(self):
+        return """Library: %s
+Number of functions: %d
+Number of classes: %d
+Number of modules: %d
+First 10 functions: %s""" % (
+            self._library, len(self._functions), len(self._classes), len(self._modules),
+            sorted(self._functions)[:10])
+
+    @property
+    def library(self):
+        """
+        Returns the name of the library.
+        """
+        return self._library
+
+    @property
+    def functions(self) -> frozenset:
+        """
+        Returns the set of function names which can be used from the library.
+        """
+        return self._functions
+
+    @property
+    def classes(self) -> frozenset:
+        """
+        Returns the set of class names of the library.
+        """
+        return self._classes
+
+    @property
+    def qualified_names(self) -> frozenset:
+        """
+        Returns the set of qualified paths of functions and classes.
+        """
+        return self._qualified_names
+
+    @property
+    def modules(self) -> frozenset:
+        """
+        Returns the set of qualified module names.
+        """
+        return self._modules
+
+    def __contains__(self, item):
+        """
+        Checks whether the function name belongs to the library API.
+        """
+        return item in self._functions
+
+    def __len__(self):
+        """
+        Returns the number of functions.
+        """
+        return len(self._functions)
+
+    def save(self, output, deps=None):
+        if not deps:
+            deps = tuple()
+        self._meta = generate_meta(self.NAME, ast2vec.__version__, *deps)
+        # All the names are stored in one array because merge_strings() does not support empty
+        # lists and there can be no classes
+        names = []
+        sizes = []
+        for kind in self.KINDS:
+            kind_names = sorted(getattr(self, kind))
+            names.extend(kind_names)
+            sizes.append(len(kind_names))
+        write_model(self._meta,
+                    {"library": self._library,
+                     "names": merge_strings(names),
+                     "sizes": numpy.array(sizes, dtype=numpy.uint32)},
+                    output)
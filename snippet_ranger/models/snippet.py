@@ -1,6 +1,220 @@
+from collections.abc import Sequence
+import logging
+
 from ast2vec import Source
+from modelforge.model import merge_strings, split_strings
 import numpy as np
 
+from snippet_ranger.uast_index import UASTIndex
+
+
+class SnippetSources(Sequence):
+    """
+    Sequence of snippet source codes which are stored as offsets into the shared per-file source
+    codes. Snippets do not hold copied strings, the slice is taken when the item is accessed.
+    """
+
+    def __init__(self, file_sources, file_ids, offsets):
+        """
+        :param file_sources: List of file source codes.
+        :param file_ids: Index of the file source code for every snippet.
+        :param offsets: Start and end offsets of every snippet in its file source code.
+        """
+        if len(file_ids) != len(offsets):
+            raise ValueError("Length of file_ids ({}) and offsets ({}) are not equal".format(
+                len(file_ids), len(offsets)))
+        self._file_sources = file_sources
+        self._file_ids = np.asarray(file_ids, dtype=np.uint32)
+        self._offsets = np.asarray(offsets, dtype=np.uint32).reshape(-1, 2)
+
+    @property
+    def file_sources(self):
+        """
+        Return the shared file source codes.
+        """
+        return self._file_sources
+
+    @property
+    def file_ids(self):
+        """
+        Return the index of the file source code for every snippet.
+        """
+        return self._file_ids
+
+    @property
+    def offsets(self):
+        """
+        Return start and end offsets of snippets in file source codes.
+        """
+        return self._offsets
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        start, end = self._offsets[item]
+        return self._file_sources[self._file_ids[item]][start:end]
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    def to_dict(self):
+        """
+        Return the dictionary to save the sources in the model tree.
+        """
+        return {"sources": merge_strings(self._file_sources),
+                "source_ids": self._file_ids,
+                "source_offsets": self._offsets}
+
+
+class LazyUasts(Sequence):
+    """
+    Sequence of UASTs which are kept serialized. UAST is decoded every time the item is accessed
+    and it is not cached, so only the UASTs in use take memory.
+    """
+
+    def __init__(self, raw):
+        """
+        :param raw: List of serialized UASTs.
+        """
+        self._raw = raw
+
+    @property
+    def raw(self):
+        """
+        Return the serialized UASTs.
+        """
+        return self._raw
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        return Source.parse_bblfsh_response(self._raw[item])
+
+    def __len__(self):
+        return len(self._raw)
+
+
+class SourceModelReference:
+    """
+    Lazy reference to the :class:`Source` model which snippets are taken from. The model is
+    loaded only when uasts or sources are accessed.
+    """
+
+    def __init__(self, path, uuid=None, model=None):
+        """
+        :param path: Path to the Source model.
+        :param uuid: UUID of the Source model. It is checked after the model is loaded.
+        :param model: Already loaded Source model if you have it.
+        """
+        self._path = path
+        self._uuid = uuid
+        self._model = model
+        self._indexes = {}
+
+    @property
+    def path(self):
+        """
+        Return the path to the Source model.
+        """
+        return self._path
+
+    @property
+    def uuid(self):
+        """
+        Return the UUID of the Source model.
+        """
+        return self._uuid
+
+    @property
+    def model(self):
+        """
+        Return the Source model. It is loaded on the first call.
+        """
+        if self._model is None:
+            model = Source(log_level=logging.WARNING).load(self._path)
+            if self._uuid is not None and model.meta["uuid"] != self._uuid:
+                raise ValueError("Source model {} has uuid {} but snippets were taken from {}"
+                                 .format(self._path, model.meta["uuid"], self._uuid))
+            self._model = model
+        return self._model
+
+    def node(self, file_id, node_id):
+        """
+        Return the UAST node of the file.
+
+        :param file_id: File index in the Source model.
+        :param node_id: Node index in :class:`UASTIndex` of the file UAST.
+        :return: UAST node.
+        """
+        index = self._indexes.get(file_id)
+        if index is None:
+            index = self._indexes[file_id] = UASTIndex(self.model.uasts[file_id])
+        return index.nodes[node_id]
+
+
+class ReferencedSources(Sequence):
+    """
+    Sequence of file source codes of the referenced :class:`Source` model.
+    """
+
+    def __init__(self, reference: SourceModelReference):
+        self._reference = reference
+
+    def __getitem__(self, item):
+        return self._reference.model.sources[item]
+
+    def __len__(self):
+        return len(self._reference.model.sources)
+
+
+class ReferencedUasts(Sequence):
+    """
+    Sequence of snippet UASTs which are resolved from the referenced :class:`Source` model when
+    the item is accessed.
+    """
+
+    def __init__(self, reference: SourceModelReference, file_ids, node_ids):
+        """
+        :param reference: Reference to the Source model.
+        :param file_ids: File index in the Source model for every snippet.
+        :param node_ids: Node index in :class:`UASTIndex` of the file UAST for every snippet.
+        """
+        if len(file_ids) != len(node_ids):
+            raise ValueError("Length of file_ids ({}) and node_ids ({}) are not equal".format(
+                len(file_ids), len(node_ids)))
+        self._reference = reference
+        self._file_ids = np.asarray(file_ids, dtype=np.uint32)
+        self._node_ids = np.asarray(node_ids, dtype=np.uint32)
+
+    @property
+    def reference(self):
+        """
+        Return the reference to the Source model.
+        """
+        return self._reference
+
+    @property
+    def file_ids(self):
+        """
+        Return the file index in the Source model for every snippet.
+        """
+        return self._file_ids
+
+    @property
+    def node_ids(self):
+        """
+        Return the node index in the file UAST for every snippet.
+        """
+        return self._node_ids
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        return self._reference.node(int(self._file_ids[item]), int(self._node_ids[item]))
+
+    def __len__(self):
+        return len(self._file_ids)
+
 
 class Snippet(Source):
     """
@@ -8,6 +222,14 @@ class Snippet(Source):
     For example, function declaration is a code snippet. So, this class is the same as source model
     but have start and end line positions of snippet location in file.
     You can use :class:`Source2Function` transformer to create function snippets from source model.
+    Sources can be :class:`SnippetSources`, then only snippet offsets into the shared file source
+    codes are stored.
+    Loaded model keeps uasts serialized in :class:`LazyUasts` and decodes them on access. Use
+    :meth:`iter_uasts` to process them one by one.
+    Uasts can be :class:`ReferencedUasts` with :class:`SnippetSources` over
+    :class:`ReferencedSources` as sources. Then the model stores only the reference to the
+    Source model, file and node indices and offsets. Call :meth:`materialize` to store the full
+    uasts and sources instead.
     """
 
     NAME = "snippet"
@@ -29,6 +251,31 @@ class Snippet(Source):
             self._positions = positions
         return self
 
+    @property
+    def is_reference(self) -> bool:
+        """
+        Indicates whether uasts and sources are resolved from the referenced Source model.
+        """
+        return isinstance(self._uasts, ReferencedUasts)
+
+    def materialize(self):
+        """
+        Resolve all the uasts and sources, so the model does not depend on other models anymore.
+
+        :return: self
+        """
+        self._uasts = list(self._uasts)
+        self._sources = list(self._sources)
+        return self
+
+    def iter_uasts(self):
+        """
+        Iterate over the snippet uasts. Every UAST is decoded or resolved only when it is reached
+        and it is not referenced by the model, so it is freed as soon as the caller drops it.
+        """
+        for i in range(len(self._uasts)):
+            yield self._uasts[i]
+
     @property
     def names(self) -> list:
         """
@@ -78,11 +325,51 @@ class Snippet(Source):
         return super(Snippet, self).__getitem__(item) + (self._positions[item], )
 
     def _load_tree_kwargs(self, tree):
-        tree_kwargs = super(Snippet, self)._load_tree_kwargs(tree)
-        tree_kwargs["positions"] = np.array(tree["positions"])
+        if "source_model" in tree:
+            return self._load_reference_tree_kwargs(tree)
+        # Do not call super() here: it decodes all the uasts
+        tree_kwargs = dict(repository=tree["repository"],
+                           filenames=split_strings(tree["filenames"]),
+                           uasts=LazyUasts(split_strings(tree["uasts"])),
+                           sources=split_strings(tree["sources"]),
+                           positions=np.array(tree["positions"]))
+        if "source_offsets" in tree:
+            tree_kwargs["sources"] = SnippetSources(tree_kwargs["sources"],
+                                                    np.array(tree["source_ids"]),
+                                                    np.array(tree["source_offsets"]))
         return tree_kwargs
 
+    def _load_reference_tree_kwargs(self, tree):
+        reference = SourceModelReference(tree["source_model"]["path"],
+                                         tree["source_model"]["uuid"])
+        file_ids = np.array(tree["file_ids"])
+        return dict(repository=tree["repository"],
+                    filenames=split_strings(tree["filenames"]),
+                    uasts=ReferencedUasts(reference, file_ids, np.array(tree["node_ids"])),
+                    sources=SnippetSources(ReferencedSources(reference), file_ids,
+                                           np.array(tree["source_offsets"])),
+                    positions=np.array(tree["positions"]))
+
     def _to_dict_to_save(self):
-        save_dict = super(Snippet, self)._to_dict_to_save()
+        if self.is_reference:
+            reference = self._uasts.reference
+            return {"repository": self.repository,
+                    "filenames": merge_strings(self.filenames),
+                    "source_model": {"path": reference.path, "uuid": reference.uuid},
+                    "file_ids": self._uasts.file_ids,
+                    "node_ids": self._uasts.node_ids,
+                    "source_offsets": self._sources.offsets,
+                    "positions": self._positions}
+        if isinstance(self._uasts, LazyUasts):
+            uasts = self._uasts.raw
+        else:
+            uasts = [uast.SerializeToString() for uast in self._uasts]
+        save_dict = {"repository": self.repository,
+                     "filenames": merge_strings(self.filenames),
+                     "uasts": merge_strings(uasts)}
+        if isinstance(self._sources, SnippetSources):
+            save_dict.update(self._sources.to_dict())
+        else:
+            save_dict["sources"] = merge_strings(self.sources)
         save_dict["positions"] = self._positions
         return save_dict
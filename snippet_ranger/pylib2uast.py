@@ -1,25 +1,90 @@
 import os
 import logging
-from ast2vec.repo2.uast import repos2uast_entry
+from collections import namedtuple
+
+from ast2vec.bblfsh_roles import Node
+from ast2vec.repo2.base import repos2_entry
+from ast2vec.repo2.uast import Repo2UASTModel, Repo2UASTModelTransformer
 from ast2vec.enry import install_enry
+from bblfsh.sdkversion import VERSION as BBLFSH_SDK_VERSION
+
+from snippet_ranger.python_uast import python_lib2uast
+from snippet_ranger.uast_cache import log_uast_cache_stats, UASTCache
+from snippet_ranger.utils import parse_size
+
+CachedResponse = namedtuple("CachedResponse", ("uast", "errors"))
+
+
+class CachingRepo2UASTModel(Repo2UASTModel):
+    """
+    Looks up the UASTs in :class:`UASTCache` before sending the files to the Babelfish server.
+    Babelfish does not report the driver versions, so the driver version must be passed
+    explicitly to keep the UASTs of different drivers apart.
+    """
+    def __init__(self, uast_cache: str=None, uast_cache_size: int=UASTCache.DEFAULT_MAX_SIZE,
+                 driver_version: str="", **kwargs):
+        """
+        :param uast_cache: Cache directory. The cache is disabled if None.
+        :param uast_cache_size: The maximal size of the cache in bytes.
+        :param driver_version: Version of the Babelfish drivers, part of the cache key.
+        :param kwargs: :class:`Repo2UASTModel` arguments.
+        """
+        super().__init__(**kwargs)
+        self._uast_cache = None if uast_cache is None else UASTCache(uast_cache, uast_cache_size)
+        self._driver_version = driver_version
+
+    def convert_repository(self, url_or_path):
+        result = super().convert_repository(url_or_path)
+        log_uast_cache_stats(self._log, self._uast_cache)
+        return result
+
+    def _bblfsh_parse(self, thread_index, filepath, language):
+        if self._uast_cache is None:
+            return super()._bblfsh_parse(thread_index, filepath, language)
+        with open(filepath, "rb") as fin:
+            key = self._uast_cache.key(fin.read(), "bblfsh/%s/%s/%s" % (
+                BBLFSH_SDK_VERSION, language, self._driver_version))
+        data = self._uast_cache.get(key)
+        if data is not None:
+            return CachedResponse(uast=Node.FromString(data), errors=[])
+        response = super()._bblfsh_parse(thread_index, filepath, language)
+        if response is not None and not response.errors:
+            self._uast_cache.put(key, response.uast.SerializeToString())
+        return response
+
+
+class CachingRepo2UASTModelTransformer(Repo2UASTModelTransformer):
+    WORKER_CLASS = CachingRepo2UASTModel
 
 
 def pylib2uast_entry(args):
     log = logging.getLogger("pylib2uast")
     module_names = args.input
     module_dirs = []
+    missing = set()
     for lib_name in args.input:
         try:
             module = __import__(lib_name)
             module_dir = os.path.abspath(os.path.dirname(module.__file__))
             module_dirs.append(module_dir)
         except ModuleNotFoundError as e:
-            log.error("No module named '%s'. Skipping.")
+            log.error("No module named '%s'. Skipping.", lib_name)
+            missing.add(lib_name)
 
+    args.uast_cache_size = parse_size(args.uast_cache_size)
+    if args.backend == "python":
+        cache = None
+        if args.uast_cache is not None:
+            cache = UASTCache(args.uast_cache, args.uast_cache_size)
+        python_lib2uast([name for name in module_names if name not in missing], module_dirs,
+                        args.output, args.threads, args.overwrite_existing, cache)
+        return
+    # The rest of the arguments are passed to the bblfsh UAST extractor
+    del args.backend
     args.input = module_dirs
 
     install_enry()
-    repos2uast_entry(args)
+    repos2_entry(args, CachingRepo2UASTModelTransformer)
     for file in os.listdir(args.output):
         for name in module_names:
             if name in file:
@@ -0,0 +1,272 @@
+import ast
+import logging
+import multiprocessing
+import os
+import sys
+
+from ast2vec.bblfsh_roles import CALL, CALL_CALLEE, FUNCTION_DECLARATION, \
+    FUNCTION_DECLARATION_BODY, FUNCTION_DECLARATION_NAME, IMPORT_ALIAS, IMPORT_PATH, Node, \
+    QUALIFIED_IDENTIFIER, SIMPLE_IDENTIFIER, TYPE_DECLARATION
+
+from snippet_ranger.import_resolver import ImportResolver
+from snippet_ranger.uast_cache import log_uast_cache_stats, UASTCache
+
+
+class PythonUASTConverter:
+    """
+    Converts Python source code to UAST with the standard `ast` module, without Babelfish.
+    The nodes which are used in this project have the same tokens, roles and properties as
+    in the UASTs of the bblfsh Python driver: function and class declarations, calls and
+    callees, identifiers and imports. Every node has `internal_type` and line positions.
+    """
+    VERSION = "1"  #: Bump when the produced UASTs change, it invalidates the cached UASTs.
+
+    @classmethod
+    def version(cls) -> str:
+        """
+        Returns the version string of the UASTs for :class:`UASTCache`. The trees depend on the
+        `ast` module, so it includes the Python version.
+        """
+        return "python-ast/%s/%d.%d" % ((cls.VERSION,) + sys.version_info[:2])
+
+    def convert(self, source) -> Node:
+        """
+        Parses the source code.
+
+        :param source: Python source code, str or bytes.
+        :return: UAST.
+        :raise SyntaxError: if the code can not be parsed.
+        """
+        root = Node()
+        root.internal_type = "Module"
+        tree = ast.parse(source)
+        if tree.body and getattr(tree.body[0], "end_lineno", None) is None:
+            self._set_end_lines(tree)
+        self._add_children(root, tree)
+        return root
+
+    @classmethod
+    def _set_end_lines(cls, tree):
+        # Python < 3.8 does not record where the nodes end: it is the last line of the children
+        end_line = getattr(tree, "lineno", 0)
+        for child in ast.iter_child_nodes(tree):
+            end_line = max(end_line, cls._set_end_lines(child))
+        if hasattr(tree, "lineno"):
+            tree.end_lineno = end_line
+        return end_line
+
+    def _add_children(self, node, tree):
+        for field, value in ast.iter_fields(tree):
+            if isinstance(value, ast.AST):
+                self._add(node, value)
+            elif isinstance(value, list):
+                container = node
+                if field == "body" and FUNCTION_DECLARATION in node.roles and value:
+                    container = node.children.add()
+                    container.internal_type = "body"
+                    container.roles.append(FUNCTION_DECLARATION_BODY)
+                    self._set_position(container, value[0], value[-1])
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        self._add(container, item)
+
+    def _add(self, parent, tree):
+        node = parent.children.add()
+        node.internal_type = type(tree).__name__
+        if hasattr(tree, "lineno"):
+            self._set_position(node, tree, tree)
+        else:
+            node.start_position.CopyFrom(parent.start_position)
+            node.end_position.CopyFrom(parent.end_position)
+        if isinstance(tree, (ast.Import, ast.ImportFrom)):
+            self._add_import(node, tree)
+            return
+        if isinstance(tree, (ast.FunctionDef, getattr(ast, "AsyncFunctionDef", ()))):
+            node.token = tree.name
+            node.roles.extend([FUNCTION_DECLARATION, FUNCTION_DECLARATION_NAME,
+                               SIMPLE_IDENTIFIER])
+        elif isinstance(tree, ast.ClassDef):
+            node.token = tree.name
+            node.roles.extend([TYPE_DECLARATION, SIMPLE_IDENTIFIER])
+        elif isinstance(tree, ast.Name):
+            node.token = tree.id
+            node.roles.append(SIMPLE_IDENTIFIER)
+        elif isinstance(tree, ast.Attribute):
+            node.token = tree.attr
+            node.roles.extend([SIMPLE_IDENTIFIER, QUALIFIED_IDENTIFIER])
+        elif isinstance(tree, ast.arg):
+            node.token = tree.arg
+            node.roles.append(SIMPLE_IDENTIFIER)
+        elif isinstance(tree, ast.Call):
+            node.roles.append(CALL)
+        self._add_children(node, tree)
+        if isinstance(tree, ast.Call):
+            # func is the first field of Call
+            node.children[0].roles.append(CALL_CALLEE)
+
+    @staticmethod
+    def _set_position(node, first, last):
+        node.start_position.line = first.lineno
+        node.start_position.col = first.col_offset + 1
+        node.end_position.line = getattr(last, "end_lineno", None) or last.lineno
+        node.end_position.col = (getattr(last, "end_col_offset", None) or 0) + 1
+
+    def _add_import(self, node, tree):
+        if isinstance(tree, ast.ImportFrom):
+            node.properties["level"] = str(tree.level or 0)
+            if tree.module is not None:
+                node.properties["ImportFrom.module"] = tree.module
+        for alias in tree.names:
+            child = node.children.add()
+            child.internal_type = "alias"
+            child.token = alias.name
+            child.roles.extend([IMPORT_PATH, SIMPLE_IDENTIFIER])
+            child.properties["asname"] = alias.asname or ImportResolver.NO_ALIAS
+            child.start_position.CopyFrom(node.start_position)
+            child.end_position.CopyFrom(node.end_position)
+            if alias.asname:
+                asname = child.children.add()
+                asname.internal_type = "asname"
+                asname.token = alias.asname
+                asname.roles.extend([IMPORT_ALIAS, SIMPLE_IDENTIFIER])
+                asname.start_position.CopyFrom(node.start_position)
+                asname.end_position.CopyFrom(node.end_position)
+        if isinstance(tree, ast.ImportFrom) and tree.module:
+            module = node.children.add()
+            module.internal_type = "module"
+            module.token = tree.module
+            module.roles.extend([IMPORT_PATH, SIMPLE_IDENTIFIER])
+            module.properties["promotedPropertyString"] = "true"
+            module.start_position.CopyFrom(node.start_position)
+            module.end_position.CopyFrom(node.end_position)
+
+
+def find_python_files(root: str) -> list:
+    """
+    Finds the Python files in the directory recursively.
+
+    :param root: Directory to scan.
+    :return: Sorted list of the file paths relative to the root.
+    """
+    filenames = []
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames.sort()
+        for filename in files:
+            if filename.endswith(".py"):
+                filenames.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return sorted(filenames)
+
+
+def parse_python_file(path: str, max_size: int=None, cache: UASTCache=None):
+    """
+    Parses the Python file with :class:`PythonUASTConverter`.
+
+    :param path: Path to the file.
+    :param max_size: Files which are bigger are skipped. No limit if None.
+    :param cache: :class:`UASTCache` to look up the UAST before parsing and to store it after.
+    :return: Serialized UAST or None if the file is skipped or can not be parsed.
+    """
+    log = logging.getLogger("python_uast")
+    try:
+        if max_size is not None and os.path.getsize(path) > max_size:
+            log.warning("%s is too big - %d", path, os.path.getsize(path))
+            return None
+        with open(path, "rb") as fin:
+            source = fin.read()
+        if cache is not None:
+            key = cache.key(source, PythonUASTConverter.version())
+            data = cache.get(key)
+            if data is not None:
+                return data
+        data = PythonUASTConverter().convert(source).SerializeToString()
+        if cache is not None:
+            cache.put(key, data)
+        return data
+    # RecursionError is a RuntimeError, it does not exist in Python 3.4
+    except (OSError, SyntaxError, ValueError, RuntimeError) as e:
+        log.warning("Failed to parse %s: %s", path, e)
+        return None
+
+
+_worker_cache = None
+
+
+def _init_worker(cache_path, cache_max_size):
+    global _worker_cache
+    if cache_path is not None:
+        _worker_cache = UASTCache(cache_path, cache_max_size)
+
+
+def _parse_python_file(args):
+    if _worker_cache is None:
+        return parse_python_file(*args), 0, 0
+    hits, misses = _worker_cache.hits, _worker_cache.misses
+    result = parse_python_file(*args, cache=_worker_cache)
+    return result, _worker_cache.hits - hits, _worker_cache.misses - misses
+
+
+def parse_python_files(root: str, filenames: list, num_processes: int=1,
+                       max_size: int=None, cache: UASTCache=None) -> tuple:
+    """
+    Parses the Python files in a pool of processes.
+
+    :param root: Directory with the files.
+    :param filenames: Paths to the files relative to the root.
+    :param num_processes: Number of processes. 0 means CPU count.
+    :param max_size: Files which are bigger are skipped. No limit if None.
+    :param cache: :class:`UASTCache` to reuse the UASTs of the files with the same content. \
+        The processes open their own instances and their hits and misses are added to it.
+    :return: Names of the parsed files and their UASTs in the same order.
+    """
+    tasks = [(os.path.join(root, filename), max_size) for filename in filenames]
+    num_processes = num_processes or multiprocessing.cpu_count()
+    if num_processes == 1:
+        results = [(parse_python_file(*task, cache=cache), 0, 0) for task in tasks]
+    else:
+        initargs = (None, None) if cache is None else (cache.path, cache.max_size)
+        with multiprocessing.Pool(num_processes, _init_worker, initargs) as pool:
+            results = pool.map(_parse_python_file, tasks, chunksize=16)
+        if cache is not None:
+            cache.update_stats(sum(r[1] for r in results), sum(r[2] for r in results))
+    results = [r[0] for r in results]
+    parsed_filenames = []
+    uasts = []
+    for filename, result in zip(filenames, results):
+        if result is not None:
+            parsed_filenames.append(filename)
+            uasts.append(Node.FromString(result))
+    return parsed_filenames, uasts
+
+
+def python_lib2uast(names: list, dirs: list, output: str, num_processes: int=1,
+                    overwrite_existing: bool=True, cache: UASTCache=None):
+    """
+    Converts the Python libraries to UAST models with :class:`PythonUASTConverter`.
+
+    :param names: Library names. The models are saved to `<output>/<name>.asdf`.
+    :param dirs: Library directories.
+    :param output: Output directory.
+    :param num_processes: Number of processes to parse the files. 0 means CPU count.
+    :param overwrite_existing: Rewrite existing models or skip them.
+    :param cache: :class:`UASTCache` to reuse the UASTs of the files with the same content.
+    :return: None
+    """
+    from ast2vec import UASTModel
+    from ast2vec.repo2.base import Repo2Base
+
+    log = logging.getLogger("python_uast")
+    os.makedirs(output, exist_ok=True)
+    for name, root in zip(names, dirs):
+        path = os.path.join(output, name + ".asdf")
+        if os.path.exists(path) and not overwrite_existing:
+            log.warning("Model %s already exists, skipping.", path)
+            continue
+        filenames = find_python_files(root)
+        log.info("Parsing %d files of %s...", len(filenames), name)
+        filenames, uasts = parse_python_files(root, filenames, num_processes,
+                                              Repo2Base.MAX_FILE_SIZE, cache)
+        if not filenames:
+            log.error("No files of %s were parsed.", name)
+            continue
+        UASTModel().construct(repository=root, filenames=filenames, uasts=uasts).save(path)
+    log_uast_cache_stats(log, cache)
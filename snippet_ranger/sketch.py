@@ -0,0 +1,257 @@
+import hashlib
+import math
+
+import numpy
+
+
+def hash_tokens(tokens) -> numpy.ndarray:
+    """
+    Calculates stable 64-bit hashes of the tokens. Python's `hash()` is salted per process, so
+    it can not be used for the sketches which are merged across workers.
+
+    :param tokens: Iterable of strings.
+    :return: uint64 array of hashes.
+    """
+    # blake2b is faster but it appeared only in Python 3.6
+    return numpy.fromiter(
+        (int.from_bytes(hashlib.md5(token.encode("utf-8", "surrogatepass")).digest()[:8],
+                        "little")
+         for token in tokens), dtype=numpy.uint64)
+
+
+class CountMinSketch:
+    """
+    Count-min sketch: a fixed size table of counters which overestimates token frequencies.
+    With probability `1 - delta` the error of every estimate is at most `epsilon * total`,
+    where `epsilon = e / width` and `delta = exp(-depth)`. Sketches with the same shape are
+    merged by adding the tables.
+    """
+    def __init__(self, width: int=2 ** 20, depth: int=4):
+        """
+        :param width: Number of counters in every row.
+        :param depth: Number of rows, i.e. independent hash functions.
+        """
+        self._table = numpy.zeros((depth, width), dtype=numpy.int64)
+        self._total = 0
+
+    @property
+    def width(self) -> int:
+        """
+        Returns the number of counters in every row.
+        """
+        return self._table.shape[1]
+
+    @property
+    def depth(self) -> int:
+        """
+        Returns the number of rows.
+        """
+        return self._table.shape[0]
+
+    @property
+    def total(self) -> int:
+        """
+        Returns the sum of all the added counts.
+        """
+        return self._total
+
+    @property
+    def epsilon(self) -> float:
+        """
+        Returns the relative error of the estimates.
+        """
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        """
+        Returns the probability that the error of the estimate is bigger than the bound.
+        """
+        return math.exp(-self.depth)
+
+    @property
+    def error_bound(self) -> float:
+        """
+        Returns the maximal absolute error of the estimates with probability `1 - delta`.
+        """
+        return self.epsilon * self._total
+
+    def _indices(self, tokens) -> numpy.ndarray:
+        # Double hashing: the row i uses h1 + i * h2
+        hashes = hash_tokens(tokens)
+        first = (hashes & numpy.uint64(0xffffffff)).astype(numpy.int64)
+        second = (hashes >> numpy.uint64(32)).astype(numpy.int64) | 1
+        rows = numpy.arange(self.depth, dtype=numpy.int64)[:, numpy.newaxis]
+        return (first + rows * second) % self.width
+
+    def update(self, tokens, counts) -> numpy.ndarray:
+        """
+        Adds the counts of the tokens.
+
+        :param tokens: List of unique tokens.
+        :param counts: Counts of the tokens.
+        :return: Updated estimates of the tokens.
+        """
+        counts = numpy.asarray(counts, dtype=numpy.int64)
+        indices = self._indices(tokens)
+        for row in range(self.depth):
+            numpy.add.at(self._table[row], indices[row], counts)
+        self._total += int(counts.sum())
+        return self._estimate(indices)
+
+    def estimate(self, tokens) -> numpy.ndarray:
+        """
+        Estimates the counts of the tokens. The estimates are never less than the true counts.
+
+        :param tokens: List of tokens.
+        :return: int64 array of estimates.
+        """
+        return self._estimate(self._indices(tokens))
+
+    def _estimate(self, indices):
+        if indices.shape[1] == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        return self._table[numpy.arange(self.depth)[:, numpy.newaxis], indices].min(axis=0)
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """
+        Adds the counts of the other sketch to this one.
+
+        :param other: :class:`CountMinSketch` of the same shape.
+        :return: self
+        """
+        if self._table.shape != other._table.shape:
+            raise ValueError("Sketch shapes are different: %s and %s" % (
+                self._table.shape, other._table.shape))
+        self._table += other._table
+        self._total += other._total
+        return self
+
+
+class HeavyHitters:
+    """
+    Keeps the tokens with the biggest estimated counts. At most `2 * capacity` candidates are
+    stored: when there are more, the candidates with the smallest estimates are dropped.
+    """
+    def __init__(self, capacity: int):
+        """
+        :param capacity: Number of the heaviest tokens which are guaranteed to be kept.
+        """
+        self._capacity = capacity
+        self._candidates = {}
+
+    @property
+    def capacity(self) -> int:
+        """
+        Returns the number of the heaviest tokens which are kept.
+        """
+        return self._capacity
+
+    def __len__(self):
+        """
+        Returns the number of candidates.
+        """
+        return len(self._candidates)
+
+    def update(self, tokens, estimates):
+        """
+        Updates the estimates of the tokens.
+
+        :param tokens: List of tokens.
+        :param estimates: Estimated counts of the tokens.
+        :return: None
+        """
+        self._candidates.update(zip(tokens, numpy.asarray(estimates).tolist()))
+        if len(self._candidates) > 2 * self._capacity:
+            self._candidates = dict(self.top(self._capacity))
+
+    def merge(self, other: "HeavyHitters", sketch: CountMinSketch) -> "HeavyHitters":
+        """
+        Merges the candidates of the other heavy hitters. The estimates are recalculated from
+        the merged sketch.
+
+        :param other: :class:`HeavyHitters` to merge.
+        :param sketch: :class:`CountMinSketch` with the counts of both.
+        :return: self
+        """
+        tokens = list(self._candidates.keys() | other._candidates.keys())
+        self._candidates = {}
+        self.update(tokens, sketch.estimate(tokens))
+        return self
+
+    def top(self, n: int=None) -> list:
+        """
+        Returns the heaviest tokens.
+
+        :param n: Number of tokens. All the candidates if None.
+        :return: List of (token, estimate) pairs sorted by estimate in descending order, then \
+            by token.
+        """
+        items = sorted(self._candidates.items(), key=lambda item: (-item[1], item[0]))
+        return items if n is None else items[:n]
+
+
+class DocFreqSketch:
+    """
+    Approximate document frequencies with fixed memory: :class:`CountMinSketch` counts all the
+    tokens and :class:`HeavyHitters` keeps the most frequent ones.
+    """
+    def __init__(self, topn: int, width: int=2 ** 20, depth: int=4):
+        """
+        :param topn: Number of the most frequent tokens to keep.
+        :param width: Width of :class:`CountMinSketch`.
+        :param depth: Depth of :class:`CountMinSketch`.
+        """
+        self._sketch = CountMinSketch(width, depth)
+        self._heavy = HeavyHitters(topn)
+        self._docs = 0
+
+    @property
+    def sketch(self) -> CountMinSketch:
+        """
+        Returns the sketch with the counts of all the tokens.
+        """
+        return self._sketch
+
+    @property
+    def docs(self) -> int:
+        """
+        Returns the number of documents.
+        """
+        return self._docs
+
+    def update(self, freqs: dict, docs: int):
+        """
+        Adds the document frequencies.
+
+        :param freqs: Dictionary with tokens as keys and document frequencies as values.
+        :param docs: Number of documents.
+        :return: None
+        """
+        tokens = list(freqs)
+        self._heavy.update(tokens, self._sketch.update(tokens, list(freqs.values())))
+        self._docs += docs
+
+    def merge(self, other: "DocFreqSketch") -> "DocFreqSketch":
+        """
+        Adds the document frequencies of the other sketch.
+
+        :param other: :class:`DocFreqSketch` with the same sketch shape.
+        :return: self
+        """
+        self._sketch.merge(other._sketch)
+        self._heavy.merge(other._heavy, self._sketch)
+        self._docs += other._docs
+        return self
+
+    def top(self, n: int=None) -> list:
+        """
+        Returns the most frequent tokens with the final estimates.
+
+        :param n: Number of tokens. `topn` if None.
+        :return: List of (token, estimate) pairs sorted by estimate in descending order.
+        """
+        candidates = [token for token, _ in self._heavy.top()]
+        heavy = HeavyHitters(self._heavy.capacity)
+        heavy.update(candidates, self._sketch.estimate(candidates))
+        return heavy.top(self._heavy.capacity if n is None else n)
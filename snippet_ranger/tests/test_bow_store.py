@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+from scipy.sparse import csr_matrix, random as sparse_random, vstack
+
+from snippet_ranger.bow_store import append_strings, BOWStore, BOWStoreWriter, StringTable
+
+
+class StringTableTests(unittest.TestCase):
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "strings")
+            append_strings(path, ["a", "бв"])
+            append_strings(path, [])
+            append_strings(path, ["", "d"])
+            table = StringTable(path)
+            self.assertEqual(len(table), 4)
+            self.assertEqual(table[:], ["a", "бв", "", "d"])
+            self.assertEqual(table[-1], "d")
+            with self.assertRaises(IndexError):
+                table[4]
+            self.assertEqual(len(StringTable(os.path.join(tmpdir, "missing"))), 0)
+
+
+class BOWStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "store")
+        BOWStore.create(self.path, ["t%d" % i for i in range(7)])
+        self.matrices = [sparse_random(n, 7, 0.4, format="csr", dtype=numpy.float32,
+                                       random_state=n) for n in (3, 0, 5, 2)]
+        for i, matrix in enumerate(self.matrices):
+            writer = BOWStoreWriter(self.path, "b" if i % 2 else "a")
+            writer.append(["n%d_%d" % (i, j) for j in range(matrix.shape[0])], matrix)
+        BOWStore.build_index(self.path)
+        self.store = BOWStore(self.path)
+        # Shard "a" goes first
+        self.matrix = vstack([self.matrices[i] for i in (0, 2, 1, 3)]).tocsr()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assertMatrixEqual(self, first, second):
+        self.assertEqual(first.shape, second.shape)
+        self.assertEqual((first != second).nnz, 0)
+
+    def test_slices(self):
+        self.assertEqual(self.store.shape, (10, 7))
+        self.assertEqual(self.store.tokens[:2], ["t0", "t1"])
+        self.assertMatrixEqual(self.store[:], self.matrix)
+        self.assertMatrixEqual(self.store[2:7], self.matrix[2:7])
+        self.assertMatrixEqual(self.store[-1], self.matrix[-1])
+        self.assertEqual(self.store[5:3].shape, (0, 7))
+        with self.assertRaises(IndexError):
+            self.store[10]
+        with self.assertRaises(ValueError):
+            self.store[::2]
+
+    def test_names(self):
+        self.assertEqual(self.store.names(2, 4), ["n0_2", "n2_0"])
+        self.assertEqual(self.store.find("n2_1"), [4])
+        self.assertEqual(self.store.find("missing"), [])
+        self.assertMatrixEqual(self.store.get("n3_0"), self.matrix[8])
+        with self.assertRaises(KeyError):
+            self.store.get("missing")
+
+    def test_iter_batches(self):
+        batches = list(self.store.iter_batches(4))
+        self.assertEqual([len(names) for names, _ in batches], [4, 4, 2])
+        self.assertEqual(batches[1][0], self.store.names(4, 8))
+        self.assertMatrixEqual(vstack([m for _, m in batches]).tocsr(), self.matrix)
+
+    def test_create(self):
+        with self.assertRaises(FileExistsError):
+            BOWStore.create(self.path, ["x"])
+        BOWStore.create(self.path, ["x"], overwrite=True)
+        BOWStore.build_index(self.path)
+        self.assertEqual(BOWStore(self.path).shape, (0, 1))
+
+    def test_unindexed(self):
+        BOWStoreWriter(self.path, "c").append(["x"], csr_matrix((1, 7), dtype=numpy.float32))
+        with self.assertRaises(ValueError):
+            BOWStore(self.path)
+        with self.assertRaises(ValueError):
+            BOWStoreWriter(self.path, "c").append(["x", "y"], self.matrices[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
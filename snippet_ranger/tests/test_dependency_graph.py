@@ -0,0 +1,43 @@
+import unittest
+
+import numpy
+
+from snippet_ranger.dependency_graph import DependencyGraph
+
+
+class DependencyGraphTests(unittest.TestCase):
+    def setUp(self):
+        # Project 1 is in the repository 0, project 2 in 1 and project 3 in 2.
+        # Repository 0 depends on 4, 1 on 1, 2 on 2 and 1, 3 on 3 and 4 on 1.
+        self.graph = DependencyGraph(
+            dependencies_project_id=numpy.array([4, 1, 2, 1, 3, 1]),
+            dependencies_repository=numpy.array([0, 1, 2, 2, 3, 4]),
+            projects_id=numpy.array([1, 2, 3, 4]),
+            projects_repository=numpy.array([0, 1, 2, -1]),
+            num_repositories=5)
+
+    def test_adjacency(self):
+        adjacency = self.graph.adjacency.toarray()
+        self.assertEqual(adjacency.shape, (5, 5))
+        self.assertEqual(numpy.argwhere(adjacency).tolist(), [[1, 4], [2, 1], [3, 1], [3, 2]])
+
+    def test_dependent_repositories(self):
+        levels = self.graph.dependent_repositories([1, 4, 7], 3)
+        self.assertEqual(len(levels), 3)
+        levels = [numpy.argwhere(level.toarray()).tolist() for level in levels]
+        # (repository, source)
+        self.assertEqual(levels[0], [[0, 1], [1, 0], [2, 0], [4, 0]])
+        self.assertEqual(levels[1], [[1, 1], [2, 1], [3, 0], [4, 1]])
+        self.assertEqual(levels[2], [[3, 1]])
+
+    def test_dependent_repositories_depth(self):
+        levels = self.graph.dependent_repositories([1], 1)
+        self.assertEqual(len(levels), 1)
+        self.assertEqual(numpy.argwhere(levels[0].toarray())[:, 0].tolist(), [1, 2, 4])
+        levels = self.graph.dependent_repositories([3], 10)
+        self.assertEqual(len(levels), 1)
+        self.assertEqual(numpy.argwhere(levels[0].toarray()).tolist(), [[3, 0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
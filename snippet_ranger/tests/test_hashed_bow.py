@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+from ast2vec.bow import BOW
+import numpy
+from scipy.sparse import csr_matrix
+
+from snippet_ranger.models.hashed_bow import HashedBOW
+
+
+class HashedBOWTests(unittest.TestCase):
+    def setUp(self):
+        matrix = csr_matrix((numpy.array([1., 2.], dtype=numpy.float32), ([0, 1], [1, 3])),
+                            shape=(3, 4))
+        self.model = HashedBOW().construct(["a", "b", "c"], matrix, {1: "load|save", 3: "x"})
+
+    def test_tokens(self):
+        self.assertEqual(self.model.tokens, ["#0", "load|save", "#2", "x"])
+
+    def test_save_load(self):
+        with tempfile.NamedTemporaryFile(suffix=".asdf") as f:
+            self.model.save(f.name)
+            loaded = HashedBOW().load(f.name)
+        self.assertEqual(loaded.repos, ["a", "b", "c"])
+        self.assertEqual(loaded.names, {1: "load|save", 3: "x"})
+        self.assertEqual((loaded.matrix != self.model.matrix).nnz, 0)
+
+    def test_save_empty(self):
+        model = HashedBOW().construct(["a"], csr_matrix((1, 4), dtype=numpy.float32), {})
+        with tempfile.NamedTemporaryFile(suffix=".asdf") as f:
+            model.save(f.name)
+            loaded = HashedBOW().load(f.name)
+        self.assertEqual(loaded.names, {})
+        self.assertEqual(loaded.tokens, ["#0", "#1", "#2", "#3"])
+
+    def test_become_bow(self):
+        self.model.become_bow()
+        self.assertIsInstance(self.model, BOW)
+        self.assertEqual(self.model.tokens, ["#0", "load|save", "#2", "x"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from ast2vec import Source
+from ast2vec import bblfsh_roles
+from ast2vec.bblfsh_roles import Node
+
+from snippet_ranger.import_resolver import ImportResolver, library_callees, qualified_callee
+from snippet_ranger.tests import models
+
+
+def make_node(token="", roles=(), children=(), **properties):
+    node = Node()
+    node.token = token
+    node.roles.extend(roles)
+    node.children.extend(children)
+    for key, value in properties.items():
+        node.properties[key] = value
+    return node
+
+
+def make_import(*names, module=None, level="0"):
+    aliases = []
+    for name in names:
+        name, _, asname = name.partition(" as ")
+        aliases.append(make_node(name, [bblfsh_roles.IMPORT_PATH, bblfsh_roles.SIMPLE_IDENTIFIER],
+                                 asname=asname or ImportResolver.NO_ALIAS))
+    if module is None:
+        return make_node(children=aliases)
+    aliases.append(make_node(module, [bblfsh_roles.IMPORT_PATH, bblfsh_roles.SIMPLE_IDENTIFIER],
+                             promotedPropertyString="true"))
+    return make_node(children=aliases, level=level, **{"ImportFrom.module": module})
+
+
+class ImportResolverTests(unittest.TestCase):
+    def setUp(self):
+        self.uast = make_node(children=[
+            make_import("numpy as np", "os.path"),
+            make_import("linalg as la", "array", module="numpy"),
+            make_import("*", module="scipy"),
+            make_import("sibling", module="utils", level="1"),
+        ])
+
+    def test_aliases(self):
+        resolver = ImportResolver(self.uast)
+        self.assertEqual(resolver.aliases, {"np": "numpy", "os": "os", "la": "numpy.linalg",
+                                            "array": "numpy.array"})
+        self.assertEqual(resolver.star_modules, ["scipy"])
+
+    def test_resolve(self):
+        resolver = ImportResolver(self.uast)
+        self.assertEqual(resolver.resolve("np.linalg.norm"), ["numpy.linalg.norm"])
+        self.assertEqual(resolver.resolve("la.norm"), ["numpy.linalg.norm"])
+        self.assertEqual(resolver.resolve("array"), ["numpy.array"])
+        self.assertEqual(resolver.resolve("sum"), ["scipy.sum"])
+        self.assertEqual(resolver.resolve("sibling"), ["scipy.sibling"])
+        self.assertEqual(resolver.resolve("x.load"), [])
+        bag = resolver.resolve_bag({"np.sum": 2, "la.norm": 1, "array": 1, "x.sum": 3})
+        self.assertEqual(bag, {"numpy.sum": 2, "numpy.linalg.norm": 1, "numpy.array": 1})
+        self.assertEqual(library_callees(bag, "numpy", {"sum", "norm"}), {"sum", "norm"})
+        self.assertEqual(library_callees(bag, "scipy", {"sum", "norm"}), set())
+        bag["numpy.other.norm"] = 1
+        self.assertEqual(library_callees(bag, "numpy", {"sum", "norm"}, {"numpy.linalg.norm"}),
+                         {"numpy.linalg.norm"})
+        self.assertEqual(library_callees(bag, "numpy", {"norm"}), {"norm"})
+
+    def test_qualified_callee(self):
+        identifier = [bblfsh_roles.SIMPLE_IDENTIFIER]
+        callee = make_node("norm", [bblfsh_roles.CALL_CALLEE, bblfsh_roles.QUALIFIED_IDENTIFIER],
+                           [make_node("linalg", [bblfsh_roles.QUALIFIED_IDENTIFIER],
+                                      [make_node("np", identifier)])])
+        self.assertEqual(qualified_callee(callee), "np.linalg.norm")
+        callee = make_node("bar", [bblfsh_roles.CALL_CALLEE],
+                           [make_node("", [bblfsh_roles.CALL], [make_node("foo", identifier)])])
+        self.assertEqual(qualified_callee(callee), "bar")
+
+    def test_source(self):
+        resolver = ImportResolver(Source().load(models.TEST_REPO).uasts[0])
+        self.assertEqual(resolver.aliases, {"test_lib": "test_lib", "f1": "test_lib.f1"})
+        self.assertEqual(resolver.resolve_bag({"f1": 1, "f2": 2}), {"test_lib.f1": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,14 @@
 import os
 
 import unittest
+from unittest.mock import patch
 import tempfile
 
-from snippet_ranger.librariesio_fetcher import LibrariesIOFetcher
+import pandas as pd
+
+from snippet_ranger.librariesio_fetcher import csv_block_ranges, LibrariesIOFetcher, \
+    read_csv_range, select_repositories
+from snippet_ranger.librariesio_index import LibrariesIOIndex
 from snippet_ranger.tests.models import DATA_DIR
 
 
@@ -12,15 +17,117 @@ class LibrariesIOFetcherTests(unittest.TestCase):
 
     def setUp(self):
         self.libio = LibrariesIOFetcher(LibrariesIOFetcherTests.LIBRARIES_IO_DATA_PATH)
+        self.save_urls = "get_dependent_rep_urls"
 
-    def get_url_str(self, lib, platform):
+    def get_url_str(self, lib, platform, **kwargs):
         with tempfile.NamedTemporaryFile() as f:
-            self.libio.get_dependent_rep_urls(lib, platform, f.name)
+            getattr(self.libio, self.save_urls)(lib, platform, f.name, **kwargs)
             with open(f.name) as f_urls:
                 urls = f_urls.read()
         return set(urls.split("\n")[:-1])
 
     def test_get_dependent_rep_urls(self):
+        self.check_dependent_rep_urls()
+
+    def test_get_dependent_rep_urls_index(self):
+        with tempfile.TemporaryDirectory() as index:
+            LibrariesIOIndex.build(LibrariesIOFetcherTests.LIBRARIES_IO_DATA_PATH, index)
+            self.libio = LibrariesIOFetcher(None, index_path=index)
+            self.check_dependent_rep_urls()
+            self.save_urls = "stream_dependent_rep_urls"
+            self.check_dependent_rep_urls()
+
+    def test_stream_dependent_rep_urls(self):
+        self.save_urls = "stream_dependent_rep_urls"
+        with patch.object(LibrariesIOFetcher, "BLOCK_SIZE", 1):
+            self.check_dependent_rep_urls()
+
+    def test_iter_dependent_rep_urls(self):
+        libs_info = self.libio.get_lib_info({"lib1": "", "lib2": ""}, "")
+        with patch.object(LibrariesIOFetcher, "BLOCK_SIZE", 1):
+            blocks = list(self.libio.iter_dependent_rep_urls(libs_info))
+        self.assertEqual(blocks, [{1: ["https://github.com/repo1/repo1"]},
+                                  {2: ["https://github.com/repo1/repo1"]},
+                                  {2: ["https://github.com/repo2/repo2"]}])
+
+    def test_get_dependent_rep_urls_parallel(self):
+        self.libio = LibrariesIOFetcher(LibrariesIOFetcherTests.LIBRARIES_IO_DATA_PATH,
+                                        num_processes=2)
+        with patch.object(LibrariesIOFetcher, "BLOCK_SIZE", 1):
+            self.check_dependent_rep_urls()
+
+    def test_csv_block_ranges(self):
+        with tempfile.NamedTemporaryFile("w") as f:
+            f.write('a,b\n1,"x\ny"\n2,z\n3,"w"\n')
+            f.flush()
+            self.assertEqual(list(csv_block_ranges(f.name, 1)), [(4, 12), (12, 16), (16, 22)])
+            self.assertEqual(list(csv_block_ranges(f.name, 10)), [(4, 16), (16, 22)])
+            self.assertEqual(list(csv_block_ranges(f.name, 100)), [(4, 22)])
+            block = read_csv_range(f.name, 4, 16, dtype={"b": str})
+        self.assertEqual(block["a"].tolist(), [1, 2])
+        self.assertEqual(block["b"].tolist(), ["x\ny", "z"])
+
+    def test_get_dependent_rep_urls_transitive(self):
+        # The arguments are checked before the projects are scanned
+        with patch.object(LibrariesIOFetcher, "get_lib_info") as get_lib_info:
+            for depth in (0, 2):
+                with self.assertRaises(ValueError):
+                    self.get_url_str({"lib1": ""}, "", depth=depth)
+            get_lib_info.assert_not_called()
+        with tempfile.TemporaryDirectory() as index:
+            LibrariesIOIndex.build(LibrariesIOFetcherTests.LIBRARIES_IO_DATA_PATH, index)
+            self.libio = LibrariesIOFetcher(None, index_path=index)
+            self.assertEqual(self.get_url_str({"lib1": ""}, ""),
+                             {"https://github.com/repo1/repo1"})
+            self.assertEqual(self.get_url_str({"lib1": ""}, "", depth=2),
+                             {"https://github.com/repo1/repo1", "https://github.com/repo2/repo2"})
+
+    def test_select_dependent_reps(self):
+        self.check_select_dependent_reps()
+
+    def test_select_dependent_reps_index(self):
+        with tempfile.TemporaryDirectory() as index:
+            LibrariesIOIndex.build(LibrariesIOFetcherTests.LIBRARIES_IO_DATA_PATH, index)
+            self.libio = LibrariesIOFetcher(None, index_path=index)
+            self.check_select_dependent_reps()
+
+    def check_select_dependent_reps(self):
+        reps = self.libio.get_dependent_reps(self.libio.get_lib_info({"lib2": ""}, ""))
+
+        def select(**kwargs):
+            return self.libio.select_dependent_reps(reps, **kwargs)["url"].tolist()
+
+        self.assertEqual(select(collapse_forks=True),
+                         ["https://github.com/repo1/repo1", "https://github.com/repo3/repo3"])
+        self.assertEqual(select(top=1), ["https://github.com/repo1/repo1"])
+        self.assertEqual(select(rank_by="size", top=1), ["https://github.com/repo1/repo1"])
+        self.assertEqual(select(collapse_forks=True, size_budget=90 * 1024),
+                         ["https://github.com/repo3/repo3"])
+        self.assertEqual(select(size_budget=90 * 1024), ["https://github.com/repo2/repo2"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.libio.get_dependent_rep_urls({"lib2": ""}, "", tmpdir,
+                                              selection=dict(collapse_forks=True, top=1))
+            with open(os.path.join(tmpdir, "lib2.txt")) as f_urls:
+                self.assertEqual(f_urls.read(), "https://github.com/repo1/repo1\n")
+
+    def test_select_repositories(self):
+        reps = pd.DataFrame({"Dependency Project ID": [1, 1, 1, 1, 2],
+                             "Host Type": ["GitHub"] * 5,
+                             "Repository Name with Owner": ["a", "b", "c", "d", "e"]})
+        repositories = pd.DataFrame({
+            "Host Type": ["GitHub"] * 4, "Name with Owner": ["a", "b", "c", "e"],
+            "Size": [10., 0., 20., 5.], "Stars Count": [1., 2., 3., 4.],
+            "Fork Source Name with Owner": [None, None, None, None],
+            "Mirror URL": [None, None, "https://mirror", None],
+            "Status": [None, None, None, "Removed"]})
+        selected = select_repositories(reps, repositories)
+        self.assertEqual(selected["Repository Name with Owner"].tolist(), list("abcde"))
+        selected = select_repositories(reps, repositories, drop_inactive=True)
+        self.assertEqual(selected["Repository Name with Owner"].tolist(), ["a"])
+        selected = select_repositories(reps, repositories, top=2)
+        self.assertEqual(selected["Repository Name with Owner"].tolist(), ["c", "b", "e"])
+
+    def check_dependent_rep_urls(self):
         url1 = set(["https://github.com/repo1/repo1"])
         url2 = set(["https://github.com/repo2/repo2"])
 
@@ -36,8 +143,8 @@ class LibrariesIOFetcherTests(unittest.TestCase):
         self.assertEqual(urls, url1 | url2)
 
         with tempfile.TemporaryDirectory() as tmpdir:
-            self.libio.get_dependent_rep_urls(
-                {"lib1": "lib1.url", "lib2": "lib2.url"}, "", tmpdir)
+            getattr(self.libio, self.save_urls)({"lib1": "lib1.url", "lib2": "lib2.url"}, "",
+                                                tmpdir)
 
             with open(os.path.join(tmpdir, "lib1.txt")) as f_urls:
                 urls = f_urls.read()
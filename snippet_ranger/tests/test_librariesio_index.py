@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from snippet_ranger.librariesio_index import LibrariesIOIndex
+from snippet_ranger.tests.models import DATA_DIR
+
+
+class LibrariesIOIndexTests(unittest.TestCase):
+    LIBRARIES_IO_DATA_PATH = os.path.join(DATA_DIR, "test_librariesio_data/")
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        LibrariesIOIndex.build(self.LIBRARIES_IO_DATA_PATH, self.tmpdir.name, chunksize=2)
+        self.index = LibrariesIOIndex(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_lib_info(self):
+        info = self.index.get_lib_info({"lib1": "lib1.url", "lib2": ""}, "")
+        self.assertEqual(info["ID"].tolist(), [1, 2])
+        self.assertEqual(info["Platform"].tolist(), ["Platform1", "Platform2"])
+        info = self.index.get_lib_info({"lib1": "", "lib2": "lib2.url"}, "Platform2")
+        self.assertEqual(info["Name"].tolist(), ["lib2"])
+        self.assertEqual(len(self.index.get_lib_info({"lib1": "other.url"}, "")), 0)
+        self.assertEqual(len(self.index.get_lib_info({"lib3": ""}, "")), 0)
+
+    def test_get_dependent_reps(self):
+        reps = self.index.get_dependent_reps([2, 1, 5])
+        self.assertEqual(reps["Dependency Project ID"].tolist(), [1, 2, 2])
+        self.assertEqual(reps["Repository Name with Owner"].tolist(),
+                         ["repo1/repo1", "repo1/repo1", "repo2/repo2"])
+        self.assertEqual(reps["Host Type"].tolist(), ["GitHub"] * 3)
+        self.assertEqual(len(self.index.get_dependent_reps([])), 0)
+
+    def test_get_transitive_dependent_reps(self):
+        # lib2 is in repo1/repo1 which depends on lib1
+        reps = self.index.get_transitive_dependent_reps([1, 2], 3)
+        self.assertEqual(reps["Dependency Project ID"].tolist(), [1, 1, 2, 2])
+        self.assertEqual(reps["Repository Name with Owner"].tolist(),
+                         ["repo1/repo1", "repo2/repo2", "repo1/repo1", "repo2/repo2"])
+        self.assertEqual(reps["Depth"].tolist(), [1, 2, 1, 1])
+        reps = self.index.get_transitive_dependent_reps([1], 1)
+        self.assertEqual(reps["Repository Name with Owner"].tolist(), ["repo1/repo1"])
+
+    def test_get_repositories(self):
+        self.assertTrue(self.index.has_repositories)
+        repositories = self.index.get_repositories(
+            [("GitHub", "repo2/repo2"), ("GitHub", "repo3/repo3"), ("GitLab", "repo1/repo1")])
+        self.assertEqual(repositories["Name with Owner"].tolist(),
+                         ["repo2/repo2", "repo3/repo3"])
+        self.assertEqual(repositories["Size"].tolist(), [80, 50])
+        self.assertEqual(repositories["Stars Count"].tolist(), [0, 5])
+        self.assertEqual(repositories["Fork Source Name with Owner"].tolist(),
+                         ["repo3/repo3", ""])
+        self.assertEqual(repositories["Status"].tolist(), ["", ""])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+from ast2vec import UASTModel
+
+from snippet_ranger.model2.source2func import get_library_functions
+from snippet_ranger.model2.uast2library_api import filename_to_module, library_api_entry, \
+    uast_model_to_library_api
+from snippet_ranger.models.library_api import LibraryAPI
+from snippet_ranger.tests import models
+
+
+class LibraryAPITests(unittest.TestCase):
+    def test_filename_to_module(self):
+        self.assertEqual(filename_to_module("lib", "__init__.py"), "lib")
+        self.assertEqual(filename_to_module("lib", "lib/__init__.py"), "lib")
+        self.assertEqual(filename_to_module("lib", "sub/module.py"), "lib.sub.module")
+        self.assertEqual(filename_to_module("lib", "./lib/sub/__init__.py"), "lib.sub")
+
+    def test_uast_model_to_library_api(self):
+        library_api = uast_model_to_library_api(models.LIB_NAME,
+                                                UASTModel().load(models.TEST_LIB))
+        self.assertEqual(library_api.library, models.LIB_NAME)
+        self.assertEqual(library_api.functions, {"f1", "f2", "f3", "f35"})
+        self.assertEqual(library_api.classes, set())
+        self.assertIn("f35", library_api)
+        self.assertEqual(len(library_api), 4)
+        self.assertTrue(any(name.endswith(".f3.f35") for name in library_api.qualified_names))
+        self.assertEqual(library_api.functions,
+                         set(get_library_functions(library_uast=models.TEST_LIB)))
+
+    def test_save_load(self):
+        library_api = uast_model_to_library_api(models.LIB_NAME,
+                                                UASTModel().load(models.TEST_LIB))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "library_api.asdf")
+            library_api.save(path)
+            loaded = LibraryAPI().load(path)
+            self.assertEqual(loaded.library, library_api.library)
+            self.assertEqual(loaded.functions, library_api.functions)
+            self.assertEqual(loaded.classes, library_api.classes)
+            self.assertEqual(loaded.qualified_names, library_api.qualified_names)
+            self.assertEqual(loaded.modules, library_api.modules)
+            self.assertEqual(get_library_functions(library_api=path),
+                             get_library_functions(models.TEST_LIB))
+
+    def test_no_functions(self):
+        with self.assertRaises(ValueError):
+            LibraryAPI().construct(models.LIB_NAME, [], [], [], [])
+
+    def test_library_api_entry(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "library_api.asdf")
+            args = argparse.Namespace(library_name=models.LIB_NAME,
+                                      library_uast=models.TEST_LIB,
+                                      output=path)
+            library_api_entry(args)
+            self.assertEqual(LibraryAPI().load(path).functions, {"f1", "f2", "f3", "f35"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import argparse
 from contextlib import contextmanager
 from io import StringIO
+import subprocess
 import sys
 import unittest
 import logging
@@ -23,15 +24,37 @@ def captured_output():
         logging.getLogger().removeHandler(log_handler)
 
 
+HELP_SCRIPT = """
+import contextlib, sys
+import snippet_ranger.__main__ as main
+with contextlib.redirect_stdout(sys.stderr):
+    try:
+        main.get_parser().parse_args(["--help"])
+    except SystemExit:
+        pass
+print(" ".join(sorted(set(name.split(".")[0] for name in sys.modules))))
+"""
+
+
 class MainTests(unittest.TestCase):
+    HEAVY_MODULES = {"ast2vec", "bblfsh", "modelforge", "numpy", "pandas", "scipy", "tensorflow"}
+
     def test_handlers(self):
         action2handler = {
             "source2func": "source2func_entry",
+            "library_api": "library_api_entry",
             "dependent_reps": "dependent_reps_entry",
+            "librariesio_index": "librariesio_index_entry",
             "snippet2df": "snippet2df_entry",
             "snippet2bow": "snippet2bow_entry",
             "snippet2fc_bow": "snippet2fc_bow_entry",
             "snippet2fc_df": "snippet2fc_df_entry",
+            "snippet2df_bow": "snippet2df_bow_entry",
+            "snippet2fc_df_bow": "snippet2fc_df_bow_entry",
+            "snippet2hashed_bow": "snippet2hashed_bow_entry",
+            "snippet2fc_hashed_bow": "snippet2fc_hashed_bow_entry",
+            "snippet2vw": "snippet2vw_entry",
+            "snippet2fc_vw": "snippet2fc_vw_entry",
             "pylib2uast": "pylib2uast_entry"
 
         }
@@ -72,6 +95,17 @@ class MainTests(unittest.TestCase):
         self.assertEqual(set_called_actions, set_actions)
         self.assertEqual(len(set_called_actions), len(called_actions))
 
+    def test_help_imports(self):
+        output = subprocess.check_output([sys.executable, "-c", HELP_SCRIPT],
+                                         stderr=subprocess.DEVNULL, universal_newlines=True)
+        modules = output.strip().split("\n")[-1]
+        self.assertFalse(self.HEAVY_MODULES.intersection(modules.split()))
+
+    def test_lazy_entry(self):
+        entry = main.lazy_entry("json", "dumps")
+        self.assertEqual(entry.__name__, "dumps")
+        self.assertEqual(entry([1]), "[1]")
+
     def test_empty(self):
         args = sys.argv
         error = argparse.ArgumentParser.error
@@ -0,0 +1,127 @@
+import ast
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ast2vec import bblfsh_roles
+
+from snippet_ranger.import_resolver import ImportResolver, qualified_callee
+from snippet_ranger.python_uast import find_python_files, parse_python_files, \
+    PythonUASTConverter
+from snippet_ranger.uast_cache import UASTCache
+from snippet_ranger.uast_index import UASTIndex
+
+
+SOURCE = """import numpy as np
+from os import path
+from . import sibling
+
+
+class Matrix:
+    def norm(self, x):
+        return np.linalg.norm(x)
+
+
+def load(name):
+    data = path.join(name,
+                     "data")
+    return data
+"""
+
+
+class PythonUASTConverterTests(unittest.TestCase):
+    def setUp(self):
+        self.uast = PythonUASTConverter().convert(SOURCE)
+        self.index = UASTIndex(self.uast)
+
+    def find(self, role):
+        return [self.index.nodes[i] for i in self.index.role_nodes(role).tolist()]
+
+    def test_declarations(self):
+        functions = self.find(bblfsh_roles.FUNCTION_DECLARATION)
+        self.assertEqual([f.token for f in functions], ["norm", "load"])
+        self.assertEqual([(f.start_position.line, f.end_position.line) for f in functions],
+                         [(7, 8), (11, 14)])
+        self.assertEqual([n.token for n in self.find(bblfsh_roles.FUNCTION_DECLARATION_NAME)],
+                         ["norm", "load"])
+        self.assertEqual([n.token for n in self.find(bblfsh_roles.TYPE_DECLARATION)],
+                         ["Matrix"])
+        bodies = self.find(bblfsh_roles.FUNCTION_DECLARATION_BODY)
+        self.assertEqual([(b.start_position.line, b.end_position.line) for b in bodies],
+                         [(8, 8), (12, 14)])
+
+    def test_calls(self):
+        callees = self.find(bblfsh_roles.CALL_CALLEE)
+        self.assertEqual([qualified_callee(c) for c in callees], ["np.linalg.norm", "path.join"])
+        self.assertEqual(len(self.find(bblfsh_roles.CALL)), 2)
+        self.assertEqual([c.start_position.line for c in callees], [8, 12])
+
+    def test_identifiers(self):
+        identifiers = set(self.index.bag(bblfsh_roles.SIMPLE_IDENTIFIER))
+        self.assertTrue({"np", "linalg", "norm", "self", "x", "name", "data"} <= identifiers)
+
+    def test_imports(self):
+        resolver = ImportResolver(self.uast)
+        self.assertEqual(resolver.aliases, {"np": "numpy", "path": "os.path"})
+        self.assertEqual([n.token for n in self.find(bblfsh_roles.IMPORT_ALIAS)], ["np"])
+        self.assertEqual(resolver.resolve("np.linalg.norm"), ["numpy.linalg.norm"])
+
+    def test_positions_without_end_lineno(self):
+        tree = ast.parse(SOURCE)
+        for node in ast.walk(tree):
+            # Python < 3.8 does not have these attributes
+            node.end_lineno = node.end_col_offset = None
+        with patch.object(ast, "parse", return_value=tree):
+            self.uast = PythonUASTConverter().convert(SOURCE)
+        self.index = UASTIndex(self.uast)
+        self.test_declarations()
+
+    @unittest.skipIf(sys.version_info < (3, 5), "async def appeared in Python 3.5")
+    def test_async(self):
+        uast = PythonUASTConverter().convert("async def load():\n    pass\n")
+        self.assertEqual(uast.children[0].token, "load")
+        self.assertIn(bblfsh_roles.FUNCTION_DECLARATION, uast.children[0].roles)
+
+    def test_syntax_error(self):
+        with self.assertRaises(SyntaxError):
+            PythonUASTConverter().convert("def (")
+
+
+class ParsePythonFilesTests(unittest.TestCase):
+    def test_parse_python_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "sub"))
+            files = {"a.py": "def a():\n    pass\n", os.path.join("sub", "b.py"): "b = 1\n",
+                     "broken.py": "def (", "readme.txt": "def c(): pass"}
+            for filename, source in files.items():
+                with open(os.path.join(root, filename), "w") as fout:
+                    fout.write(source)
+            filenames = find_python_files(root)
+            self.assertEqual(filenames, ["a.py", "broken.py", os.path.join("sub", "b.py")])
+            for num_processes in (1, 2):
+                parsed, uasts = parse_python_files(root, filenames, num_processes)
+                self.assertEqual(parsed, ["a.py", os.path.join("sub", "b.py")])
+                self.assertEqual(uasts[0].children[0].token, "a")
+                parsed, _ = parse_python_files(root, filenames, num_processes, max_size=10)
+                self.assertEqual(parsed, [os.path.join("sub", "b.py")])
+
+    def test_parse_python_files_cache(self):
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as cachedir:
+            for filename in ("a.py", "b.py", "c.py"):
+                with open(os.path.join(root, filename), "w") as fout:
+                    fout.write("def a():\n    pass\n" if filename != "c.py" else "c = 1\n")
+            filenames = find_python_files(root)
+            for num_processes in (1, 2):
+                cache = UASTCache(cachedir)
+                parsed, uasts = parse_python_files(root, filenames, num_processes, cache=cache)
+                self.assertEqual(parsed, filenames)
+                self.assertEqual(uasts[1].children[0].token, "a")
+                self.assertEqual(cache.hits + cache.misses, 3)
+            # the second pass finds all the files in the cache
+            self.assertEqual(cache.hits, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+import numpy
+
+from snippet_ranger.sketch import CountMinSketch, DocFreqSketch, hash_tokens, HeavyHitters
+
+
+class HashTokensTests(unittest.TestCase):
+    def test_stable(self):
+        hashes = hash_tokens(["load", "save", "load"])
+        self.assertEqual(hashes.dtype, numpy.uint64)
+        self.assertEqual(hashes[0], hashes[2])
+        self.assertNotEqual(hashes[0], hashes[1])
+        self.assertEqual(hash_tokens(["load"])[0], 10939562815821598188)
+
+
+class CountMinSketchTests(unittest.TestCase):
+    def test_exact(self):
+        sketch = CountMinSketch(width=1024, depth=4)
+        estimates = sketch.update(["a", "b", "c"], [3, 2, 1])
+        self.assertEqual(estimates.tolist(), [3, 2, 1])
+        sketch.update(["a"], [2])
+        self.assertEqual(sketch.estimate(["a", "b", "c"]).tolist(), [5, 2, 1])
+        self.assertEqual(sketch.total, 8)
+        self.assertEqual(sketch.estimate([]).tolist(), [])
+
+    def test_overestimate(self):
+        sketch = CountMinSketch(width=64, depth=3)
+        tokens = ["t%d" % i for i in range(1000)]
+        counts = numpy.arange(1, 1001)
+        sketch.update(tokens, counts)
+        errors = sketch.estimate(tokens) - counts
+        self.assertTrue((errors >= 0).all())
+        self.assertLess((errors > sketch.error_bound).mean(), sketch.delta)
+        self.assertAlmostEqual(sketch.epsilon, numpy.e / 64)
+        self.assertAlmostEqual(sketch.delta, numpy.exp(-3))
+
+    def test_merge(self):
+        first, second, both = (CountMinSketch(256, 2) for _ in range(3))
+        first.update(["a", "b"], [1, 2])
+        second.update(["b", "c"], [3, 4])
+        both.update(["a", "b", "c"], [1, 5, 4])
+        first.merge(second)
+        self.assertEqual(first.total, 10)
+        self.assertEqual(first.estimate(["a", "b", "c"]).tolist(),
+                         both.estimate(["a", "b", "c"]).tolist())
+        with self.assertRaises(ValueError):
+            first.merge(CountMinSketch(128, 2))
+
+
+class HeavyHittersTests(unittest.TestCase):
+    def test_prune(self):
+        heavy = HeavyHitters(2)
+        heavy.update(["a", "b", "c", "d"], [1, 4, 3, 2])
+        self.assertEqual(len(heavy), 4)
+        heavy.update(["e"], [5])
+        self.assertEqual(len(heavy), 2)
+        self.assertEqual(heavy.top(), [("e", 5), ("b", 4)])
+        self.assertEqual(heavy.top(1), [("e", 5)])
+
+
+class DocFreqSketchTests(unittest.TestCase):
+    def test_top(self):
+        parts = [DocFreqSketch(3, 1024, 4) for _ in range(3)]
+        parts[0].update({"a": 5, "b": 1, "c": 1, "d": 1}, 5)
+        parts[1].update({"b": 4, "c": 2, "e": 1}, 4)
+        parts[2].update({"c": 3, "f": 2, "d": 1}, 3)
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+        self.assertEqual(merged.docs, 12)
+        self.assertEqual(merged.top(), [("c", 6), ("a", 5), ("b", 5)])
+        self.assertEqual(merged.top(1), [("c", 6)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import tempfile
 import unittest
 
 import asdf
@@ -5,7 +6,7 @@ import numpy as np
 from ast2vec.bblfsh_roles import Node
 
 from modelforge import split_strings
-from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.models.snippet import Snippet, SnippetSources, LazyUasts
 from snippet_ranger.tests import models
 
 
@@ -56,6 +57,21 @@ class TestSnippet(unittest.TestCase):
                              "f1()\n    f3()\n    f3()")
             self.assert_np_arrays(model_item[3], np.array([4, 11]))
 
+    def test_lazy_uasts(self):
+        self.assertIsInstance(self.model.uasts, LazyUasts)
+        self.assertEqual(len(self.model.uasts), 1)
+        raw = self.model.uasts.raw[0]
+        self.assertEqual(type(raw), bytes)
+        self.assertEqual(self.model.uasts[0], Node.FromString(raw))
+        uasts = list(self.model.iter_uasts())
+        self.assertEqual(len(uasts), 1)
+        self.assertEqual(type(uasts[0]), Node)
+
+        with tempfile.NamedTemporaryFile(suffix=".asdf") as f:
+            self.model.save(f.name)
+            validate_asdf_file(self, f.name)
+            self.assertEqual(Snippet().load(f.name).uasts.raw[0], raw)
+
     def test_positions_start(self):
         self.assert_np_arrays(self.model.positions_start, np.array([4]))
 
@@ -92,6 +108,33 @@ class TestSnippet(unittest.TestCase):
         Snippet().construct(repository, filenames, sources, uasts, pos_start, pos_end)
         Snippet().construct(repository, filenames, sources, uasts, positions=positions)
 
+    def test_shared_sources(self):
+        file_sources = ["def f():\n    pass\n", "x = 1\n"]
+        sources = SnippetSources(file_sources, [0, 1, 0], [[0, 8], [0, 5], [13, 17]])
+        self.assertEqual(list(sources), ["def f():", "x = 1", "pass"])
+        self.assertEqual(sources[1:], ["x = 1", "pass"])
+        with self.assertRaises(ValueError):
+            SnippetSources(file_sources, [0, 1], [[0, 8]])
+
+        uasts = []
+        for token in ("f", "x", "pass"):
+            uast = Node()
+            uast.internal_type = "Module"
+            uast.token = token
+            uasts.append(uast)
+        model = Snippet().construct("repo", ["a.py", "b.py", "a.py"], uasts, sources,
+                                    positions=np.array([[0, 1], [0, 1], [1, 2]]))
+        self.assertEqual(model[2][2], "pass")
+        with tempfile.NamedTemporaryFile(suffix=".asdf") as f:
+            model.save(f.name)
+            data = asdf.open(f.name)
+            self.assertEqual(data.tree["sources"]["lengths"].shape[0], 2)
+            loaded = Snippet().load(f.name)
+        self.assertIsInstance(loaded.sources, SnippetSources)
+        self.assertEqual(list(loaded.sources), ["def f():", "x = 1", "pass"])
+        self.assertEqual([uast.token for uast in loaded.uasts], ["f", "x", "pass"])
+        self.assert_np_arrays(loaded.positions, np.array([[0, 1], [0, 1], [1, 2]]))
+
 
 if __name__ == "__main__":
     unittest.main()
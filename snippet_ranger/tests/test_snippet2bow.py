@@ -0,0 +1,157 @@
+import argparse
+import math
+import os
+import tempfile
+import unittest
+
+from ast2vec.df import DocumentFrequencies
+from ast2vec.bblfsh_roles import CALL_CALLEE
+from ast2vec.token_parser import NoTokenParser
+import numpy
+from scipy.sparse import csr_matrix
+
+from snippet_ranger.bow_store import BOWStore
+from snippet_ranger.model2.snippet2bow import CSRBuilder, HashingSnippet2BOW, Snippet2BOW, \
+    snippet2fc_hashed_bow_entry, SnippetModel2FuncCallsBOW, SnippetModel2HashedBOW
+from snippet_ranger.models.hashed_bow import HashedBOW
+from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.sketch import hash_tokens
+from snippet_ranger.tests import models
+
+
+class Snippet2BOWTests(unittest.TestCase):
+    def setUp(self):
+        self.docfreq = DocumentFrequencies().construct(10, ["f1", "f2", "f3"], [2, 5, 10])
+        vocabulary = {"f1": 0, "f2": 1, "f3": 2, "missing": 3}
+        self.uasts2bow = Snippet2BOW(vocabulary, self.docfreq, lambda x: x, NoTokenParser(),
+                                     CALL_CALLEE)
+        self.snippet = Snippet().load(models.SNIPPET)
+
+    def test_idf(self):
+        self.assertTrue(numpy.allclose(self.uasts2bow.idf[:3],
+                                       [math.log(5), math.log(2), math.log(1)]))
+        self.assertTrue(numpy.isnan(self.uasts2bow.idf[3]))
+
+    def test_call(self):
+        bag = self.uasts2bow(self.snippet.uasts[0])
+        true_bag = {0: math.log(2) * math.log(5), 1: math.log(3) * math.log(2), 2: 0}
+        self.assertEqual(set(bag), set(true_bag))
+        for key, val in true_bag.items():
+            self.assertAlmostEqual(bag[key], val)
+
+    def test_transform(self):
+        uasts = list(self.snippet.iter_uasts()) * 3
+        sizes, ids, weights = self.uasts2bow.transform(uasts)
+        self.assertEqual(sizes.tolist(), [3, 3, 3])
+        self.assertEqual(len(ids), 9)
+        self.assertEqual(len(weights), 9)
+        sizes, ids, weights = self.uasts2bow.transform([])
+        self.assertEqual((len(sizes), len(ids), len(weights)), (0, 0, 0))
+
+    def test_convert_model(self):
+        converter = SnippetModel2FuncCallsBOW(3, self.docfreq, num_processes=1)
+        bow = converter.convert_model(self.snippet)
+        self.assertEqual(bow.matrix.shape, (1, 3))
+        self.assertEqual(bow.tokens, ["f3", "f2", "f1"])
+        self.assertAlmostEqual(bow.matrix[0, 2], math.log(2) * math.log(5), places=6)
+
+    def test_convert_to_store(self):
+        converter = SnippetModel2FuncCallsBOW(3, self.docfreq, num_processes=1)
+        bow = converter.convert_model(self.snippet)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "store")
+            converter.convert_to_store(models.DATA_DIR, path,
+                                       pattern=os.path.basename(models.SNIPPET))
+            store = BOWStore(path)
+            self.assertEqual(store.shape, (1, 3))
+            self.assertEqual(store.tokens[:], bow.tokens)
+            self.assertEqual(store.names(), self.snippet.names)
+            self.assertEqual((store[:] != bow.matrix).nnz, 0)
+            self.assertEqual(store.find(self.snippet.names[0]), [0])
+
+
+class HashingSnippet2BOWTests(unittest.TestCase):
+    def setUp(self):
+        self.snippet = Snippet().load(models.SNIPPET)
+        self.uast = self.snippet.uasts[0]
+
+    def test_transform(self):
+        uasts2bow = HashingSnippet2BOW(2 ** 10, NoTokenParser(), CALL_CALLEE, idf=False)
+        sizes, ids, counts = uasts2bow.uasts_to_ids([self.uast])
+        self.assertEqual(sizes.tolist(), [3])
+        columns = (hash_tokens(["f1", "f2", "f3"]) % numpy.uint64(2 ** 10)).tolist()
+        self.assertEqual(sorted(ids.tolist()), sorted(columns))
+        tokens = uasts2bow.tokens()
+        self.assertEqual(len(tokens), 2 ** 10)
+        self.assertEqual([tokens[c] for c in columns], ["f1", "f2", "f3"])
+        self.assertEqual(tokens[0], "#0")
+        _, _, weights = uasts2bow.transform([self.uast])
+        self.assertTrue(numpy.allclose(weights, numpy.log1p(counts)))
+
+    def test_collisions(self):
+        uasts2bow = HashingSnippet2BOW(2 ** 10, NoTokenParser(), CALL_CALLEE)
+        counts = uasts2bow.uasts_to_ids([self.uast])[2]
+        uasts2bow = HashingSnippet2BOW(1, NoTokenParser(), CALL_CALLEE, samples=2)
+        sizes, ids, collided = uasts2bow.uasts_to_ids([self.uast, self.uast])
+        self.assertEqual(sizes.tolist(), [1, 1])
+        self.assertEqual(ids.tolist(), [0, 0])
+        self.assertEqual(collided.tolist(), [counts.sum()] * 2)
+        self.assertEqual(uasts2bow.tokens(), ["f1|f2"])
+
+    def test_online_idf(self):
+        uasts2bow = HashingSnippet2BOW(2 ** 10, NoTokenParser(), CALL_CALLEE)
+        sizes, ids, weights = uasts2bow.transform([self.uast, self.uast])
+        self.assertEqual(uasts2bow.docs, 2)
+        counts = uasts2bow.uasts_to_ids([self.uast])[2]
+        self.assertTrue(numpy.allclose(weights[:3], numpy.log1p(counts)))
+        _, _, weights = uasts2bow.transform([])
+        self.assertEqual(len(weights), 0)
+
+    def test_convert_model(self):
+        converter = SnippetModel2HashedBOW(2 ** 10, NoTokenParser(), CALL_CALLEE,
+                                           num_processes=1)
+        bow = converter.convert_model(self.snippet)
+        self.assertEqual(bow.matrix.shape, (1, 2 ** 10))
+        self.assertEqual(bow.matrix.nnz, 3)
+        self.assertEqual(sorted(bow.names.values()), ["f1", "f2", "f3"])
+        self.assertEqual(len(bow.tokens), 2 ** 10)
+        self.assertEqual(bow.meta["dependencies"], [])
+
+    def test_hashed_bow_entry(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            args = argparse.Namespace(input=models.DATA_DIR,
+                                      filter=os.path.basename(models.SNIPPET), processes=1,
+                                      overwrite_existing=True, hash_bits=10, idf=True,
+                                      samples=3, output=tmpdir)
+            snippet2fc_hashed_bow_entry(args)
+            bow = HashedBOW().load(os.path.join(tmpdir, os.path.basename(models.SNIPPET)))
+        self.assertEqual(bow.repos, self.snippet.names)
+        self.assertEqual(sorted(bow.names.values()), ["f1", "f2", "f3"])
+
+
+class CSRBuilderTests(unittest.TestCase):
+    def test_build(self):
+        builder = CSRBuilder(4, 5, capacity=1)
+        builder.extend(numpy.array([2, 0]), numpy.array([3, 1]), numpy.array([1.0, 2.0]))
+        builder.extend(numpy.array([]), numpy.array([]), numpy.array([]))
+        builder.extend(numpy.array([1, 3]), numpy.array([4, 2, 0, 1]),
+                       numpy.array([3.0, 4.0, 5.0, 6.0]))
+        self.assertEqual(builder.nnz, 6)
+        matrix = builder.build()
+        true_matrix = csr_matrix(([1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+                                  ([0, 0, 2, 3, 3, 3], [3, 1, 4, 2, 0, 1])), shape=(4, 5))
+        self.assertEqual((matrix != true_matrix).nnz, 0)
+        self.assertTrue(matrix.has_sorted_indices)
+        self.assertEqual(matrix.dtype, numpy.float32)
+
+    def test_empty(self):
+        self.assertEqual(CSRBuilder(0, 5).build().shape, (0, 5))
+        builder = CSRBuilder(1, 5)
+        with self.assertRaises(ValueError):
+            builder.build()
+        with self.assertRaises(ValueError):
+            builder.extend(numpy.array([0, 0]), numpy.array([]), numpy.array([]))
+
+
+if __name__ == "__main__":
+    unittest.main()
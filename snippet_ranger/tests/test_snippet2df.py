@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from ast2vec.bblfsh_roles import CALL_CALLEE
+from ast2vec.token_parser import NoTokenParser
+import numpy
+
+from snippet_ranger.model2.snippet2df import DocFreqPartial, merge_docfreq_partials, \
+    reduce_docfreq_partials, Snippet2ApproxDocFreq, Snippet2DocFreq
+from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.tests.test_snippet2df_bow import make_snippet
+
+
+def make_partial(docs, bag):
+    tokens = sorted(bag)
+    return DocFreqPartial(docs, numpy.array(tokens, dtype=object),
+                          numpy.array([bag[t] for t in tokens], dtype=numpy.int64))
+
+
+class Snippet2DocFreqTests(unittest.TestCase):
+    def test_merge(self):
+        merged = merge_docfreq_partials(make_partial(2, {"a": 1, "c": 2}),
+                                        make_partial(3, {"b": 3, "c": 1}))
+        self.assertEqual(merged.docs, 5)
+        self.assertEqual(merged.tokens.tolist(), ["a", "b", "c"])
+        self.assertEqual(merged.freqs.tolist(), [1, 3, 3])
+        self.assertEqual(merged.tokens.dtype, object)
+
+    def test_reduce(self):
+        partials = [make_partial(i, {"t%d" % j: i for j in range(i)}) for i in range(1, 8)]
+        for num_processes in (1, 2):
+            result = reduce_docfreq_partials(list(partials), num_processes)
+            self.assertEqual(result.docs, 28)
+            self.assertEqual(result.tokens.tolist(), ["t%d" % j for j in range(7)])
+            self.assertEqual(result.freqs.tolist(), [28, 27, 25, 22, 18, 13, 7])
+        self.assertEqual(reduce_docfreq_partials([]).docs, 0)
+
+    @staticmethod
+    def save_snippets(tmpdir):
+        for i in range(5):
+            uasts = [make_snippet("load", "plot" * (i + 1)), make_snippet("load", "load")]
+            Snippet().construct("repo", ["a.py"] * 2, uasts, [""] * 2, [0, 1], [1, 2]) \
+                .save(os.path.join(tmpdir, "%d.asdf" % i))
+
+    def test_calculate(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.save_snippets(tmpdir)
+            converter = Snippet2DocFreq(role=CALL_CALLEE, token_parser=NoTokenParser(),
+                                        num_processes=2)
+            df = converter.calculate(tmpdir, pattern="*.asdf")
+        self.assertEqual(df.docs, 10)
+        self.assertEqual(dict(df), {"load": 10, "plot": 1, "plotplot": 1, "plotplotplot": 1,
+                                    "plotplotplotplot": 1, "plotplotplotplotplot": 1})
+
+    def test_calculate_approximate(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.save_snippets(tmpdir)
+            converter = Snippet2ApproxDocFreq(2, 1024, 4, role=CALL_CALLEE,
+                                              token_parser=NoTokenParser(), num_processes=2)
+            df = converter.calculate(tmpdir, pattern="*.asdf")
+        self.assertEqual(df.docs, 10)
+        freqs = dict(df)
+        self.assertEqual(len(freqs), 2)
+        self.assertEqual(freqs.pop("load"), 10)
+        self.assertEqual(list(freqs.values()), [1])
+        self.assertEqual(converter.sketch.sketch.total, 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import argparse
+import logging
+import os
+import tempfile
+import unittest
+
+from ast2vec import bblfsh_roles, UASTModel
+from ast2vec.bow import BOW
+from ast2vec.df import DocumentFrequencies
+import numpy
+
+from snippet_ranger.model2.snippet2bow import snippet2bow_entry, snippet2fc_bow_entry
+from snippet_ranger.model2.snippet2df import snippet2df_entry, snippet2fc_df_entry
+from snippet_ranger.model2.snippet2df_bow import SnippetBags, snippet2df_bow_entry, \
+    snippet2fc_df_bow_entry
+from snippet_ranger.models.library_api import LibraryAPI
+from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.tests.test_import_resolver import make_node
+
+
+def make_snippet(*callees):
+    uast = make_node(children=[
+        make_node(callee, [bblfsh_roles.CALL_CALLEE, bblfsh_roles.SIMPLE_IDENTIFIER])
+        for callee in callees])
+    return uast
+
+
+class Snippet2DocFreqBOWTests(unittest.TestCase):
+    def _compare(self, df_entry, bow_entry, fused_entry, library_functions=True):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            uasts = [make_snippet("load_data", "plotGraph", "load_data", "load"),
+                     make_snippet("load", "loadData", "other"), make_snippet(),
+                     make_snippet("plotGraph")]
+            os.makedirs(os.path.join(tmpdir, "input"))
+            Snippet().construct("repo", ["a.py"] * len(uasts), uasts, [""] * len(uasts),
+                                list(range(len(uasts))), list(range(1, len(uasts) + 1))) \
+                .save(os.path.join(tmpdir, "input", "snippets.asdf"))
+            if library_functions:
+                LibraryAPI().construct("lib", ["load", "plot", "load_data"], [], [], ["lib"]) \
+                    .save(os.path.join(tmpdir, "library_api.asdf"))
+                library_uast, library_api = None, os.path.join(tmpdir, "library_api.asdf")
+            else:
+                UASTModel().construct("lib", ["lib.py"], [make_node("lib")]) \
+                    .save(os.path.join(tmpdir, "library_uast.asdf"))
+                library_uast, library_api = os.path.join(tmpdir, "library_uast.asdf"), None
+            args = argparse.Namespace(input=os.path.join(tmpdir, "input"),
+                                      filter="*.asdf",
+                                      tmpdir=None,
+                                      processes=1,
+                                      overwrite_existing=True,
+                                      log_level=logging.INFO,
+                                      vocabulary_size=100,
+                                      library_name="lib",
+                                      library_uast=library_uast,
+                                      library_api=library_api)
+            args.output = os.path.join(tmpdir, "df.asdf")
+            df_entry(args)
+            args.docfreq = args.output
+            args.output = os.path.join(tmpdir, "bow")
+            bow_entry(args)
+            args.docfreq = os.path.join(tmpdir, "fused_df.asdf")
+            args.output = os.path.join(tmpdir, "fused_bow")
+            fused_entry(args)
+
+            df = DocumentFrequencies().load(os.path.join(tmpdir, "df.asdf"))
+            fused_df = DocumentFrequencies().load(os.path.join(tmpdir, "fused_df.asdf"))
+            self.assertEqual(df.docs, fused_df.docs)
+            self.assertEqual(dict(df), dict(fused_df))
+            self.assertGreater(len(df), 0)
+            bow = BOW().load(os.path.join(tmpdir, "bow", "snippets.asdf"))
+            fused_bow = BOW().load(os.path.join(tmpdir, "fused_bow", "snippets.asdf"))
+            self.assertEqual(bow.matrix.shape[0], 4)
+            self.assertEqual(bow.tokens, fused_bow.tokens)
+            self.assertEqual(bow.repos, fused_bow.repos)
+            self.assertEqual(bow.matrix.shape, fused_bow.matrix.shape)
+            self.assertGreater(bow.matrix.nnz, 0)
+            for attr in ("indptr", "indices", "data"):
+                self.assertTrue(numpy.array_equal(getattr(bow.matrix, attr),
+                                                  getattr(fused_bow.matrix, attr)))
+
+    def test_identifiers(self):
+        self._compare(snippet2df_entry, snippet2bow_entry, snippet2df_bow_entry)
+
+    def test_function_calls(self):
+        self._compare(snippet2fc_df_entry, snippet2fc_bow_entry, snippet2fc_df_bow_entry)
+
+    def test_function_calls_without_library_functions(self):
+        self._compare(snippet2fc_df_entry, snippet2fc_bow_entry, snippet2fc_df_bow_entry,
+                      library_functions=False)
+
+    def test_snippet_bags(self):
+        bags = SnippetBags(["a", "b", "c"], ["x", "y"], numpy.array([0, 2, 2, 3]),
+                           numpy.array([0, 1, 1], dtype=numpy.int32),
+                           numpy.array([1, 2, 3], dtype=numpy.uint32))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bags.save(tmpdir)
+            loaded = SnippetBags.load(tmpdir)
+            self.assertEqual(len(loaded), 3)
+            self.assertEqual(loaded.names, ["a", "b", "c"])
+            self.assertEqual(loaded.tokens, ["x", "y"])
+            self.assertEqual(loaded.indptr.tolist(), [0, 2, 2, 3])
+            self.assertEqual(loaded.ids.tolist(), [0, 1, 1])
+            self.assertEqual(loaded.counts.tolist(), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from ast2vec.df import DocumentFrequencies
+import numpy
+from scipy.sparse import csr_matrix
+
+from snippet_ranger.model2.snippet2bow import SnippetModel2FuncCallsBOW
+from snippet_ranger.model2.snippet2vw import matrix_to_vw, snippets_to_vw
+from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.tests import models
+
+
+class Snippet2VWTests(unittest.TestCase):
+    def test_matrix_to_vw(self):
+        matrix = csr_matrix(numpy.array([[0, 1.5, 2], [0, 0, 0]], dtype=numpy.float32))
+        self.assertEqual(matrix_to_vw(["a b:c", "d"], matrix, ["x", "y", "z"]),
+                         "a_bc y:1.5 z:2.0\nd \n")
+
+    def test_snippets_to_vw(self):
+        docfreq = DocumentFrequencies().construct(10, ["f1", "f2", "f3"], [2, 5, 10])
+        converter = SnippetModel2FuncCallsBOW(3, docfreq, num_processes=1)
+        snippet = Snippet().load(models.SNIPPET)
+        bow = converter.convert_model(snippet)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "vw", "dataset.txt")
+            for ordered in (True, False):
+                failures = snippets_to_vw(converter, [models.SNIPPET, models.SNIPPET,
+                                                      models.TEST_REPO], output,
+                                          num_processes=2, ordered=ordered)
+                self.assertEqual(failures, 1)
+                with open(output) as fin:
+                    lines = fin.read()
+                self.assertEqual(lines, matrix_to_vw(snippet.names, bow.matrix, bow.tokens) * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,9 +9,9 @@ from ast2vec import Source
 from ast2vec.bblfsh_roles import Node
 from modelforge import split_strings
 
-from snippet_ranger.model2.source2func import Source2Func
+from snippet_ranger.model2.source2func import Source2Func, Source2MultiFunc
 from snippet_ranger.model2.source2func import process_lib_functions, source2func_entry
-from snippet_ranger.models.snippet import Snippet
+from snippet_ranger.models.snippet import Snippet, SnippetSources
 from snippet_ranger.tests import models
 from snippet_ranger.utils import get_func_names_bow
 from snippet_ranger.tests.test_snippet import validate_asdf_file
@@ -52,6 +52,67 @@ class Source2FuncTests(unittest.TestCase):
         self.assertEqual(functon_obj[3][0], 4)
         self.assertEqual(functon_obj[3][1], 11)
 
+        converter = Source2Func(models.LIB_NAME, functions_bow, shared_sources=True)
+        shared_functons = converter.convert_model(repo_model)
+        self.assertIsInstance(shared_functons.sources, SnippetSources)
+        self.assertEqual(shared_functons.sources.file_sources, repo_model.sources)
+        self.assertEqual(list(shared_functons.sources), list(functons.sources))
+
+    def test_references(self):
+        lib_model = Source().load(models.TEST_LIB)
+        functions_bow = process_lib_functions(get_func_names_bow(lib_model))
+        repo_model = Source().load(models.TEST_REPO)
+        functons = Source2Func(models.LIB_NAME, functions_bow).convert_model(repo_model)
+
+        converter = Source2Func(models.LIB_NAME, functions_bow, references=True)
+        ref_functons = converter.convert_model(repo_model)
+        self.assertTrue(ref_functons.is_reference)
+        self.assertEqual(ref_functons.uasts[0], functons.uasts[0])
+        self.assertEqual(list(ref_functons.sources), list(functons.sources))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "snippet.asdf")
+            ref_functons.save(path)
+            self.assertNotIn("uasts", asdf.open(path).tree)
+            loaded = Snippet().load(path)
+            self.assertTrue(loaded.is_reference)
+            self.assertEqual(loaded.uasts[0], functons.uasts[0])
+            self.assertEqual(loaded[0][2], functons[0][2])
+            self.assertEqual(loaded.names, functons.names)
+
+            loaded.materialize()
+            self.assertFalse(loaded.is_reference)
+            loaded.save(path)
+            validate_asdf_file(self, path)
+
+        with self.assertRaises(ValueError):
+            Source2Func(models.LIB_NAME, functions_bow, shared_sources=True, references=True)
+
+    def test_resolve_imports(self):
+        lib_model = Source().load(models.TEST_LIB)
+        functions_bow = process_lib_functions(get_func_names_bow(lib_model))
+        repo_model = Source().load(models.TEST_REPO)
+        converter = Source2Func(models.LIB_NAME, functions_bow, resolve_imports=True)
+        snippets = converter.convert_model(repo_model)
+        # f2 and f3 are not imported from test_lib, only f1 is
+        self.assertEqual(snippets.names, Source2Func(models.LIB_NAME, functions_bow)
+                         .convert_model(repo_model).names)
+        model_object = converter.prepare_model_object(next(iter(repo_model)))
+        self.assertEqual(model_object[3].functions[0].callees, {"test_lib.f1": 1})
+        self.assertEqual(model_object[3].functions[1].callees, {})
+        # test_lib.f1 is resolved but the library API has only test_lib.example.f1
+        converter = Source2Func(models.LIB_NAME, functions_bow, resolve_imports=True,
+                                lib_qualified_names={"test_lib.example.f1"})
+        with self.assertRaises(ValueError):
+            converter.convert_model(repo_model)
+        converter = Source2Func(models.LIB_NAME, functions_bow, resolve_imports=True,
+                                lib_qualified_names={"test_lib.f1"})
+        self.assertEqual(converter.convert_model(repo_model).names, snippets.names)
+
+        converter = Source2MultiFunc({models.LIB_NAME: functions_bow, "f1": {"f"}},
+                                     resolve_imports=True)
+        self.assertEqual(set(converter.split_libraries(repo_model)), {models.LIB_NAME})
+
     def test_source2func_object(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             args = argparse.Namespace(library_uast=models.TEST_LIB,
@@ -61,10 +122,54 @@ class Source2FuncTests(unittest.TestCase):
                                       filter="**/*.asdf",
                                       log_level=logging.INFO,
                                       processes=1,
-                                      overwrite_existing=True)
+                                      overwrite_existing=True,
+                                      shared_sources=False,
+                                      references=False,
+                                      resolve_imports=False,
+                                      libraries=None,
+                                      library_api=None)
             source2func_entry(args)
             validate_asdf_file(self, os.path.join(tmpdir, "source_test_repo.asdf"))
 
+    def test_multi_func(self):
+        lib_model = Source().load(models.TEST_LIB)
+        functions_bow = process_lib_functions(get_func_names_bow(lib_model))
+        repo_model = Source().load(models.TEST_REPO)
+        converter = Source2MultiFunc({models.LIB_NAME: functions_bow, "f1": {"f"},
+                                      "unused_lib": functions_bow})
+        snippets = converter.split_libraries(repo_model)
+        self.assertEqual(set(snippets), {models.LIB_NAME, "f1"})
+        single = Source2Func(models.LIB_NAME, functions_bow).convert_model(repo_model)
+        self.assertEqual(snippets[models.LIB_NAME].names, single.names)
+        self.assertEqual(snippets["f1"][0][2], "def f3():\n    f()")
+
+    def test_source2func_multi(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            args = argparse.Namespace(libraries=["%s:%s" % (models.LIB_NAME, models.TEST_LIB),
+                                                 "f1:%s" % models.TEST_LIB],
+                                      input=models.DATA_DIR,
+                                      output=tmpdir,
+                                      filter="source_test_repo.asdf",
+                                      log_level=logging.INFO,
+                                      processes=1,
+                                      overwrite_existing=True,
+                                      shared_sources=False,
+                                      references=False,
+                                      resolve_imports=False)
+            source2func_entry(args)
+            for libname in (models.LIB_NAME, "f1"):
+                validate_asdf_file(self, os.path.join(tmpdir, libname, "source_test_repo.asdf"))
+            # The existing models are kept with --disable-overwrite
+            path = os.path.join(tmpdir, "f1", "source_test_repo.asdf")
+            with open(path, "w") as f:
+                f.write("existing")
+            args.overwrite_existing = False
+            source2func_entry(args)
+            with open(path) as f:
+                self.assertEqual(f.read(), "existing")
+            validate_asdf_file(self, os.path.join(tmpdir, models.LIB_NAME,
+                                                  "source_test_repo.asdf"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+import logging
+import pickle
+import unittest
+
+from ast2vec.token_parser import TokenParser
+
+from snippet_ranger.token_parser import CachingTokenParser, log_cache_stats
+
+
+class CountingTokenParser:
+    def __init__(self):
+        self.calls = 0
+
+    def process_token(self, token):
+        self.calls += 1
+        return token.split("_")
+
+
+class CachingTokenParserTests(unittest.TestCase):
+    def test_process_token(self):
+        parser = CachingTokenParser()
+        for token in ("numpyArray", "get_value", "XMLHttpRequest", "f1"):
+            self.assertEqual(parser.process_token(token),
+                             tuple(TokenParser().process_token(token)))
+
+    def test_stats(self):
+        counting = CountingTokenParser()
+        parser = CachingTokenParser(counting)
+        self.assertEqual(parser.hit_rate, 0)
+        for token in ("a_b", "c", "a_b", "a_b"):
+            parser.process_token(token)
+        self.assertEqual(parser.process_token("a_b"), ("a", "b"))
+        self.assertEqual(counting.calls, 2)
+        self.assertEqual((parser.hits, parser.misses, len(parser)), (3, 2, 2))
+        self.assertAlmostEqual(parser.hit_rate, 0.6)
+        parser.clear()
+        self.assertEqual((parser.hits, parser.misses, len(parser)), (0, 0, 0))
+
+    def test_bounded(self):
+        counting = CountingTokenParser()
+        parser = CachingTokenParser(counting, maxsize=2)
+        for token in ("a", "b", "c", "a"):
+            parser.process_token(token)
+        self.assertEqual(len(parser), 2)
+        self.assertEqual(counting.calls, 4)
+
+    def test_pickle(self):
+        parser = CachingTokenParser(maxsize=10)
+        parser.process_token("numpyArray")
+        parser = pickle.loads(pickle.dumps(parser))
+        self.assertEqual(len(parser), 0)
+        self.assertEqual(parser.process_token("numpyArray"), ("numpy", "array"))
+        self.assertEqual(parser.misses, 1)
+
+    def test_log_cache_stats(self):
+        parser = CachingTokenParser(CountingTokenParser())
+        parser.process_token("a")
+        parser.process_token("a")
+        with self.assertLogs("test", logging.INFO) as logs:
+            log_cache_stats(logging.getLogger("test"), parser)
+        self.assertIn("1 hits, 1 misses, hit rate 50.0%", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
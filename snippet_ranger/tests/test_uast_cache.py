@@ -0,0 +1,55 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from snippet_ranger.uast_cache import log_uast_cache_stats, UASTCache
+
+
+class UASTCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = UASTCache(self.tmpdir.name, max_size=100)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key(self):
+        key = UASTCache.key(b"a = 1\n", "python-ast/1/3.6")
+        self.assertEqual(key, UASTCache.key(b"a = 1\n", "python-ast/1/3.6"))
+        self.assertNotEqual(key, UASTCache.key(b"a = 2\n", "python-ast/1/3.6"))
+        self.assertNotEqual(key, UASTCache.key(b"a = 1\n", "python-ast/2/3.6"))
+
+    def test_get_put(self):
+        key = UASTCache.key(b"a = 1\n", "v")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, b"uast")
+        self.assertEqual(self.cache.get(key), b"uast")
+        self.assertEqual(UASTCache(self.tmpdir.name).get(key), b"uast")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.hit_rate, 0.5)
+        self.cache.update_stats(2, 0)
+        self.assertEqual(self.cache.hit_rate, 0.75)
+
+    def test_evict(self):
+        keys = [UASTCache.key(str(i).encode(), "v") for i in range(4)]
+        for i, key in enumerate(keys[:3]):
+            self.cache.put(key, b"x" * 30)
+            os.utime(self.cache._entry_path(key), (i, i))
+        # the hit makes the first entry the most recently used
+        self.cache.get(keys[0])
+        # 120 bytes exceed the limit, the oldest entry is removed to fit 90% of it
+        self.cache.put(keys[3], b"x" * 30)
+        self.assertEqual([self.cache.get(key) is not None for key in keys],
+                         [True, False, True, True])
+        self.assertEqual(self.cache.evict(), 0)
+
+    def test_log_uast_cache_stats(self):
+        with self.assertLogs("uast_cache", logging.INFO) as logs:
+            log_uast_cache_stats(logging.getLogger("uast_cache"), self.cache)
+        self.assertIn("hit rate 0.0%", logs.output[0])
+        log_uast_cache_stats(logging.getLogger("uast_cache"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from ast2vec import Source
+from ast2vec import bblfsh_roles
+
+from snippet_ranger.uast_index import UASTIndex
+from snippet_ranger.tests import models
+
+
+class UASTIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.uast = Source().load(models.TEST_REPO).uasts[0]
+        self.index = UASTIndex(self.uast)
+
+    def test_preorder(self):
+        self.assertIs(self.index.nodes[0], self.uast)
+        self.assertEqual(self.index.parents[0], -1)
+        self.assertEqual(self.index.ends[0], len(self.index))
+        for i in range(1, len(self.index)):
+            parent = self.index.parents[i]
+            self.assertLess(parent, i)
+            self.assertLessEqual(self.index.ends[i], self.index.ends[parent])
+            self.assertIn(self.index.nodes[i], self.index.nodes[parent].children)
+
+    def test_role_nodes(self):
+        funcs = self.index.role_nodes(bblfsh_roles.FUNCTION_DECLARATION)
+        self.assertEqual([self.index.nodes[i].token for i in funcs], ["f", "f3"])
+        self.assertEqual(self.index.start_lines[funcs].tolist(), [5, 14])
+        self.assertEqual(self.index.end_lines[funcs].tolist(), [11, 15])
+        for i in funcs:
+            self.assertIn(bblfsh_roles.FUNCTION_DECLARATION, self.index.nodes[i].roles)
+
+    def test_bag(self):
+        self.assertEqual(self.index.bag(bblfsh_roles.SIMPLE_IDENTIFIER),
+                         {"test_lib": 2, "f": 2, "f1": 2, "f2": 2, "f3": 4})
+        func = self.index.role_nodes(bblfsh_roles.FUNCTION_DECLARATION)[0]
+        subtree = self.index.subtree(func)
+        self.assertEqual(self.index.bag(bblfsh_roles.CALL_CALLEE, subtree.start, subtree.stop),
+                         {"f1": 1, "f2": 2, "f3": 3})
+        bag = self.index.bag([bblfsh_roles.IMPORT_PATH, bblfsh_roles.IMPORT_ALIAS])
+        self.assertEqual(bag, {"test_lib": 2, "f1": 1})
+
+    def test_empty_roles(self):
+        self.assertEqual(len(self.index.role_nodes([])), 0)
+        self.assertEqual(len(self.index.role_nodes(10000)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -52,5 +52,29 @@ class UtilsTests(unittest.TestCase):
         self.assertFalse(utils.has_import("f1", source.uasts[0]))
         self.assertFalse(utils.has_import("test_lib", source.uasts[0]))
 
+    def test_extract_functions(self):
+        source = Source().load(models.TEST_REPO)
+        uast_functions = utils.extract_functions(source.uasts[0])
+        self.assertEqual(uast_functions.imports, {"f1", "test_lib"})
+        self.assertEqual(uast_functions.callees, {"f": 1, "f1": 1, "f2": 2, "f3": 3})
+        self.assertEqual([(f.node.token, f.start, f.end) for f in uast_functions.functions],
+                         [("f", 5, 11), ("f3", 14, 15)])
+        self.assertEqual(uast_functions.functions[0].callees, {"f1": 1, "f2": 2, "f3": 3})
+        self.assertEqual(uast_functions.functions[1].callees, {"f": 1})
+
+        source = Source().load(models.TEST_LIB)
+        uast_functions = utils.extract_functions(source.uasts[1])
+        self.assertEqual(uast_functions.imports, set())
+        self.assertEqual([f.node.token for f in uast_functions.functions],
+                         ["f1", "f2", "f3", "f35"])
+        # f35 is nested in f3
+        self.assertEqual((uast_functions.functions[3].start, uast_functions.functions[3].end),
+                         (10, 11))
+
+    def test_parse_size(self):
+        self.assertEqual(utils.parse_size("50G"), 50 << 30)
+        self.assertEqual(utils.parse_size("1.5kb"), 1536)
+        self.assertEqual(utils.parse_size("100"), 100)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+from functools import lru_cache
+import logging
+
+from ast2vec.token_parser import TokenParser
+
+
+class CachingTokenParser:
+    """
+    Memoizes :meth:`process_token` of the token parser in the bounded LRU cache. The same
+    identifiers occur in many snippets, so the splitting and stemming of most of them are cache
+    hits. The hit rate is logged by the converters in the end.
+    """
+    DEFAULT_CACHE_SIZE = 1 << 20  #: The maximal number of memoized tokens.
+
+    def __init__(self, token_parser=None, maxsize: int=DEFAULT_CACHE_SIZE):
+        """
+        :param token_parser: Token parser to memoize. :class:`TokenParser` if None.
+        :param maxsize: The maximal number of memoized tokens.
+        """
+        self._token_parser = TokenParser() if token_parser is None else token_parser
+        self._maxsize = maxsize
+        self._process = lru_cache(maxsize)(self._split)
+
+    @property
+    def hits(self) -> int:
+        """
+        Returns the number of tokens which were found in the cache.
+        """
+        return self._process.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        """
+        Returns the number of tokens which were split.
+        """
+        return self._process.cache_info().misses
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Returns the share of the tokens which were found in the cache, 0 if there were none.
+        """
+        info = self._process.cache_info()
+        total = info.hits + info.misses
+        return info.hits / total if total else 0.
+
+    def __len__(self):
+        """
+        Returns the number of memoized tokens.
+        """
+        return self._process.cache_info().currsize
+
+    def process_token(self, token: str) -> tuple:
+        """
+        Splits and stems the token.
+
+        :param token: Identifier.
+        :return: Tuple of the processed parts.
+        """
+        return self._process(token)
+
+    def clear(self):
+        """
+        Drops the memoized tokens and resets the statistics.
+
+        :return: None
+        """
+        self._process.cache_clear()
+
+    def _split(self, token):
+        return tuple(self._token_parser.process_token(token))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_process"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._process = lru_cache(self._maxsize)(self._split)
+
+
+def log_cache_stats(log: logging.Logger, token_parser):
+    """
+    Logs the hit rate of the token parser if it is :class:`CachingTokenParser`.
+
+    :param log: Logger.
+    :param token_parser: Any token parser.
+    :return: None
+    """
+    if isinstance(token_parser, CachingTokenParser):
+        log.info("Token parser cache: %d hits, %d misses, hit rate %.1f%%",
+                 token_parser.hits, token_parser.misses, token_parser.hit_rate * 100)
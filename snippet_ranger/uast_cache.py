@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+
+class UASTCache:
+    """
+    Local content-addressed cache of serialized UASTs. The key is the hash of the file content
+    and of the parser version, so every unique file is parsed once across the runs and the
+    repositories, e.g. vendored `six.py`.
+
+    The entries are files `<path>/<first 2 hex digits>/<hash>`. They are written atomically, so
+    the cache can be shared by several processes. Every hit updates the modification time of
+    the entry and the least recently used entries are evicted when the total size exceeds
+    `max_size`. The instance is thread safe; the processes should create their own instances.
+    """
+    DEFAULT_MAX_SIZE = 1 << 30  #: The maximal size of the cache in bytes.
+    LOW_WATERMARK = 0.9  #: Eviction frees the space till this share of `max_size`.
+
+    def __init__(self, path: str, max_size: int=DEFAULT_MAX_SIZE):
+        """
+        :param path: Cache directory.
+        :param max_size: The maximal size of the cache in bytes.
+        """
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._max_size = max_size
+        self._size = None
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        """
+        Returns the cache directory.
+        """
+        return self._path
+
+    @property
+    def max_size(self) -> int:
+        """
+        Returns the maximal size of the cache in bytes.
+        """
+        return self._max_size
+
+    @property
+    def hits(self) -> int:
+        """
+        Returns the number of UASTs which were found in the cache.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        Returns the number of UASTs which were not found in the cache.
+        """
+        return self._misses
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Returns the share of the UASTs which were found in the cache, 0 if there were none.
+        """
+        total = self._hits + self._misses
+        return self._hits / total if total else 0.
+
+    @staticmethod
+    def key(content: bytes, version: str) -> str:
+        """
+        Calculates the cache key.
+
+        :param content: File content.
+        :param version: Parser name and version. UASTs of different parsers never mix.
+        :return: Hex digest.
+        """
+        return hashlib.sha1(version.encode("utf-8") + b"\0" + content).hexdigest()
+
+    def get(self, key: str):
+        """
+        Looks up the UAST.
+
+        :param key: Cache key from :meth:`key`.
+        :return: Serialized UAST or None if it is not cached.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as fin:
+                data = fin.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.update_stats(0, 1)
+            return None
+        self.update_stats(1, 0)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Stores the UAST and evicts the least recently used entries if the cache is full.
+
+        :param key: Cache key from :meth:`key`.
+        :param data: Serialized UAST.
+        :return: None
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                fout.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self._max_size:
+                self._evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the size is below `LOW_WATERMARK` of
+        `max_size`. Other processes may write to the cache at the same time, so the sizes
+        are read from the disk.
+
+        :return: Number of removed entries.
+        """
+        with self._lock:
+            return self._evict()
+
+    def update_stats(self, hits: int, misses: int):
+        """
+        Adds the hits and the misses, e.g. of the cache instances in the other processes.
+
+        :param hits: Number of hits.
+        :param misses: Number of misses.
+        :return: None
+        """
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        limit = self._max_size * self.LOW_WATERMARK
+        removed = 0
+        for _, entry_size, path in entries:
+            if size <= limit:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+        return removed
+
+    def _entry_path(self, key):
+        return os.path.join(self._path, key[:2], key)
+
+    def _entries(self):
+        # os.scandir() is not available in Python 3.4
+        for subdir in os.listdir(self._path):
+            subdir = os.path.join(self._path, subdir)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.startswith(".tmp"):
+                    continue
+                path = os.path.join(subdir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+
+def log_uast_cache_stats(log: logging.Logger, cache):
+    """
+    Logs the hit rate of the UAST cache if it is not None.
+
+    :param log: Logger.
+    :param cache: :class:`UASTCache` or None.
+    :return: None
+    """
+    if cache is not None:
+        log.info("UAST cache: %d hits, %d misses, hit rate %.1f%%",
+                 cache.hits, cache.misses, cache.hit_rate * 100)
@@ -0,0 +1,197 @@
+from collections import defaultdict
+
+import numpy
+
+
+class UASTIndex:
+    """
+    Flat array representation of a UAST which is built with a single walk over the tree.
+
+    Nodes are stored in pre-order, so the subtree of the node `i` occupies the slice
+    `[i, ends[i])`. Every node has a role bitmask, an interned token id, a parent index and
+    start/end line positions. All the role and token queries are vectorized mask/slice
+    operations over these arrays, so there is no need to walk the protobuf tree again.
+    """
+    ROLE_WORD_BITS = 64
+
+    def __init__(self, uast):
+        """
+        :param uast: The root node of the UAST to index.
+        """
+        nodes = []
+        parents = []
+        ends = []
+        tokens = []
+        start_lines = []
+        end_lines = []
+        role_nodes = []
+        role_ids = []
+        vocabulary = {"": 0}
+        stack = [(uast, -1)]
+        while stack:
+            node, parent = stack.pop()
+            if node is None:
+                # The subtree of the node with the index `parent` is finished
+                ends[parent] = len(nodes)
+                continue
+            index = len(nodes)
+            nodes.append(node)
+            parents.append(parent)
+            ends.append(0)
+            tokens.append(vocabulary.setdefault(node.token, len(vocabulary)))
+            start_lines.append(node.start_position.line)
+            end_lines.append(node.end_position.line)
+            for role in node.roles:
+                role_nodes.append(index)
+                role_ids.append(role)
+            stack.append((None, index))
+            stack.extend((child, index) for child in reversed(node.children))
+
+        self._nodes = nodes
+        self._parents = numpy.array(parents, dtype=numpy.int32)
+        self._ends = numpy.array(ends, dtype=numpy.int32)
+        self._tokens = numpy.array(tokens, dtype=numpy.int32)
+        self._start_lines = numpy.array(start_lines, dtype=numpy.uint32)
+        self._end_lines = numpy.array(end_lines, dtype=numpy.uint32)
+        self._vocabulary = [None] * len(vocabulary)
+        for token, i in vocabulary.items():
+            self._vocabulary[i] = token
+
+        role_nodes = numpy.array(role_nodes, dtype=numpy.int64)
+        role_ids = numpy.array(role_ids, dtype=numpy.uint64)
+        words = int(role_ids.max()) // self.ROLE_WORD_BITS + 1 if len(role_ids) else 1
+        self._roles = numpy.zeros((len(nodes), words), dtype=numpy.uint64)
+        numpy.bitwise_or.at(
+            self._roles,
+            (role_nodes, (role_ids // self.ROLE_WORD_BITS).astype(numpy.int64)),
+            numpy.left_shift(numpy.uint64(1), role_ids % numpy.uint64(self.ROLE_WORD_BITS)))
+
+    @property
+    def nodes(self) -> list:
+        """
+        Returns the list of protobuf nodes in pre-order.
+        """
+        return self._nodes
+
+    @property
+    def parents(self) -> numpy.ndarray:
+        """
+        Returns the parent index of every node. The root has -1.
+        """
+        return self._parents
+
+    @property
+    def ends(self) -> numpy.ndarray:
+        """
+        Returns the end (exclusive) of the subtree of every node.
+        """
+        return self._ends
+
+    @property
+    def tokens(self) -> numpy.ndarray:
+        """
+        Returns the interned token id of every node. Empty token has id 0.
+        """
+        return self._tokens
+
+    @property
+    def vocabulary(self) -> list:
+        """
+        Returns the list of interned tokens. Token id is the index in the list.
+        """
+        return self._vocabulary
+
+    @property
+    def roles(self) -> numpy.ndarray:
+        """
+        Returns the role bitmasks of the nodes. Role `r` is the bit `r % 64` of the word `r // 64`.
+        """
+        return self._roles
+
+    @property
+    def start_lines(self) -> numpy.ndarray:
+        """
+        Returns the start line of every node.
+        """
+        return self._start_lines
+
+    @property
+    def end_lines(self) -> numpy.ndarray:
+        """
+        Returns the end line of every node.
+        """
+        return self._end_lines
+
+    def __len__(self):
+        """
+        Returns the number of nodes.
+        """
+        return len(self._nodes)
+
+    def subtree(self, item) -> slice:
+        """
+        Returns the slice of the node's subtree.
+
+        :param item: Node index.
+        :return: slice object.
+        """
+        return slice(item, int(self._ends[item]))
+
+    def role_mask(self, roles, start=0, end=None) -> numpy.ndarray:
+        """
+        Calculates which nodes have at least one of the roles.
+
+        :param roles: Role or list of roles.
+        :param start: Start of the nodes range.
+        :param end: End of the nodes range. The end of the UAST if it is None.
+        :return: Boolean mask for the nodes in range.
+        """
+        if isinstance(roles, int):
+            roles = [roles]
+        query = numpy.zeros(self._roles.shape[1], dtype=numpy.uint64)
+        for role in roles:
+            word = role // self.ROLE_WORD_BITS
+            if word < len(query):
+                query[word] |= numpy.uint64(1) << numpy.uint64(role % self.ROLE_WORD_BITS)
+        return (self._roles[start:end] & query).any(axis=1)
+
+    def role_nodes(self, roles, start=0, end=None) -> numpy.ndarray:
+        """
+        Finds the nodes with at least one of the roles.
+
+        :param roles: Role or list of roles.
+        :param start: Start of the nodes range.
+        :param end: End of the nodes range. The end of the UAST if it is None.
+        :return: Node indices in pre-order.
+        """
+        return numpy.flatnonzero(self.role_mask(roles, start, end)) + start
+
+    def token_ids(self, roles, start=0, end=None) -> numpy.ndarray:
+        """
+        Returns the token ids of the nodes with at least one of the roles. Empty tokens are \
+        skipped.
+
+        :param roles: Role or list of roles.
+        :param start: Start of the nodes range.
+        :param end: End of the nodes range. The end of the UAST if it is None.
+        :return: Token ids in pre-order.
+        """
+        ids = self._tokens[start:end][self.role_mask(roles, start, end)]
+        return ids[ids != 0]
+
+    def bag(self, roles, start=0, end=None, bag=None) -> dict:
+        """
+        Converts the nodes with at least one of the roles to a bag of words.
+
+        :param roles: Role or list of roles.
+        :param start: Start of the nodes range.
+        :param end: End of the nodes range. The end of the UAST if it is None.
+        :param bag: Specify existing bag of words if you want to update it.
+        :return: bag of words for tokens of nodes.
+        """
+        if bag is None:
+            bag = defaultdict(int)
+        ids, counts = numpy.unique(self.token_ids(roles, start, end), return_counts=True)
+        for i, count in zip(ids.tolist(), counts.tolist()):
+            bag[self._vocabulary[i]] += count
+        return bag
@@ -1,8 +1,14 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 from ast2vec import Source
 from ast2vec import UASTModel
 from ast2vec import bblfsh_roles
+import numpy
+
+from snippet_ranger.import_resolver import qualified_callee
+
+FunctionSpan = namedtuple("FunctionSpan", ["node", "index", "start", "end", "callees"])
+UASTFunctions = namedtuple("UASTFunctions", ["imports", "functions", "callees"])
 
 
 def uast_to_bag(uast, bag=None, role=bblfsh_roles.SIMPLE_IDENTIFIER):
@@ -16,7 +22,6 @@ def uast_to_bag(uast, bag=None, role=bblfsh_roles.SIMPLE_IDENTIFIER):
     """
     if bag is None:
         bag = defaultdict(int)
-    # TODO(zurk): Can be optimised if we need. uast_role_nodes make a list from one role.
     for node in uast_role_nodes(uast, roles=role):
         if node.token != "":
             bag[node.token] += 1
@@ -26,27 +31,33 @@ def uast_to_bag(uast, bag=None, role=bblfsh_roles.SIMPLE_IDENTIFIER):
 def uast_role_nodes(uast, roles=None) -> iter:
     """
     Filter UAST by provided roles and iterate trough corresponding nodes of uast.
+    Nodes are yielded in pre-order, that is, in the order of their appearance in the source code.
     It is a generator.
 
-    :param uast:
+    :param uast: Uast to process.
     :param roles: roles to filter.
     :return: iterator trough corresponding nodes.
     """
+    roles = frozenset(_check_roles(roles))
+    stack = [uast]
+    while stack:
+        node = stack.pop()
+        if not roles.isdisjoint(node.roles):
+            yield node
+        stack.extend(reversed(node.children))
+
+
+def _check_roles(roles):
+    """
+    Internal helper function to validate roles argument.
+    """
     if roles is None:
-        roles = [bblfsh_roles.SIMPLE_IDENTIFIER]
+        return [bblfsh_roles.SIMPLE_IDENTIFIER]
     elif isinstance(roles, int):
-        roles = [roles]
+        return [roles]
     elif not isinstance(roles, list):
         raise TypeError()
-
-    stack = [uast]
-    while stack:
-        node = stack.pop(0)
-        for role_id in roles:
-            if role_id in node.roles:
-                yield node
-                break
-        stack.extend(node.children)
+    return roles
 
 
 def _iter_imports(uast):
@@ -63,7 +74,7 @@ def get_imports(uast):
     Return all module imports from the uast.
     It is specific for Python because imports should be splited by dot.
 
-    :param uast:
+    :param uast: Uast to process.
     :return: set of import names
     """
     return set(_iter_imports(uast))
@@ -74,7 +85,7 @@ def has_import(libname, uast) -> bool:
     Check `libname` import in the uast
 
     :param libname: name of library to check
-    :param uast:
+    :param uast: Uast to process.
     :return:
     """
     for imp in _iter_imports(uast):
@@ -95,3 +106,102 @@ def get_func_names_bow(uast_model: UASTModel) -> dict:
         func_class_names = uast_to_bag(record[1], func_class_names,
                                        bblfsh_roles.FUNCTION_DECLARATION_NAME)
     return func_class_names
+
+
+def extract_functions(uast, function_role=bblfsh_roles.FUNCTION_DECLARATION,
+                      callee_role=bblfsh_roles.CALL_CALLEE,
+                      import_roles=(bblfsh_roles.IMPORT_PATH, bblfsh_roles.IMPORT_ALIAS),
+                      qualified_callees=False):
+    """
+    Extract imports, function spans and function callees from the UAST in one post-order walk.
+    Callee bag of every function is built bottom-up: the callees of the function itself are
+    counted directly and the bags of the nested functions are added when they are finished.
+    So nested functions are never traversed twice.
+
+    :param uast: Uast to process.
+    :param function_role: Role of function declaration nodes.
+    :param callee_role: Role of nodes to put into callee bags.
+    :param import_roles: Roles of import nodes. Import names are splited by dot.
+    :param qualified_callees: Put dotted callee names to the bags, e.g. `np.linalg.norm` \
+        instead of `norm`. See :func:`qualified_callee`.
+    :return: :class:`UASTFunctions` with the set of imports, the list of :class:`FunctionSpan` \
+        in pre-order and the callee bag of the whole UAST. `FunctionSpan.index` is the \
+        pre-order node index, the same as in :class:`UASTIndex`.
+    """
+    imports = set()
+    functions = []
+    bags = [defaultdict(int)]
+    stack = [(uast, False)]
+    index = 0
+    while stack:
+        node, finished = stack.pop()
+        if finished:
+            # All the nested functions are finished, so the bag is complete
+            bag = bags.pop()
+            for token, count in bag.items():
+                bags[-1][token] += count
+            continue
+        roles = node.roles
+        if node.token:
+            if callee_role in roles:
+                bags[-1][qualified_callee(node) if qualified_callees else node.token] += 1
+            for role in import_roles:
+                if role in roles:
+                    imports.update(node.token.split("."))
+                    break
+        if function_role in roles:
+            bag = defaultdict(int)
+            functions.append(FunctionSpan(node, index, node.start_position.line,
+                                          node.end_position.line, bag))
+            bags.append(bag)
+            stack.append((node, True))
+        index += 1
+        stack.extend((child, False) for child in reversed(node.children))
+    return UASTFunctions(imports, functions, bags[0])
+
+
+def line_offsets(source: str) -> numpy.ndarray:
+    """
+    Calculate the offsets of line starts in the source code. The last item is the length of the
+    source, so the line `i` is `source[offsets[i]:offsets[i + 1]]`.
+
+    :param source: Source code.
+    :return: Array of line offsets.
+    """
+    chars = numpy.frombuffer(source.encode("utf-32-le"), dtype=numpy.uint32)
+    starts = numpy.flatnonzero(chars == ord("\n")) + 1
+    return numpy.concatenate(([0], starts[starts < len(source)], [len(source)]))
+
+
+def lines_span(source: str, offsets: numpy.ndarray, start: int, end: int) -> tuple:
+    """
+    Calculate the offsets of the lines range in the source code. The trailing line break is not
+    included. Line breaks inside the range are kept as is.
+
+    :param source: Source code.
+    :param offsets: Line offsets from :func:`line_offsets`.
+    :param start: First line number, starting from 0.
+    :param end: Line number after the last one.
+    :return: Start and end offsets, so the lines are `source[start:end]`.
+    """
+    lines = len(offsets) - 1
+    start = int(offsets[min(max(start, 0), lines)])
+    end = int(offsets[min(max(end, 0), lines)])
+    if end > start and source[end - 1] == "\n":
+        end -= 1
+    return start, end
+
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses the human readable size, e.g. 50G.
+
+    :param size: Number with an optional K, M, G or T suffix (powers of 1024).
+    :return: Size in bytes.
+    """
+    size = size.strip().upper().rstrip("B")
+    unit = size[-1:] if size[-1:] in SIZE_UNITS else ""
+    return int(float(size[:len(size) - len(unit)]) * SIZE_UNITS[unit])